@@ -2,9 +2,15 @@
 Representation of the agenda summary given to attendees of a meeting
 """
 
+import copy
+import logging
+import os
 from pathlib import Path
 from typing import (
+    Any,
+    Dict,
     Optional,
+    Tuple,
     Union,
 )
 
@@ -13,8 +19,40 @@ from docx.oxml import OxmlElement  # type: ignore
 from docx.oxml.ns import qn  # type: ignore
 import docx.table  # type: ignore
 
-from .meeting import Agenda, AgendaItem, AgendaHeading
+from .meeting import Agenda, AgendaItem, AgendaHeading, AgendaSubItem
 from .locator import FileLocator
+from .progress import ProgressCallback, ProgressEvent
+from .stats import BuildStats
+from .templatecache import CompiledTemplate, TemplateCache
+
+
+logger = logging.getLogger(__name__)
+
+
+# marks the text of each field in a prototype row; private use characters
+# cannot collide with the real text
+PLACEHOLDER = "\ue000%s\ue000"
+
+
+class RowPrototype:
+    """
+    A filled-in table row that is copied for each row of the same shape
+
+    fields maps the name of each field to the index of the run (w:r) in the
+    row that holds its text.
+    """
+
+    def __init__(self, tr: Any, fields: Dict[str, int]) -> None:
+        self.tr = tr
+        self.fields = fields
+
+    def render(self, values: Dict[str, str]) -> Any:
+        """a copy of the row with the text of each field filled in"""
+        tr = copy.deepcopy(self.tr)
+        runs = list(tr.iter(qn("w:r")))
+        for field, index in self.fields.items():
+            runs[index].text = values[field]
+        return tr
 
 
 class AgendaListing:
@@ -23,17 +61,27 @@ class AgendaListing:
         meeting: Agenda,
         template: Union[str, Path],
         locator: Optional[FileLocator] = None,
+        stats: Optional[BuildStats] = None,
+        progress: Optional[ProgressCallback] = None,
+        cache: Optional[TemplateCache] = None,
     ) -> None:
         self.meeting = meeting
         self.template = template
         self.locator = locator or Path
+        self.cache = cache
+        self.stats = stats if stats is not None else BuildStats()
+        # called as each row is added to the table
+        self.progress = progress
 
         self.star = "🟊 "
         self.star_font = "Symbola"
         self.agenda_heading_style = "AgendaHeading"
         self.agenda_item_style = "AgendaItem"
+        # templates need not have a style of their own for sub-items
+        self.agenda_subitem_style = "AgendaItem"
         self.agenda_heading_bg_color = "DDDDDD"
         self.document: docx.Document = None
+        self.compiled: Optional[CompiledTemplate] = None
 
     @staticmethod
     def _set_cell_bg_color(
@@ -52,10 +100,47 @@ class AgendaListing:
 
     def load_template(self) -> None:
         resolved_filename = self.locator(self.template)
-        self.document = docx.Document(resolved_filename)
+        with self.stats.phase("load template") as phase:
+            if self.cache is None:
+                # nothing else uses this template, so it need not be copied
+                self.compiled = CompiledTemplate(docx.Document(resolved_filename))
+                self.document = self.compiled.document
+                phase.bytes_read += os.path.getsize(resolved_filename)
+            else:
+                read = self.cache.bytes_read
+                self.compiled = self.cache.get(resolved_filename)
+                self.document = self.compiled.instantiate()
+                phase.bytes_read += self.cache.bytes_read - read
 
     def find_table(self) -> docx.table.Table:
-        return self.document.tables[0]
+        if self.compiled is None:
+            return self.document.tables[0]
+        return self.compiled.table(self.document)
+
+    def _set_style(self, cell: docx.table._Cell, name: str) -> None:
+        """
+        set the style of the first paragraph in a cell
+
+        The style ID is looked up by name once per template, rather than
+        for every cell.
+        """
+        paragraph = cell.paragraphs[0]
+        if self.compiled is None:
+            paragraph.style = name
+            return
+        style_id = self.compiled.style_id(self.document, name)
+        paragraph._p.style = style_id  # pylint: disable=protected-access
+
+    def _prototype_settings(self) -> Tuple[Any, ...]:
+        """the settings that change the appearance of the prototype rows"""
+        return (
+            self.star,
+            self.star_font,
+            self.agenda_heading_style,
+            self.agenda_item_style,
+            self.agenda_subitem_style,
+            self.agenda_heading_bg_color,
+        )
 
     def _fill_header(
         self,
@@ -72,8 +157,8 @@ class AgendaListing:
         merged_cell.text = item.title
 
         # add styling
-        merged_cell.paragraphs[0].style = self.agenda_heading_style
-        cells[0].paragraphs[0].style = self.agenda_heading_style
+        self._set_style(merged_cell, self.agenda_heading_style)
+        self._set_style(cells[0], self.agenda_heading_style)
         self._set_cell_bg_color(merged_cell, self.agenda_heading_bg_color)
         self._set_cell_bg_color(cells[0], self.agenda_heading_bg_color)
 
@@ -87,7 +172,7 @@ class AgendaListing:
             cells[1].text = ""
             p = cells[1].paragraphs[0]
             r = p.add_run(self.star)
-            r.font.name = "Symbola"
+            r.font.name = self.star_font
             p.add_run(item.title)
         else:
             cells[1].text = item.title
@@ -97,22 +182,103 @@ class AgendaListing:
             cells[3].text = item.who
 
         # add styling
+        if isinstance(item, AgendaSubItem):
+            style = self.agenda_subitem_style
+        else:
+            style = self.agenda_item_style
         for c in cells:
-            c.paragraphs[0].style = self.agenda_item_style
+            self._set_style(c, style)
 
     def fill_table(self, table: docx.table.Table) -> None:
-        for item in self.meeting.items:
+        with self.stats.phase("fill table"):
+            self._fill_rows_bulk(table)
+
+    @staticmethod
+    def _row_shape(item: Union[AgendaHeading, AgendaItem]) -> Tuple[Any, ...]:
+        """items with the same shape are filled in with the same XML"""
+        if isinstance(item, AgendaHeading):
+            return ("heading",)
+        return (
+            "subitem" if isinstance(item, AgendaSubItem) else "item",
+            bool(item.starred),
+            bool(item.action),
+            bool(item.who),
+        )
+
+    def _make_prototype(
+        self, table: docx.table.Table, item: Union[AgendaHeading, AgendaItem]
+    ) -> RowPrototype:
+        """
+        fill in a row for a sample item of the same shape, then take it out
+
+        The sample has placeholders for its text, so the prototype row has
+        exactly the cells, merges, shading and styles of the row-by-row path.
+        """
+        sample: Union[AgendaHeading, AgendaItem]
+        if isinstance(item, AgendaHeading):
+            sample = AgendaHeading(title=PLACEHOLDER % "title")
+        else:
+            sample = type(item)(
+                title=PLACEHOLDER % "title",
+                action=PLACEHOLDER % "action" if item.action else item.action,
+                who=PLACEHOLDER % "who" if item.who else item.who,
+                starred=item.starred,
+            )
+
+        row = table.add_row()
+        row.cells[0].text = PLACEHOLDER % "num"
+        if isinstance(sample, AgendaHeading):
+            self._fill_header(sample, row)
+        else:
+            self._fill_item(sample, row)
+
+        tr = row._tr  # pylint: disable=protected-access
+        tr.getparent().remove(tr)
+
+        fields = {}
+        for index, run in enumerate(tr.iter(qn("w:r"))):
+            text = run.text
+            if text.startswith("\ue000"):
+                fields[text.strip("\ue000")] = index
+        return RowPrototype(tr, fields)
+
+    def _fill_rows_bulk(self, table: docx.table.Table) -> None:
+        """
+        fill in the rows by copying a prototype row for each shape of item
+
+        This gives the same XML as filling in each cell with python-docx,
+        without python-docx walking the table grid for every cell of every
+        row.
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        total = len(self.meeting.items)
+        # prototypes are shared by every agenda built from the same template
+        prototypes: Dict[Tuple[Any, ...], RowPrototype] = {}
+        if self.compiled is not None:
+            prototypes = self.compiled.prototypes
+        settings = self._prototype_settings()
+        tbl = table._tbl  # pylint: disable=protected-access
+
+        for done, item in enumerate(self.meeting.items, 1):
             itemnum = str(item.num)
-            print("  Adding %s" % itemnum)
+            if debug:
+                logger.debug("Adding %s", itemnum)
+
+            if isinstance(item, (AgendaHeading, AgendaItem)):
+                shape = settings + self._row_shape(item)
+                prototype = prototypes.get(shape)
+                if prototype is None:
+                    prototype = self._make_prototype(table, item)
+                    prototypes[shape] = prototype
+
+                values = {"num": itemnum, "title": item.title or ""}
+                if isinstance(item, AgendaItem):
+                    values["action"] = item.action
+                    values["who"] = item.who
+                tbl.append(prototype.render(values))
 
-            if isinstance(item, AgendaHeading):
-                row = table.add_row()
-                row.cells[0].text = itemnum
-                self._fill_header(item, row)
-            elif isinstance(item, AgendaItem):
-                row = table.add_row()
-                row.cells[0].text = itemnum
-                self._fill_item(item, row)
+            if self.progress is not None:
+                self.progress(ProgressEvent("agenda", done, total, itemnum))
 
     def build(self) -> None:
         self.load_template()
@@ -121,4 +287,7 @@ class AgendaListing:
 
     def save(self, filename: Union[str, Path]) -> None:
         resolved_filename = self.locator(filename)
-        self.document.save(resolved_filename)
+        with self.stats.phase("save") as phase:
+            self.document.save(resolved_filename)
+            phase.bytes_written += os.path.getsize(resolved_filename)
+        logger.info("Agenda: %s", resolved_filename)
@@ -0,0 +1,164 @@
+"""
+Building the agendas and packs of many meetings in one process
+"""
+
+import glob
+import logging
+import os
+from pathlib import Path
+import time
+from typing import (
+    Callable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    TYPE_CHECKING,
+    Union,
+)
+
+from .progress import ProgressCallback, ProgressEvent
+
+if TYPE_CHECKING:
+    from .pdfcache import PdfDocumentCache
+    from .templatecache import TemplateCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class BuildSession:
+    """
+    Caches that are shared by every meeting built in the same process
+
+    Templates and PDF files used by more than one meeting, such as standing
+    documents, are then only read and parsed once. Each cache is created
+    when first used so that a session only imports the libraries that the
+    steps being built need. PDF files are memory-mapped unless mapped_pdfs
+    is false.
+    """
+
+    def __init__(self, mapped_pdfs: bool = True) -> None:
+        self.mapped_pdfs = mapped_pdfs
+        self._templates: Optional["TemplateCache"] = None
+        self._pdfs: Optional["PdfDocumentCache"] = None
+
+    @property
+    def templates(self) -> "TemplateCache":
+        if self._templates is None:
+            # pylint: disable=import-outside-toplevel
+            from .templatecache import TemplateCache
+
+            self._templates = TemplateCache()
+        return self._templates
+
+    @property
+    def pdfs(self) -> "PdfDocumentCache":
+        if self._pdfs is None:
+            # pylint: disable=import-outside-toplevel
+            from .pdfcache import PdfDocumentCache
+
+            self._pdfs = PdfDocumentCache(self.mapped_pdfs)
+        return self._pdfs
+
+    def __str__(self) -> str:
+        return "%s; %s" % (self.templates, self.pdfs)
+
+
+_session: Optional[BuildSession] = None
+
+
+def current_session() -> BuildSession:
+    """the session of this process, which lives as long as the process"""
+    global _session  # pylint: disable=global-statement
+
+    if _session is None:
+        _session = BuildSession()
+    return _session
+
+
+class BatchResult(NamedTuple):
+    """the outcome of building one meeting of a batch"""
+
+    config: Path
+    wall: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def expand_configs(patterns: Iterable[Union[str, Path]]) -> List[Path]:
+    """
+    the configuration files named by filenames and glob patterns
+
+    Each file is listed once, in the order in which it is first named.
+    """
+    configs: List[Path] = []
+    for pattern in patterns:
+        if glob.has_magic(str(pattern)):
+            matches = sorted(glob.glob(str(pattern), recursive=True))
+            if not matches:
+                raise ValueError("No configuration files match '%s'" % pattern)
+            paths = [Path(match) for match in matches]
+        else:
+            paths = [Path(pattern)]
+        for path in paths:
+            if path not in configs:
+                configs.append(path)
+    return configs
+
+
+def build_one(build: Callable[[Path], None], config: Path) -> BatchResult:
+    """build one meeting, reporting rather than raising any error"""
+    start = time.perf_counter()
+    try:
+        build(config)
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.debug("Build of %s failed", config, exc_info=True)
+        return BatchResult(config, time.perf_counter() - start, str(exc))
+    return BatchResult(config, time.perf_counter() - start)
+
+
+def run_batch(
+    build: Callable[[Path], None],
+    configs: List[Path],
+    jobs: int = 1,
+    progress: Optional[ProgressCallback] = None,
+) -> List[BatchResult]:
+    """
+    call build for each configuration file, using up to jobs processes
+
+    With more than one job, build must be picklable, e.g. a module-level
+    function or a functools.partial of one. Each worker process keeps its
+    own session for all of the meetings that it builds. The results are
+    given in the order of configs.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    results: List[BatchResult] = []
+
+    def finished(result: BatchResult) -> None:
+        results.append(result)
+        if result.ok:
+            logger.info("Built %s in %.1fs", result.config, result.wall)
+        else:
+            logger.error("Failed to build %s: %s", result.config, result.error)
+        if progress is not None:
+            progress(
+                ProgressEvent("batch", len(results), len(configs), str(result.config))
+            )
+
+    if jobs == 1 or len(configs) <= 1:
+        for config in configs:
+            finished(build_one(build, config))
+        return results
+
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(configs))) as pool:
+        futures = [pool.submit(build_one, build, config) for config in configs]
+        for future in futures:
+            finished(future.result())
+    return results
@@ -0,0 +1,197 @@
+"""
+Building the steps of a meeting: its agenda listing and meeting pack
+
+These are shared by the command line, the watcher and the build service.
+"""
+
+import functools
+import logging
+import os
+from pathlib import Path
+
+from typing import (
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    TYPE_CHECKING,
+    Union,
+)
+
+# agendalisting (python-docx) and pack (PyPDF2, reportlab) are slow to
+# import and are only imported by the steps that need them
+from .meeting import Agenda
+from .batch import BatchResult, BuildSession, current_session, expand_configs, run_batch
+from .buildcache import ConfigCache, StampCache, default_cache_dir, stamp_cache_dir
+from . import config
+from .locator import FileLocator
+from .progress import ProgressCallback
+from .stats import BuildStats
+
+if TYPE_CHECKING:
+    from .pack import MeetingPack, TocEntry
+
+
+logger = logging.getLogger(__name__)
+
+
+def configure(
+    filename: Union[str, Path],
+    *,
+    stats: Optional[BuildStats] = None,
+    use_cache: bool = False,
+) -> Agenda:
+    stats = stats if stats is not None else BuildStats()
+    cache = None
+    if use_cache:
+        cache = ConfigCache(default_cache_dir(FileLocator(filename)))
+
+    with stats.phase("load config") as phase:
+        meeting = config.load(filename, cache)
+        if cache is not None and cache.hits:
+            phase.bytes_read += cache.bytes_read
+        else:
+            phase.bytes_read += os.path.getsize(filename)
+    logger.info("%s", meeting)
+    return meeting
+
+
+def build_listing(
+    meeting: Agenda,
+    locator: FileLocator,
+    *,
+    stats: Optional[BuildStats] = None,
+    progress: Optional[ProgressCallback] = None,
+    session: Optional[BuildSession] = None,
+) -> None:
+    # pylint: disable=import-outside-toplevel
+    from .agendalisting import AgendaListing
+
+    agenda_template = meeting.metadata["agenda_template"]
+    agenda_draft = meeting.metadata["agenda_draft"]
+
+    listing = AgendaListing(
+        meeting,
+        agenda_template,
+        locator,
+        stats=stats,
+        progress=progress,
+        cache=session.templates if session is not None else None,
+    )
+    listing.build()
+    listing.save(agenda_draft)
+
+
+def build_pack(
+    meeting: Agenda,
+    locator: FileLocator,
+    *,
+    jobs: int = 1,
+    stream: bool = False,
+    use_cache: bool = False,
+    stats: Optional[BuildStats] = None,
+    progress: Optional[ProgressCallback] = None,
+    session: Optional[BuildSession] = None,
+    read_ahead: int = 0,
+    stamp_cache: Optional[StampCache] = None,
+) -> None:
+    """
+    build the meeting pack; with read_ahead, up to that many inputs are
+    read ahead of the merge while earlier ones are being stamped
+
+    A stamp_cache that is given is used rather than the one that use_cache
+    opens, e.g. to keep the stamped parts in memory between builds.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .pack import MeetingPack
+
+    agenda_final = meeting.metadata["agenda_final"]
+    meeting_pack = meeting.metadata["meeting_pack"]
+
+    if stamp_cache is None and use_cache:
+        stamp_cache = StampCache(stamp_cache_dir(locator))
+
+    pack = MeetingPack(
+        meeting,
+        agenda_final,
+        locator,
+        cache=session.pdfs if session is not None else None,
+        jobs=jobs,
+        stamp_cache=stamp_cache,
+        stats=stats,
+        progress=progress,
+    )
+    if read_ahead:
+        _build_pipelined(pack, meeting_pack, read_ahead, stream)
+    elif stream:
+        pack.write(meeting_pack)
+    else:
+        pack.build()
+        pack.save(meeting_pack)
+
+
+def _build_pipelined(
+    pack: "MeetingPack", meeting_pack: str, read_ahead: int, stream: bool
+) -> None:
+    """build the pack while up to read_ahead inputs are read ahead"""
+    # pylint: disable=import-outside-toplevel
+    import asyncio
+    from .pipeline import PackPipeline
+
+    pipeline = PackPipeline(pack, read_ahead=read_ahead)
+    if stream:
+        asyncio.run(pipeline.write(meeting_pack))
+    else:
+        asyncio.run(pipeline.build())
+        pack.save(meeting_pack)
+
+
+def build_toc(meeting: Agenda, locator: FileLocator) -> List["TocEntry"]:
+    """the pages on which the agenda and each item will be in the pack"""
+    # pylint: disable=import-outside-toplevel
+    from .pack import MeetingPack
+
+    pack = MeetingPack(meeting, meeting.metadata["agenda_final"], locator)
+    return pack.contents()
+
+
+def build_meeting(
+    config_filename: Union[str, Path],
+    *,
+    steps: Sequence[str] = ("agenda", "pack"),
+    stream: bool = False,
+    use_cache: bool = False,
+) -> None:
+    """build the given steps of one meeting using this process's session"""
+    session = current_session()
+    meeting = configure(config_filename, use_cache=use_cache)
+    locator = FileLocator(config_filename)
+
+    if "agenda" in steps:
+        build_listing(meeting, locator, session=session)
+    if "pack" in steps:
+        build_pack(
+            meeting, locator, stream=stream, use_cache=use_cache, session=session
+        )
+
+
+def build_batch(
+    configs: Iterable[Union[str, Path]],
+    *,
+    steps: Sequence[str] = ("agenda", "pack"),
+    jobs: int = 1,
+    stream: bool = False,
+    use_cache: bool = False,
+    progress: Optional[ProgressCallback] = None,
+) -> List[BatchResult]:
+    """
+    build many meetings, given as filenames or glob patterns
+
+    The meetings are built by up to jobs processes (0 = one per CPU), each
+    sharing its parsed templates and PDF files between the meetings that it
+    builds. A failed meeting does not stop the others; check the results.
+    """
+    build = functools.partial(
+        build_meeting, steps=tuple(steps), stream=stream, use_cache=use_cache
+    )
+    return run_batch(build, expand_configs(configs), jobs=jobs, progress=progress)
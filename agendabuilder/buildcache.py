@@ -0,0 +1,234 @@
+"""
+On-disk caches of parsed configurations and stamped enclosures for rebuilds
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import pickle
+import tempfile
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    Set,
+    TYPE_CHECKING,
+    Union,
+)
+
+from .locator import FileLocator
+
+if TYPE_CHECKING:
+    from .meeting import Agenda
+
+
+CACHE_DIRNAME = ".agendabuilder-cache"
+
+# bump this when the stamped output changes for the same inputs
+CACHE_VERSION = 3
+
+# bump this when the agenda model or its loading from YAML changes
+CONFIG_CACHE_VERSION = 3
+
+
+def default_cache_dir(locator: FileLocator) -> Path:
+    """the cache directory that sits next to the meeting configuration"""
+    return locator.base / CACHE_DIRNAME
+
+
+def stamp_cache_dir(locator: FileLocator) -> Path:
+    """
+    the directory of the stamp cache for one meeting configuration
+
+    Each configuration has its own directory within the cache directory,
+    as a prune of its stamped parts must leave those of the others in the
+    same folder.
+    """
+    name = str(locator.config_filename.resolve()).encode("UTF-8")
+    return default_cache_dir(locator) / "stamps" / hashlib.sha256(name).hexdigest()
+
+
+def file_digest(filename: Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # each writer has a file of its own, so that concurrent builds do not
+    # write into each other's partial entries
+    fd, partial = tempfile.mkstemp(
+        prefix=path.name + ".", suffix=".partial", dir=path.parent
+    )
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(partial, path)
+    except BaseException:
+        os.unlink(partial)
+        raise
+
+
+class ConfigCache:
+    """
+    Parsed meeting configurations from previous runs
+
+    An entry is used without reading the configuration file if its mtime
+    and size are unchanged, and after hashing the file if only its mtime
+    has changed. The entries are pickles; like the configuration itself,
+    the cache directory must only be writable by trusted users.
+    """
+
+    def __init__(self, directory: Union[str, Path]) -> None:
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+
+    def _path(self, filename: Union[str, Path]) -> Path:
+        name = str(Path(filename).resolve()).encode("UTF-8")
+        return self.directory / ("%s.config" % hashlib.sha256(name).hexdigest())
+
+    def get(self, filename: Union[str, Path]) -> Optional["Agenda"]:
+        stat = os.stat(filename)
+        path = self._path(filename)
+        try:
+            data = path.read_bytes()
+            version, mtime, size, digest, meeting = pickle.loads(data)
+        except Exception:  # pylint: disable=broad-except
+            # missing or unreadable entries, e.g. from an older release,
+            # are rebuilt
+            version = None
+
+        if version != CONFIG_CACHE_VERSION or size != stat.st_size:
+            self.misses += 1
+            return None
+
+        if mtime != stat.st_mtime_ns:
+            if digest != file_digest(filename):
+                self.misses += 1
+                return None
+            # only touched, so note the new mtime to skip hashing next time
+            self.put(filename, meeting, digest)
+
+        self.hits += 1
+        self.bytes_read += len(data)
+        return meeting  # type: ignore
+
+    def put(
+        self,
+        filename: Union[str, Path],
+        meeting: "Agenda",
+        digest: Optional[str] = None,
+    ) -> None:
+        stat = os.stat(filename)
+        entry = (
+            CONFIG_CACHE_VERSION,
+            stat.st_mtime_ns,
+            stat.st_size,
+            digest or file_digest(filename),
+            meeting,
+        )
+        _write_atomic(
+            self._path(filename), pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        )
+
+    def __str__(self) -> str:
+        return "Config cache: %d hits, %d misses" % (self.hits, self.misses)
+
+
+class StampCache:
+    """
+    Stamped enclosures from previous builds
+
+    Entries are keyed by the content of the source file, the item number,
+    the starting page and the stamp settings, so that a rebuild only has to
+    stamp the parts whose key has changed. Without a directory, the cache
+    is held in memory for the life of the object.
+    """
+
+    def __init__(self, directory: Optional[Union[str, Path]] = None) -> None:
+        self.directory = Path(directory) if directory is not None else None
+        self._memory: Dict[str, bytes] = {}
+        self._used: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+
+    @staticmethod
+    def key(
+        filename: Union[str, Path],
+        itemnum: Optional[str],
+        start: int,
+        settings: Dict[str, Any],
+        data: Optional[bytes] = None,
+    ) -> str:
+        """the key of a stamped part, hashing data if the file was read already"""
+        if data is not None:
+            source = hashlib.sha256(data).hexdigest()
+        else:
+            source = file_digest(filename)
+        details = {
+            "version": CACHE_VERSION,
+            "source": source,
+            "item": itemnum,
+            "start": start,
+            "settings": settings,
+        }
+        text = json.dumps(details, sort_keys=True)
+        return hashlib.sha256(text.encode("UTF-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / ("%s.pdf" % key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        data: Optional[bytes]
+        if self.directory is None:
+            data = self._memory.get(key)
+        else:
+            try:
+                data = self._path(key).read_bytes()
+                self.bytes_read += len(data)
+            except FileNotFoundError:
+                data = None
+
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._used.add(key)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self._used.add(key)
+
+        if self.directory is None:
+            self._memory[key] = data
+            return
+
+        _write_atomic(self._path(key), data)
+
+    def prune(self) -> None:
+        """
+        remove entries that have not been used since the cache was opened
+        or last pruned, e.g. by the previous build of a long-lived cache
+        """
+        used, self._used = self._used, set()
+        if self.directory is None:
+            for key in set(self._memory) - used:
+                del self._memory[key]
+            return
+
+        if not self.directory.exists():
+            return
+        for path in self.directory.glob("*.pdf"):
+            if path.stem not in used:
+                path.unlink()
+
+    def __str__(self) -> str:
+        return "Stamp cache: %d hits, %d misses" % (self.hits, self.misses)
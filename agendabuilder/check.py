@@ -0,0 +1,213 @@
+"""
+Checking the files of a meeting without building anything
+
+Every file that the agenda and the meeting pack will use is found through
+the FileLocator and checked, many at once, so that a missing or damaged
+attachment is reported in moments rather than part way through a build.
+PDF files are checked from their header, trailer and page tree only.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import mmap
+import os
+from pathlib import Path
+import zlib
+from typing import (
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from .locator import FileLocator
+from .meeting import Agenda
+from .pack import MeetingPack, PackSegment
+from .pagecount import PageCounter, UnsupportedPdf
+from .pdfcache import open_pdf
+from .stats import format_bytes
+
+
+# the header may follow some junk at the start of the file
+_HEADER_SPAN = 1024
+
+# the metadata keys that name the files of a meeting, other than its papers
+_FILE_KEYS = ("agenda_final", "agenda_template", "agenda_draft", "meeting_pack")
+
+
+class FileCheck(NamedTuple):
+    """the result of checking one file"""
+
+    path: Path
+    size: int = 0
+    pages: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def check_pdf(path: Path) -> FileCheck:
+    """
+    check that a file exists and is a readable PDF, counting its pages
+
+    Files whose trailer or page tree cannot be followed directly are parsed
+    in full, as the build would, and are only reported if that fails too.
+    """
+    try:
+        size = path.stat().st_size
+        if size == 0:
+            return FileCheck(path, error="empty file")
+        with open(path, "rb") as fh:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data.find(b"%PDF-", 0, _HEADER_SPAN) < 0:
+                    return FileCheck(path, size, error="not a PDF file")
+                try:
+                    return FileCheck(path, size, PageCounter(data).page_count())
+                except (UnsupportedPdf, ValueError, KeyError, IndexError, zlib.error):
+                    pass
+    except OSError as exc:
+        return FileCheck(path, error=exc.strerror or str(exc))
+
+    try:
+        return FileCheck(path, size, open_pdf(path).getNumPages())
+    except Exception as exc:  # pylint: disable=broad-except
+        return FileCheck(path, size, error="cannot be read: %s" % exc)
+
+
+def check_template(path: Path) -> FileCheck:
+    """check that a file exists and is a readable Word document"""
+    try:
+        with open(path, "rb") as fh:
+            if fh.read(4) != b"PK\x03\x04":
+                return FileCheck(path, error="not a Word document")
+            return FileCheck(path, os.fstat(fh.fileno()).st_size)
+    except OSError as exc:
+        return FileCheck(path, error=exc.strerror or str(exc))
+
+
+def check_output(path: Path) -> FileCheck:
+    """check that an output file can be written"""
+    folder = path.parent
+    if not folder.is_dir():
+        return FileCheck(path, error="folder %s does not exist" % folder)
+    if not os.access(folder, os.W_OK) or (
+        path.exists() and not os.access(path, os.W_OK)
+    ):
+        return FileCheck(path, error="cannot be written")
+    return FileCheck(path)
+
+
+class MeetingCheck:
+    """
+    The results of checking every file of a meeting
+
+    The layout gives each input of the pack, in order, with the page on
+    which it would start and the result of checking it. The projected size
+    of the pack is the total size of its inputs; repeated fonts and images
+    are shared in the pack, so it is usually somewhat smaller.
+    """
+
+    def __init__(
+        self,
+        layout: List[Tuple[PackSegment, FileCheck]],
+        others: Dict[str, FileCheck],
+    ) -> None:
+        self.layout = layout
+        # the agenda template and the outputs, by their metadata key, and
+        # any such keys that are missing from the configuration
+        self.others = others
+
+    @property
+    def pages(self) -> int:
+        return sum(result.pages for _, result in self.layout)
+
+    @property
+    def projected_size(self) -> int:
+        return sum(result.size for _, result in self.layout)
+
+    @property
+    def problems(self) -> List[Tuple[str, FileCheck]]:
+        """the files that failed their checks, as given in the configuration"""
+        problems = [
+            (str(segment.filename), result)
+            for segment, result in self.layout
+            if not result.ok
+        ]
+        problems += [
+            (key, result) for key, result in self.others.items() if not result.ok
+        ]
+        return problems
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    def __str__(self) -> str:
+        lines = []
+        for segment, result in self.layout:
+            if not result.ok:
+                pages = "-"
+            elif result.pages > 1:
+                pages = "%d-%d" % (segment.start, segment.start + result.pages - 1)
+            else:
+                pages = "%d" % segment.start
+            line = "%9s  %9s  %s" % (pages, format_bytes(result.size), segment.filename)
+            if segment.bookmark is not None:
+                line += "  [%s]" % segment.bookmark
+            if not result.ok:
+                line += ": %s" % result.error
+            lines.append(line)
+
+        lines.append(
+            "Meeting pack: %d pages from %d files, about %s"
+            % (self.pages, len(self.layout), format_bytes(self.projected_size))
+        )
+        return "\n".join(lines)
+
+
+def check_meeting(
+    meeting: Agenda,
+    locator: FileLocator,
+    jobs: int = 8,
+) -> MeetingCheck:
+    """
+    check every file that the meeting refers to, with up to jobs threads
+
+    Files that are used more than once are checked once.
+    """
+    metadata = meeting.metadata
+    # keys that are missing are reported against the configuration file
+    others = {
+        key: FileCheck(locator.config_filename, error="missing from the configuration")
+        for key in _FILE_KEYS
+        if not metadata.get(key)
+    }
+
+    segments = list(
+        MeetingPack(meeting, metadata.get("agenda_final", ""), locator).segments()
+    )
+    if "agenda_final" in others:
+        segments = segments[1:]
+    paths = list(dict.fromkeys(Path(segment.path) for segment in segments))
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        template = None
+        if metadata.get("agenda_template"):
+            template = pool.submit(check_template, locator(metadata["agenda_template"]))
+        results = dict(zip(paths, pool.map(check_pdf, paths)))
+
+        if template is not None:
+            others["agenda_template"] = template.result()
+        for key in ("agenda_draft", "meeting_pack"):
+            if metadata.get(key):
+                others[key] = check_output(locator(metadata[key]))
+
+    layout = []
+    pagenum = 1
+    for segment in segments:
+        result = results[Path(segment.path)]
+        layout.append((segment._replace(start=pagenum), result))
+        pagenum += result.pages
+    return MeetingCheck(layout, others)
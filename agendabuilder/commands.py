@@ -1,64 +1,405 @@
 import argparse
+import logging
 from pathlib import Path
+import sys
 
 from typing import (
+    Any,
     List,
     Optional,
+    Tuple,
     Union,
 )
 
 from .meeting import Agenda
-from .agendalisting import AgendaListing
-from .pack import MeetingPack
+from .build import build_batch, build_listing, build_pack, build_toc, configure
+from .buildcache import CACHE_DIRNAME
 from . import config
 from .locator import FileLocator
+from .progress import ProgressBar, configure_logging
+from .stats import BuildStats
 
+# the steps are defined in build, but are part of the interface of commands
+__all__ = [
+    "build_batch",
+    "build_listing",
+    "build_pack",
+    "build_toc",
+    "configure",
+    "main",
+    "make_parser",
+    "report_stats",
+]
 
-def configure(filename: Union[str, Path]) -> Agenda:
-    meeting = config.load(filename)
-    print(meeting)
-    return meeting
+logger = logging.getLogger(__name__)
 
 
-def build_listing(meeting: Agenda, locator: FileLocator) -> None:
-    agenda_template = meeting.metadata["agenda_template"]
-    agenda_draft = meeting.metadata["agenda_draft"]
+def report_stats(
+    stats: BuildStats, style: str, filename: Optional[Union[str, Path]] = None
+) -> None:
+    """write the statistics as text or JSON to a file or stderr"""
+    report = stats.report_json() if style == "json" else stats.report_text()
+    if filename is None:
+        print(report, file=sys.stderr)
+        return
+    with open(filename, "wt", encoding="UTF-8") as fh:
+        fh.write(report + "\n")
 
-    listing = AgendaListing(meeting, agenda_template, locator)
-    listing.build()
-    listing.save(agenda_draft)
 
+def _config_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "config", metavar="meeting.yaml", help="meeting configuration file"
+    )
 
-def build_pack(meeting: Agenda, locator: FileLocator) -> None:
-    agenda_final = meeting.metadata["agenda_final"]
-    meeting_pack = meeting.metadata["meeting_pack"]
 
-    pack = MeetingPack(meeting, agenda_final, locator)
-    pack.build()
-    pack.save(meeting_pack)
+def _cache_argument(parser: argparse.ArgumentParser, stamps: bool = False) -> None:
+    if stamps:
+        text = (
+            "reuse the parsed meeting.yaml and stamped attachments from %s "
+            "next to meeting.yaml"
+        )
+    else:
+        text = "reuse the parsed meeting.yaml from %s next to it"
+    parser.add_argument("--cache", action="store_true", help=text % CACHE_DIRNAME)
 
 
-def main(argv: Optional[List[str]] = None) -> int:
-    """agendabuilder: builds an agenda for a meeting
+def _jobs_argument(parser: argparse.ArgumentParser, default: int, text: str) -> None:
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        metavar="N",
+        type=int,
+        default=default,
+        help=text,
+    )
 
-    ---
-    Examples:
 
-    Build the agenda as a Word document
+def _stream_argument(parser: argparse.ArgumentParser, text: str = "the pack") -> None:
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="write %s straight to disk rather than building it in memory" % text,
+    )
 
-        agendabuilder agenda meeting.yaml
 
-    Combine the agenda and all attachments into a meeting pack
+def _steps_argument(parser: argparse.ArgumentParser, text: str) -> None:
+    parser.add_argument(
+        "--steps",
+        choices=("agenda", "pack", "all"),
+        default="all",
+        help="%s (default: all)" % text,
+    )
 
-        agendabuilder pack meeting.yaml
 
-    The 'meeting.yaml' file contains information about the files that
-    are to be used for the templates and attachments, along with the
-    details of each agenda item.
-    """
-    # Get the help information out of the docstring for the file
-    (description, examples) = main.__doc__.split("---")  # type: ignore
+def _steps(args: argparse.Namespace) -> Tuple[str, ...]:
+    return ("agenda", "pack") if args.steps == "all" else (args.steps,)
+
+
+def _verbosity_arguments(parser: argparse.ArgumentParser) -> None:
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="only report warnings and errors",
+    )
+    verbosity.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="report each item and file as it is processed",
+    )
+
+
+def _progress_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="show a progress bar on stderr",
+    )
+
+
+def _stats_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--stats",
+        "--profile",
+        action="store_true",
+        help="report the time, CPU and I/O of each phase of the build",
+    )
+
+    parser.add_argument(
+        "--stats-format",
+        choices=("text", "json"),
+        default="text",
+        help="format of the --stats report (default: text)",
+    )
+
+    parser.add_argument(
+        "--stats-file",
+        metavar="FILE",
+        help="write the --stats report to FILE rather than stderr",
+    )
+
+
+def _load(
+    args: argparse.Namespace, stats: Optional[BuildStats] = None
+) -> Optional[Agenda]:
+    """the meeting of the command, or None if its configuration has errors"""
+    try:
+        return configure(args.config, stats=stats, use_cache=args.cache)
+    except config.ConfigError as exc:
+        logger.error("%s", exc)
+        return None
+
 
+def _run_build(args: argparse.Namespace) -> int:
+    """build the agenda or the meeting pack"""
+    stats = BuildStats()
+    meeting = _load(args, stats)
+    if meeting is None:
+        return 1
+    locator = FileLocator(args.config)
+    progress = ProgressBar() if args.progress else None
+
+    if args.step == "agenda":
+        build_listing(meeting, locator, stats=stats, progress=progress)
+
+    if args.step == "pack":
+        build_pack(
+            meeting,
+            locator,
+            jobs=args.jobs,
+            stream=args.stream,
+            use_cache=args.cache,
+            stats=stats,
+            progress=progress,
+            read_ahead=args.read_ahead,
+        )
+
+    if args.stats or args.stats_file:
+        report_stats(stats, args.stats_format, args.stats_file)
+
+    return 0
+
+
+def _run_toc(args: argparse.Namespace) -> int:
+    meeting = _load(args)
+    if meeting is None:
+        return 1
+    for entry in build_toc(meeting, FileLocator(args.config)):
+        print(entry)
+    return 0
+
+
+def _run_check(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from .check import check_meeting
+
+    meeting = _load(args)
+    if meeting is None:
+        return 1
+    result = check_meeting(meeting, FileLocator(args.config), jobs=args.jobs)
+    print(result)
+    for name, problem in result.problems:
+        logger.error("%s: %s (%s)", name, problem.error, problem.path)
+    return 0 if result.ok else 1
+
+
+def _run_watch(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from .watch import Watcher
+
+    watcher = Watcher(
+        args.config,
+        steps=_steps(args),
+        debounce=args.debounce,
+        stream=args.stream,
+        use_cache=args.cache,
+    )
+    watcher.run(args.interval)
+    return 0
+
+
+def _run_serve(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from .server import BuildService, make_server, serve
+
+    service = BuildService(
+        args.root, jobs=args.jobs, queue_size=args.queue, use_cache=args.cache
+    )
+    serve(make_server(service, args.host, args.port, args.socket))
+    return 0
+
+
+def _run_batch(args: argparse.Namespace) -> int:
+    results = build_batch(
+        args.configs,
+        steps=_steps(args),
+        jobs=args.jobs,
+        stream=args.stream,
+        use_cache=args.cache,
+        progress=ProgressBar() if args.progress else None,
+    )
+    failed = [result for result in results if not result.ok]
+    logger.info("Built %d of %d meetings", len(results) - len(failed), len(results))
+    return 1 if failed else 0
+
+
+def _add_agenda_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser("agenda", help="build the agenda as a Word document")
+    _config_argument(parser)
+    _cache_argument(parser)
+    _verbosity_arguments(parser)
+    _progress_argument(parser)
+    _stats_arguments(parser)
+    parser.set_defaults(run=_run_build)
+
+
+def _add_pack_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "pack", help="build the meeting pack fro the PDF documents"
+    )
+    _config_argument(parser)
+    _jobs_argument(
+        parser, 1, "number of worker processes for stamping (0 = one per CPU)"
+    )
+    _stream_argument(parser)
+    parser.add_argument(
+        "--read-ahead",
+        metavar="N",
+        type=int,
+        default=0,
+        help="read up to N attachments ahead while earlier ones are stamped, "
+        "for attachments on slow or network drives",
+    )
+    _cache_argument(parser, stamps=True)
+    _verbosity_arguments(parser)
+    _progress_argument(parser)
+    _stats_arguments(parser)
+    parser.set_defaults(run=_run_build)
+
+
+def _add_toc_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "toc", help="list the pages of each item in the meeting pack"
+    )
+    _config_argument(parser)
+    _cache_argument(parser)
+    _verbosity_arguments(parser)
+    parser.set_defaults(run=_run_toc)
+
+
+def _add_check_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "check", help="check the files of the meeting without building anything"
+    )
+    _config_argument(parser)
+    _jobs_argument(
+        parser, 8, "number of files to check at once (0 = one per CPU, default: 8)"
+    )
+    _cache_argument(parser)
+    _verbosity_arguments(parser)
+    parser.set_defaults(run=_run_check)
+
+
+def _add_watch_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "watch", help="rebuild the agenda and pack whenever their inputs change"
+    )
+    _config_argument(parser)
+    _steps_argument(parser, "what to rebuild")
+    parser.add_argument(
+        "--interval",
+        metavar="SECONDS",
+        type=float,
+        default=0.2,
+        help="how often to check for changes (default: 0.2)",
+    )
+    parser.add_argument(
+        "--debounce",
+        metavar="SECONDS",
+        type=float,
+        default=0.3,
+        help="wait until files have not changed for this long (default: 0.3)",
+    )
+    _stream_argument(parser)
+    _cache_argument(parser, stamps=True)
+    _verbosity_arguments(parser)
+    parser.set_defaults(run=_run_watch)
+
+
+def _add_serve_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "serve", help="build agendas and packs on request over HTTP"
+    )
+    parser.add_argument(
+        "--root",
+        metavar="DIR",
+        default=".",
+        help="directory that holds the meeting configurations (default: .)",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="address to listen on (default: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="port to listen on (default: 8080)",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="listen on a Unix socket at PATH rather than on a port",
+    )
+    _jobs_argument(
+        parser, 2, "number of worker processes (0 = one per CPU, default: 2)"
+    )
+    parser.add_argument(
+        "--queue",
+        metavar="N",
+        type=int,
+        default=8,
+        help="number of requests that may wait for a worker (default: 8)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="reuse the parsed meeting.yaml and stamped attachments from %s "
+        "next to each meeting.yaml" % CACHE_DIRNAME,
+    )
+    _verbosity_arguments(parser)
+    parser.set_defaults(run=_run_serve)
+
+
+def _add_batch_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "batch", help="build the agendas and packs of many meetings"
+    )
+    parser.add_argument(
+        "configs",
+        metavar="meeting.yaml",
+        nargs="+",
+        help="meeting configuration files or glob patterns",
+    )
+    _steps_argument(parser, "what to build for each meeting")
+    _jobs_argument(parser, 1, "number of meetings to build at once (0 = one per CPU)")
+    _stream_argument(parser, "each pack")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="reuse the parsed meeting.yaml and stamped attachments from %s "
+        "next to each meeting.yaml" % CACHE_DIRNAME,
+    )
+    _verbosity_arguments(parser)
+    _progress_argument(parser)
+    parser.set_defaults(run=_run_batch)
+
+
+def make_parser(description: str, examples: str) -> argparse.ArgumentParser:
+    """the parser of the command line, with a sub command for each action"""
     parser = argparse.ArgumentParser(
         description=description,
         epilog=examples,
@@ -69,37 +410,93 @@ def main(argv: Optional[List[str]] = None) -> int:
     subparsers = parser.add_subparsers(dest="step")
     subparsers.required = True
 
-    # agenda builder
-    agenda_parser = subparsers.add_parser(
-        "agenda", help="build the agenda as a Word document"
-    )
+    _add_agenda_parser(subparsers)
+    _add_pack_parser(subparsers)
+    _add_toc_parser(subparsers)
+    _add_check_parser(subparsers)
+    _add_watch_parser(subparsers)
+    _add_serve_parser(subparsers)
+    _add_batch_parser(subparsers)
+    return parser
 
-    agenda_parser.add_argument(
-        "config", metavar="meeting.yaml", help="meeting configuration file"
-    )
 
-    # meeting pack builder
-    pack_parser = subparsers.add_parser(
-        "pack", help="build the meeting pack fro the PDF documents"
-    )
+def main(argv: Optional[List[str]] = None) -> int:
+    """agendabuilder: builds an agenda for a meeting
 
-    pack_parser.add_argument(
-        "config", metavar="meeting.yaml", help="meeting configuration file"
-    )
+    ---
+    Examples:
 
-    args = parser.parse_args(argv)
+    Build the agenda as a Word document
 
-    config_filename = args.config
-    run_build_listing = args.step == "agenda"
-    run_build_pack = args.step == "pack"
+        agendabuilder agenda meeting.yaml
 
-    meeting = configure(config_filename)
-    locator = FileLocator(config_filename)
+    Combine the agenda and all attachments into a meeting pack
 
-    if run_build_listing:
-        build_listing(meeting, locator)
+        agendabuilder pack meeting.yaml
 
-    if run_build_pack:
-        build_pack(meeting, locator)
+    Stamp the attachments using 8 worker processes
 
-    return 0
+        agendabuilder pack --jobs 8 meeting.yaml
+
+    Read the attachments from a network drive four at a time while
+    earlier ones are being stamped
+
+        agendabuilder pack --read-ahead 4 meeting.yaml
+
+    Rebuild the meeting pack, only reloading meeting.yaml if it has changed
+    and only restamping the attachments that changed
+
+        agendabuilder pack --cache meeting.yaml
+
+    Build the agendas and packs of every committee, four at a time
+
+        agendabuilder batch --jobs 4 'committees/*/meeting.yaml'
+
+    List the pages of the meeting pack on which each item starts, without
+    building it
+
+        agendabuilder toc meeting.yaml
+
+    Check that every attachment exists and is a readable PDF, showing the
+    layout and projected size of the pack, without building anything
+
+        agendabuilder check meeting.yaml
+
+    Rebuild the agenda and meeting pack whenever meeting.yaml, the template
+    or any of the attachments change, until interrupted with Ctrl-C
+
+        agendabuilder watch meeting.yaml
+
+    Serve builds of the meetings under committees/ to a local portal on
+    port 8080, building up to four at a time
+
+        agendabuilder serve --root committees --jobs 4 --port 8080
+        curl -d '{"config": "finance/meeting.yaml"}' -o pack.pdf \\
+            http://localhost:8080/pack
+
+    Build the meeting pack quietly, showing only a progress bar
+
+        agendabuilder pack --quiet --progress meeting.yaml
+
+    Report the time taken by each phase of the build
+
+        agendabuilder pack --stats meeting.yaml
+        agendabuilder pack --stats-format json --stats-file stats.json meeting.yaml
+
+    The 'meeting.yaml' file contains information about the files that
+    are to be used for the templates and attachments, along with the
+    details of each agenda item.
+    """
+    # Get the help information out of the docstring for the file
+    description, examples = main.__doc__.split("---")  # type: ignore
+
+    args = make_parser(description, examples).parse_args(argv)
+
+    if args.quiet:
+        configure_logging(logging.WARNING)
+    elif args.verbose:
+        configure_logging(logging.DEBUG)
+    else:
+        configure_logging(logging.INFO)
+
+    return args.run(args)  # type: ignore
@@ -1,41 +1,272 @@
 from pathlib import Path
 from typing import (
+    Any,
+    Dict,
+    IO,
+    Iterator,
     List,
+    Optional,
+    Tuple,
+    Type,
     Union,
 )
 
 import ruamel.yaml
+from ruamel.yaml.composer import Composer
+from ruamel.yaml.events import SequenceEndEvent, SequenceStartEvent, StreamEndEvent
+from ruamel.yaml.nodes import SequenceNode
 
-from .meeting import Agenda, AgendaItem, AgendaHeading, ItemBase
+from .buildcache import ConfigCache
+from .meeting import Agenda, AgendaItem, AgendaHeading, AgendaSubItem, ItemBase
 
+# the keys allowed in each kind of entry and the type of their values
+SCHEMA: Dict[str, Dict[str, type]] = {
+    "metadata": {"metadata": dict},
+    "heading": {"heading": str},
+    "item": {
+        "item": str,
+        "who": str,
+        "action": str,
+        "cover": str,
+        "pages": list,
+        "starred": bool,
+        "items": list,
+    },
+}
 
-def load(filename: Union[str, Path]) -> Agenda:
-    with open(filename, "rt") as fh:
-        details = ruamel.yaml.safe_load(fh)  # type: ignore
+# sub-items, given as the items of an item, have the same keys as an item
+# but cannot have sub-items of their own
+SUBITEM_SCHEMA = {key: kind for key, kind in SCHEMA["item"].items() if key != "items"}
 
-    meeting_items: List[ItemBase] = []
+TYPE_NAMES = {dict: "a mapping", str: "text", list: "a list", bool: "true or false"}
 
-    for part in details:
-        if "heading" in part:
-            heading = AgendaHeading(title=part["heading"])
-            meeting_items.append(heading)
 
-        elif "item" in part:
-            item = AgendaItem(
-                title=part["item"],
-                who=part.get("who", ""),
-                cover=part.get("cover", None),
-                pages=part.get("pages", None),
-                starred=part.get("starred", False),
-                action=part.get("action", "Note"),
+class ConfigError(ValueError):
+    """the problems found in a configuration file, each with its line number"""
+
+    def __init__(self, filename: Union[str, Path], errors: List[Tuple[int, str]]):
+        self.filename = filename
+        self.errors = errors
+        super().__init__(
+            "\n".join(
+                "%s:%d: %s" % (filename, line, message) for line, message in errors
             )
-            meeting_items.append(item)
-        elif "metadata" in part:
-            metadata = part["metadata"]
+        )
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # so that errors found in worker processes reach the parent intact
+        return (type(self), (self.filename, self.errors))
+
+
+def _line(node: Any) -> int:
+    return node.start_mark.line + 1  # type: ignore
+
+
+class ConfigStream:
+    """
+    The entries of a configuration file, checked and converted one by one
+
+    Iterating yields each heading and item as soon as it has been parsed,
+    so that a large file can be processed before it has been read in full;
+    the metadata is available once its entry has been reached. Entries that
+    do not match the schema are skipped and, once the whole file has been
+    checked, all of the problems are raised together as a ConfigError.
+    """
+
+    def __init__(self, filename: Union[str, Path]) -> None:
+        self.filename = filename
+        self.metadata: Optional[Dict[str, Any]] = None
+        self.errors: List[Tuple[int, str]] = []
+        self._loader: Any = None
+
+    def __iter__(self) -> Iterator[ItemBase]:
+        with open(self.filename, "rt", encoding="UTF-8") as fh:
+            for node in self._streamed_nodes(fh):
+                yield from self._entry(node)
+        self._finish()
+
+    def agenda(self) -> Agenda:
+        """all of the entries as a meeting, parsing the file in one go"""
+        with open(self.filename, "rt", encoding="UTF-8") as fh:
+            items = [
+                entry
+                for node in self._document_nodes(fh)
+                for entry in self._entry(node)
+            ]
+        self._finish()
+
+        meeting = Agenda(items)
+        meeting.metadata = self.metadata  # type: ignore
+        return meeting
+
+    def _open(self, fh: IO[str]) -> Tuple[Any, Any]:
+        """
+        the parser and composer of a file, keeping its constructor for the
+        entries
+
+        The C parser also composes and constructs, but without the C
+        extension these are separate objects of the YAML instance.
+        """
+        # the safe loader gives the same YAML 1.2 results as
+        # ruamel.yaml.safe_load, and uses the C parser where available
+        yaml = ruamel.yaml.YAML(typ="safe")
+        self._loader, parser = yaml.get_constructor_parser(fh)
+        if parser is self._loader:
+            return parser, Composer(loader=parser)
+        return parser, yaml.composer
+
+    def _document_nodes(self, fh: IO[str]) -> List[Any]:
+        """the entries of the top level sequence, composed all at once"""
+        parser, composer = self._open(fh)
+        # the C parser composes the whole document itself
+        if hasattr(parser, "get_single_node"):
+            root = parser.get_single_node()
         else:
-            raise ValueError("Don't know how to understand this part: " + str(part))
+            root = composer.get_single_node()
+        if root is None or not isinstance(root, SequenceNode):
+            self._not_a_list(root)
+            return []
+        return root.value  # type: ignore
+
+    def _streamed_nodes(self, fh: IO[str]) -> Iterator[Any]:
+        """the entries of the top level sequence, composed one at a time"""
+        parser, composer = self._open(fh)
+
+        parser.get_event()  # stream start
+        if parser.check_event(StreamEndEvent):
+            self._not_a_list(None)
+            return
+        parser.get_event()  # document start
+        if not parser.check_event(SequenceStartEvent):
+            self._not_a_list(composer.compose_node(None, None))
+            return
+        parser.get_event()
+
+        while not parser.check_event(SequenceEndEvent):
+            yield composer.compose_node(None, None)
+
+    def _not_a_list(self, root: Any) -> None:
+        line = _line(root) if root is not None else 1
+        self.errors.append((line, "expected a list of headings and items"))
 
-    meeting = Agenda(meeting_items)
-    meeting.metadata = metadata
+    def _error(self, node: Any, message: str) -> None:
+        self.errors.append((_line(node), message))
 
+    def _entry(self, node: Any) -> List[ItemBase]:
+        """check one entry against the schema and convert it"""
+        part = self._loader.construct_document(node)
+        if not isinstance(part, dict):
+            self._error(node, "expected a heading, item or metadata")
+            return []
+
+        kinds = [kind for kind in SCHEMA if kind in part]
+        if len(kinds) != 1:
+            if kinds:
+                message = "expected only one of %s" % ", ".join(kinds)
+            else:
+                message = "expected a heading, item or metadata"
+            self._error(node, message)
+            return []
+
+        kind = kinds[0]
+        if not self._check(node, part, kind, SCHEMA[kind]):
+            return []
+
+        if kind == "heading":
+            return [AgendaHeading(title=part["heading"])]
+
+        if kind == "item":
+            entries: List[ItemBase] = [self._item(AgendaItem, part)]
+            for key_node, value_node in node.value:
+                if key_node.value == "items" and part["items"]:
+                    entries.extend(self._subitems(value_node, part["items"]))
+            return entries
+
+        if self.metadata is not None:
+            self._error(node, "metadata is given more than once")
+        self.metadata = part["metadata"] or {}
+        return []
+
+    def _check(
+        self, node: Any, part: Dict[str, Any], kind: str, schema: Dict[str, type]
+    ) -> bool:
+        """check the keys and values of an entry, reporting any problems"""
+        valid = True
+        for key_node, value_node in node.value:
+            key = key_node.value
+            value = part.get(key)
+            if key not in schema:
+                self._error(key_node, "unknown key '%s' for %s" % (key, kind))
+                valid = False
+            elif value is None and key == kind and kind != "metadata":
+                self._error(value_node, "%s must not be empty" % key)
+                valid = False
+            elif value is not None and not isinstance(value, schema[key]):
+                self._error(
+                    value_node, "%s should be %s" % (key, TYPE_NAMES[schema[key]])
+                )
+                valid = False
+            elif (
+                key == "pages"
+                and isinstance(value, list)
+                and not all(isinstance(p, str) for p in value)
+            ):
+                self._error(value_node, "pages should be a list of filenames")
+                valid = False
+        return valid
+
+    def _subitems(self, node: Any, parts: List[Any]) -> List[ItemBase]:
+        """check and convert the sub-items of an item"""
+        subitems: List[ItemBase] = []
+        for subnode, part in zip(node.value, parts):
+            if not isinstance(part, dict) or "item" not in part:
+                self._error(subnode, "expected a sub-item")
+            elif self._check(subnode, part, "item", SUBITEM_SCHEMA):
+                subitems.append(self._item(AgendaSubItem, part))
+        return subitems
+
+    @staticmethod
+    def _item(item_type: Type[AgendaItem], part: Dict[str, Any]) -> AgendaItem:
+        return item_type(
+            title=part["item"],
+            who=part.get("who", ""),
+            cover=part.get("cover", None),
+            pages=part.get("pages", None),
+            starred=part.get("starred", False),
+            action=part.get("action", "Note"),
+        )
+
+    def _finish(self) -> None:
+        if self.metadata is None and not self.errors:
+            self.errors.append((1, "no metadata entry was found"))
+        if self.errors:
+            self.errors.sort()
+            raise ConfigError(self.filename, self.errors)
+
+
+def load(filename: Union[str, Path], cache: Optional[ConfigCache] = None) -> Agenda:
+    """
+    load the meeting from its configuration file
+
+    With a cache, the meeting is reused from a previous load if the file
+    has not changed.
+    """
+    if cache is not None:
+        meeting = cache.get(filename)
+        if meeting is not None:
+            return meeting
+
+    meeting = parse(filename)
+
+    if cache is not None:
+        cache.put(filename, meeting)
     return meeting
+
+
+def parse(filename: Union[str, Path]) -> Agenda:
+    return ConfigStream(filename).agenda()
+
+
+def stream(filename: Union[str, Path]) -> ConfigStream:
+    """the headings and items of a configuration file, as they are parsed"""
+    return ConfigStream(filename)
@@ -6,7 +6,8 @@ from typing import (
 
 class FileLocator:
     def __init__(self, config_filename: Union[str, Path]) -> None:
-        self.base = Path(config_filename).parent
+        self.config_filename = Path(config_filename)
+        self.base = self.config_filename.parent
 
     def find(self, filename: Union[str, Path]) -> Path:
         loc = Path(filename)
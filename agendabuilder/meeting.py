@@ -12,6 +12,10 @@ from typing import (
 
 
 class ItemNumber:
+    # the model uses __slots__ as archives of meetings can hold tens of
+    # thousands of items
+    __slots__ = ("a", "b", "c", "sep")
+
     def __init__(
         self,
         a: int = 0,
@@ -35,6 +39,8 @@ class ItemNumber:
 
 
 class ItemBase:
+    __slots__ = ("cover", "title", "who", "num", "duration", "pages")
+
     def __init__(
         self,
         title: Optional[str] = None,
@@ -49,6 +55,8 @@ class ItemBase:
 
 
 class AgendaItem(ItemBase):
+    __slots__ = ("action", "starred")
+
     def __init__(
         self,
         title: Optional[str] = None,
@@ -62,12 +70,24 @@ class AgendaItem(ItemBase):
         self.who = who
         self.pages = pages or []
         self.action = action
-        self.num = ItemNumber()
-        self.duration = 0
         self.starred = starred
 
 
+class AgendaSubItem(AgendaItem):
+    """
+    an item within the item before it, numbered e.g. 4.2.1
+
+    A sub-item with no item before it in its section, e.g. one straight
+    after a heading, is numbered as an item so that it does not take the
+    number of the heading.
+    """
+
+    __slots__ = ()
+
+
 class AgendaHeading(ItemBase):
+    __slots__ = ()
+
     def __init__(
         self,
         title: Optional[str] = None,
@@ -77,29 +97,130 @@ class AgendaHeading(ItemBase):
 
 class Agenda:
     def __init__(self, items: Optional[List[ItemBase]] = None):
+        # sub-items come straight after the item that they belong to
         self.items = items or []
         self.metadata: Dict[str, str] = {}
+        # item number -> heading or item
+        self._index: Dict[str, ItemBase] = {}
         self.number_items()
 
     def append(self, item: ItemBase) -> None:
         self.items.append(item)
-        self.number_items()
+        self._renumber_from(len(self.items) - 1)
 
     def extend(self, items: List[ItemBase]) -> None:
+        start = len(self.items)
         self.items.extend(items)
-        self.number_items()
+        self._renumber_from(start)
+
+    def insert(self, index: int, item: ItemBase) -> None:
+        index = self._position(index, inserting=True)
+        self.items.insert(index, item)
+        self._renumber_from(index)
+
+    def pop(self, index: int = -1) -> ItemBase:
+        index = self._position(index)
+        item = self.items.pop(index)
+        self._forget(item)
+        self._renumber_from(index)
+        return item
+
+    def remove(self, item: ItemBase) -> None:
+        self.pop(self.items.index(item))
+
+    def move(self, old_index: int, new_index: int) -> None:
+        """move the item at old_index so that it is at new_index"""
+        old_index = self._position(old_index)
+        new_index = self._position(new_index)
+        item = self.items.pop(old_index)
+        self.items.insert(new_index, item)
+        self._renumber_from(min(old_index, new_index), max(old_index, new_index))
+
+    def find(self, number: str) -> ItemBase:
+        """the heading, item or sub-item with the given number, e.g. '3.1'"""
+        return self._index[number]
+
+    def _position(self, index: int, inserting: bool = False) -> int:
+        """
+        the position in items of index, which counts from the end if it is
+        negative, as for a list; inserting also allows the end of the items
+        """
+        length = len(self.items)
+        position = index + length if index < 0 else index
+        if not 0 <= position < length + inserting:
+            raise IndexError("agenda index %d out of range" % index)
+        return position
+
+    def _forget(self, item: ItemBase) -> None:
+        number = str(item.num)
+        if self._index.get(number) is item:
+            del self._index[number]
+
+    def _renumber_from(self, start: int, end: Optional[int] = None) -> None:
+        """
+        renumber the items from start onwards, stopping once the numbers
+        are unchanged beyond end, which is start unless given
+
+        The numbers after a heading only depend on the number of the
+        heading, so once a heading beyond the change keeps its number, the
+        rest of the agenda is already correct. A move changes every item
+        between its two positions, so they must all be renumbered first.
+        """
+        if end is None:
+            end = start
+        if start > 0:
+            previous = self.items[start - 1].num
+            section = previous.a
+            subsection = previous.b or 0
+            part = previous.c or 0
+        else:
+            section = 0
+            subsection = 0
+            part = 0
+
+        for position in range(start, len(self.items)):
+            item = self.items[position]
+            if isinstance(item, AgendaHeading):
+                section += 1
+                subsection = 0
+                part = 0
+                num = item.num
+                if position > end and num.a == section and num.b == subsection:
+                    return
+            elif isinstance(item, AgendaSubItem) and subsection:
+                part += 1
+            elif isinstance(item, AgendaItem):
+                subsection += 1
+                part = 0
+            self._set_number(item, section, subsection, part)
+
+    def _set_number(
+        self, item: ItemBase, section: int, subsection: int, part: int
+    ) -> None:
+        self._forget(item)
+        item.num.a = section
+        item.num.b = subsection
+        item.num.c = part
+        if isinstance(item, (AgendaHeading, AgendaItem)):
+            self._index[str(item.num)] = item
 
     def number_items(self) -> None:
+        """number every item from the start, e.g. after changing items"""
+        self._index.clear()
         section = 0
         subsection = 0
+        part = 0
         for item in self.items:
             if isinstance(item, AgendaHeading):
                 section += 1
                 subsection = 0
-            if isinstance(item, AgendaItem):
+                part = 0
+            elif isinstance(item, AgendaSubItem) and subsection:
+                part += 1
+            elif isinstance(item, AgendaItem):
                 subsection += 1
-            item.num.a = section
-            item.num.b = subsection
+                part = 0
+            self._set_number(item, section, subsection, part)
 
     def enclosures(self) -> Iterator[Tuple[str, str, str, List[str]]]:
         for item in self.items:
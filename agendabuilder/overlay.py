@@ -0,0 +1,226 @@
+"""
+Lightweight text overlays for stamping pages of the meeting pack
+
+Rather than drawing each stamp as a separate PDF document and merging it
+page by page, the text is written as a tiny content stream that is
+appended to the page, using a font resource, and a graphics state for
+translucent stamps, that are shared by every page stamped with the same
+PendingObjects. The writer shares them with identical objects of other
+documents, so a pack has one of each.
+"""
+
+from typing import (
+    Optional,
+    Tuple,
+)
+
+from PyPDF2.generic import (  # type: ignore
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    FloatObject,
+    IndirectObject,
+    NameObject,
+    StreamObject,
+)
+from PyPDF2.pdf import PageObject  # type: ignore
+from reportlab.pdfbase.pdfmetrics import standardFonts, stringWidth  # type: ignore
+
+from .packwriter import PendingObjects
+
+
+ALIGNMENTS = ("left", "centre", "right")
+
+
+def hex_color(color: str) -> Tuple[float, float, float]:
+    """convert '#rrggbb' into RGB components in the range 0-1"""
+    value = color.lstrip("#")
+    if len(value) != 6:
+        raise ValueError("Unknown colour '%s'" % color)
+    return (
+        int(value[0:2], 16) / 255,
+        int(value[2:4], 16) / 255,
+        int(value[4:6], 16) / 255,
+    )
+
+
+def pdf_number(value: float) -> bytes:
+    text = ("%.4f" % value).rstrip("0").rstrip(".")
+    return (text if text not in ("", "-0") else "0").encode("ASCII")
+
+
+def pdf_string(text: str) -> bytes:
+    """a literal string in the WinAnsiEncoding of the standard fonts"""
+    data = text.encode("cp1252", errors="replace")
+    data = data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return b"(" + data + b")"
+
+
+class TextOverlay:
+    """
+    Draws single lines of text onto pages that will be added to a writer
+
+    Only the standard 14 PDF fonts are supported, as they need no embedding.
+    """
+
+    def __init__(
+        self,
+        objects: PendingObjects,
+        font_name: str = "Helvetica",
+        font_size: float = 9,
+        color: str = "#000000",
+        align: str = "left",
+        prefix: str = "AB",
+        opacity: float = 1.0,
+    ) -> None:
+        if font_name not in standardFonts:
+            raise ValueError("Font '%s' is not a standard PDF font" % font_name)
+        if align not in ALIGNMENTS:
+            raise ValueError("Unknown alignment '%s'" % align)
+        if not 0 <= opacity <= 1:
+            raise ValueError("Opacity %s is not between 0 and 1" % opacity)
+
+        self.objects = objects
+        self.font_name = font_name
+        self.font_size = font_size
+        self.color = hex_color(color)
+        self.align = align
+        self.prefix = prefix
+        self.opacity = opacity
+
+        self.font = objects.shared_object(("font", font_name), self._font_dictionary)
+        self.save_state = objects.shared_object(("content", "q"), self._save_stream)
+        # opaque stamps need no graphics state of their own
+        self.graphics_state: Optional[IndirectObject] = None
+        if opacity < 1:
+            self.graphics_state = objects.shared_object(
+                ("extgstate", opacity), self._graphics_state_dictionary
+            )
+
+    def _font_dictionary(self) -> DictionaryObject:
+        font = DictionaryObject()
+        font[NameObject("/Type")] = NameObject("/Font")
+        font[NameObject("/Subtype")] = NameObject("/Type1")
+        font[NameObject("/BaseFont")] = NameObject("/" + self.font_name)
+        if self.font_name not in ("Symbol", "ZapfDingbats"):
+            font[NameObject("/Encoding")] = NameObject("/WinAnsiEncoding")
+        return font
+
+    def _graphics_state_dictionary(self) -> DictionaryObject:
+        state = DictionaryObject()
+        state[NameObject("/Type")] = NameObject("/ExtGState")
+        state[NameObject("/ca")] = FloatObject(pdf_number(self.opacity).decode())
+        state[NameObject("/CA")] = FloatObject(pdf_number(self.opacity).decode())
+        return state
+
+    @staticmethod
+    def _save_stream() -> DecodedStreamObject:
+        stream = DecodedStreamObject()
+        stream.setData(b"q\n")
+        return stream
+
+    def _resource_name(
+        self, resources: DictionaryObject, suffix: str, obj: IndirectObject
+    ) -> NameObject:
+        """a resource name on the page that is free or already refers to obj"""
+        base = "/%s%s" % (self.prefix, suffix)
+        name = base
+        counter = 1
+        # dict.get avoids PyPDF2 resolving the reference for comparison
+        while name in resources and dict.get(resources, name) != obj:
+            name = "%s%d" % (base, counter)
+            counter += 1
+        return NameObject(name)
+
+    def _add_resource(
+        self,
+        resources: DictionaryObject,
+        category: str,
+        suffix: str,
+        obj: IndirectObject,
+    ) -> NameObject:
+        """
+        refer to obj from a copy of one category of the page's resources,
+        returning its name
+        """
+        entries = resources.get(category, DictionaryObject()).getObject()
+        entries = DictionaryObject(entries)
+        name = self._resource_name(entries, suffix, obj)
+        entries[name] = obj
+        resources[NameObject(category)] = entries
+        return name
+
+    def content(
+        self,
+        text: str,
+        x: float,
+        y: float,
+        resource: str,
+        state: Optional[str] = None,
+    ) -> bytes:
+        """
+        the operators that draw the text at the location, with the named
+        graphics state if any
+        """
+        width = stringWidth(text, self.font_name, self.font_size)
+        if self.align == "centre":
+            x -= width / 2
+        elif self.align == "right":
+            x -= width
+
+        operators = [
+            b"BT",
+            resource.encode("ASCII"),
+            pdf_number(self.font_size),
+            b"Tf",
+            b" ".join(pdf_number(c) for c in self.color),
+            b"rg",
+            pdf_number(x),
+            pdf_number(y),
+            b"Td",
+            pdf_string(text),
+            b"Tj",
+            b"ET",
+        ]
+        if state is not None:
+            # restored afterwards so that later stamps on the page are not
+            # affected by it
+            operators = [b"q", state.encode("ASCII"), b"gs"] + operators + [b"Q"]
+        return b" ".join(operators) + b"\n"
+
+    def apply(self, page: PageObject, text: str, x: float, y: float) -> None:
+        """
+        draw the text on top of the page, modifying the page in place
+
+        Only the page's own dictionary is changed, so a shallow copy of a
+        page from a reader can be stamped without altering the reader.
+        """
+        resources = page.get("/Resources", DictionaryObject()).getObject()
+        resources = DictionaryObject(resources)
+        suffix = self.font_name.replace("-", "")
+        name = self._add_resource(resources, "/Font", suffix, self.font)
+        state = None
+        if self.graphics_state is not None:
+            state = self._add_resource(
+                resources, "/ExtGState", "GS", self.graphics_state
+            )
+        page[NameObject("/Resources")] = resources
+
+        # the existing content is wrapped in q ... Q so that the overlay is
+        # drawn with the default graphics state
+        contents = ArrayObject([self.save_state])
+        existing = page.get("/Contents")
+        if existing is not None:
+            value = existing.getObject()
+            if isinstance(value, ArrayObject):
+                contents.extend(value)
+            elif isinstance(existing, IndirectObject):
+                contents.append(existing)
+            elif isinstance(value, StreamObject):
+                contents.append(self.objects.add_object(value))
+
+        overlay = DecodedStreamObject()
+        overlay.setData(b"\nQ\n" + self.content(text, x, y, name, state))
+        contents.append(self.objects.add_object(overlay))
+
+        page[NameObject("/Contents")] = contents
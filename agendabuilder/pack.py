@@ -2,115 +2,182 @@
 Representation of the meeting pack for a meeting
 """
 
+import abc
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import contextlib
+import copy
+import logging
 from pathlib import Path
 import io
+import os
+import time
 
 from typing import (
-    Callable,
+    Any,
+    Deque,
+    Dict,
     IO,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
     Optional,
     Tuple,
     Union,
 )
 
-from PyPDF2 import PdfFileReader, PdfFileWriter, PdfFileMerger  # type: ignore
-from reportlab.pdfgen import canvas  # type: ignore
-import reportlab.lib.colors  # type: ignore
+from PyPDF2 import PdfFileReader  # type: ignore
+from PyPDF2.pdf import PageObject  # type: ignore
 
+from .buildcache import StampCache
 from .meeting import Agenda
 from .locator import FileLocator
+from .overlay import TextOverlay
+from .packwriter import PackWriter, PendingObjects
+from .pagecount import count_pages
+from .pdfcache import PdfDocumentCache, open_pdf
+from .progress import ProgressCallback, ProgressEvent
+from .stats import BuildStats, format_bytes
 
 
-class AgendaPdfPart:
+logger = logging.getLogger(__name__)
+
+
+class AgendaPdfPart(abc.ABC):
     def __init__(
         self,
-        fh: Optional[Union[IO[bytes], str]] = None,
+        fh: Optional[Union[IO[bytes], str, PdfFileReader]] = None,
+        cache: Optional[PdfDocumentCache] = None,
     ) -> None:
-        self.fh = fh  # can actually be a file handle or filename
+        # can actually be a file handle, filename or an already parsed reader
+        self.fh = fh
+        self.cache = cache
+        self._reader: Optional[PdfFileReader] = None
         self.font_name = "Helvetica"
         self.font_size = 9
         self.font_color = "#000000"
+        # 1 = opaque; lower values let the page show through the stamp
+        self.opacity = 1.0
         self.location = (0.0, 0.0)
+        # align is: left, centre or right of the location
+        self.align = "left"
         # mode is: first = first page only; repeat = same every page; match = 1:1
         self.mode = "first"
+        # prefix for the stamp's resource names on each page
+        self.resource_prefix = "AB"
+
+    def settings(self) -> Dict[str, Any]:
+        """the parameters that determine how the stamp looks"""
+        return {
+            "type": type(self).__name__,
+            "font_name": self.font_name,
+            "font_size": self.font_size,
+            "font_color": self.font_color,
+            "opacity": self.opacity,
+            "location": list(self.location),
+            "align": self.align,
+            "mode": self.mode,
+        }
+
+    def reader(self) -> PdfFileReader:
+        """parse the input document, once only"""
+        if self._reader is None:
+            if isinstance(self.fh, PdfFileReader):
+                self._reader = self.fh
+            elif self.cache is not None:
+                self._reader = self.cache.get(self.fh)  # type: ignore
+            elif isinstance(self.fh, (str, Path)):
+                self._reader = open_pdf(self.fh)
+            else:
+                self._reader = PdfFileReader(self.fh)
+        return self._reader
 
     def page_size(self, num: int = 0) -> Tuple[float, float]:
-        reader = PdfFileReader(self.fh)
-        box = reader.getPage(num).mediaBox
+        box = self.reader().getPage(num).mediaBox
         return (float(box.getWidth()), float(box.getHeight()))
 
     def num_pages(self) -> int:
-        pdf = PdfFileReader(self.fh)
-        return pdf.getNumPages()  # type: ignore
-
-    def stamp(self, stamp: PdfFileReader) -> IO[bytes]:
-        output = PdfFileWriter()
-
-        original_pdf = PdfFileReader(self.fh)
+        return self.reader().getNumPages()  # type: ignore
 
+    def position(self) -> Tuple[float, float]:
+        """the stamp location, with -ve values measured from the top right"""
+        size = self.page_size(0)
+        x, y = [float(v) for v in self.location]
+        x = float(x if (x > 0) else x + size[0])
+        y = float(y if (y > 0) else y + size[1])
+        return (x, y)
+
+    @abc.abstractmethod
+    def text(self, page_num: int) -> Optional[str]:
+        """the text to stamp on a page; None for no stamp"""
+
+    def pages(self) -> List[PageObject]:
+        """
+        copies of the pages of the input that can be stamped
+
+        Only the page dictionaries are copied so that the (possibly cached)
+        reader is left untouched; their content and resources are shared.
+        """
+        original_pdf = self.reader()
+        return [
+            copy.copy(original_pdf.getPage(page_num))
+            for page_num in range(original_pdf.getNumPages())
+        ]
+
+    def stamp_pages(
+        self, pages: Iterable[PageObject], objects: PendingObjects
+    ) -> Iterator[PageObject]:
+        """
+        apply the stamp to pages of the input in place, ready for a writer,
+        with the objects it needs held in objects
+
+        The pages may already carry other stamps held in the same objects.
+        """
         if self.mode not in ("first", "repeat", "match"):
             raise ValueError("Unknown stamping mode '%s'" % self.mode)
 
-        if self.mode in ("first", "repeat"):
-            overlay = stamp.getPage(0)
-
-        for page_num in range(original_pdf.getNumPages()):
-            print(" processing page %d" % page_num)
-
-            # add the stamp to the existing page
-            page = original_pdf.getPage(page_num)
-
+        overlay = TextOverlay(
+            objects,
+            font_name=self.font_name,
+            font_size=self.font_size,
+            color=self.font_color,
+            align=self.align,
+            prefix=self.resource_prefix,
+            opacity=self.opacity,
+        )
+        x, y = self.position()
+
+        for page_num, page in enumerate(pages):
             if self.mode == "match":
-                overlay = stamp.getPage(page_num)
-            elif self.mode == "first" and page_num > 0:
-                overlay = None
+                text = self.text(page_num)
+            elif self.mode == "repeat" or page_num == 0:
+                text = self.text(0)
+            else:
+                text = None
 
-            if overlay:
-                page.mergePage(overlay)
+            if text is not None:
+                overlay.apply(page, text, x, y)
 
-            output.addPage(page)
+            yield page
 
+    def stamped_pages(self) -> Iterator[PageObject]:
+        """
+        the pages of the input with the stamp applied, ready for a writer
+        """
+        return self.stamp_pages(self.pages(), PendingObjects())
+
+    def stamp(self) -> IO[bytes]:
         buffer = io.BytesIO()
-        output.write(buffer)
+        writer = PackWriter(buffer)
+        writer.add_pages(self.stamped_pages())
+        writer.close()
 
         buffer.seek(0)
         return buffer
 
     def as_pdf_stream(self) -> IO[bytes]:
-        stamp = self.stamp_stream()
-        return self.stamp(stamp)
-
-    def stamp_stream(
-        self,
-        texter: Optional[Callable[[canvas.Canvas, float, float], None]] = None,
-    ) -> PdfFileReader:
-        # prepare the text stamp
-        buffer = io.BytesIO()
-
-        size = self.page_size(0)
-        layer = canvas.Canvas(buffer, pagesize=size)
-
-        x, y = [float(v) for v in self.location]
-        x = float(x if (x > 0) else x + size[0])
-        y = float(y if (y > 0) else y + size[1])
-        # print("Marking at (%f, %f) / (%f, %f)" % (x, y, size[0], size[1]))
-
-        texter = texter or self._default_texter
-        texter(layer, x, y)
-
-        layer.save()
-        buffer.seek(0)
-
-        stamp = PdfFileReader(buffer)
-        return stamp
-
-    def _default_texter(
-        self,
-        layer: canvas.Canvas,
-        x: float,
-        y: float,
-    ) -> None:
-        pass
+        return self.stamp()
 
     def __call__(self) -> IO[bytes]:
         return self.as_pdf_stream()
@@ -119,53 +186,153 @@ class AgendaPdfPart:
 class AgendaPageNumPdfPart(AgendaPdfPart):
     def __init__(
         self,
-        fh: Union[IO[bytes], str],
+        fh: Union[IO[bytes], str, PdfFileReader],
         start: int,
+        cache: Optional[PdfDocumentCache] = None,
     ) -> None:
-        super().__init__(fh=fh)
+        super().__init__(fh=fh, cache=cache)
         self.location = (292.0, 40.0)
+        self.align = "centre"
         self.format = "{num}"
         self.mode = "match"
         self.font_color = "#ff0000"
         self.start = start
 
-    def _default_texter(
-        self,
-        layer: canvas.Canvas,
-        x: float,
-        y: float,
-    ) -> None:
-        color = reportlab.lib.colors.HexColor(self.font_color)
-        for page in range(self.num_pages()):
-            layer.setFillColor(color)
-            layer.setFont(self.font_name, self.font_size)
-            layer.drawCentredString(
-                x, y, self.format.format(num=str(page + self.start))
-            )
-            layer.showPage()
+    def settings(self) -> Dict[str, Any]:
+        settings = super().settings()
+        settings["format"] = self.format
+        return settings
+
+    def text(self, page_num: int) -> Optional[str]:
+        return self.format.format(num=str(page_num + self.start))
 
 
 class AgendaCoverPdfPart(AgendaPdfPart):
     def __init__(
         self,
-        fh: Union[IO[bytes], str],
+        fh: Union[IO[bytes], str, PdfFileReader],
         num: str,
+        cache: Optional[PdfDocumentCache] = None,
     ) -> None:
-        super().__init__(fh)
+        super().__init__(fh, cache=cache)
         self.num = num
         # in point (x, y) with -ve being from the top right
         self.location = (297.5, -90.5)
+        self.align = "right"
         self.font_name = "Helvetica"
         self.font_size = 9
         self.format = "{num}"
         self.mode = "first"
 
-    def _default_texter(self, layer: canvas.Canvas, x: float, y: float) -> None:
-        color = reportlab.lib.colors.HexColor(self.font_color)
-        layer.setFillColor(color)
-        layer.setFont(self.font_name, self.font_size)
-        layer.drawRightString(x, y, self.format.format(num=str(self.num)))
-        layer.showPage()
+    def settings(self) -> Dict[str, Any]:
+        settings = super().settings()
+        settings["format"] = self.format
+        return settings
+
+    def text(self, page_num: int) -> Optional[str]:
+        return self.format.format(num=str(self.num))
+
+
+class PackSegment(NamedTuple):
+    """one input file of the meeting pack and the page on which it starts"""
+
+    filename: Union[str, Path]
+    path: str
+    bookmark: Optional[str] = None
+    itemnum: Optional[str] = None
+    start: int = 1
+
+
+class TocEntry(NamedTuple):
+    """the pages of the pack taken by the agenda or by one item"""
+
+    itemnum: Optional[str]
+    title: str
+    first: int
+    last: int
+
+    def __str__(self) -> str:
+        if self.last > self.first:
+            pages = "%d-%d" % (self.first, self.last)
+        else:
+            pages = "%d" % self.first
+        return "%9s  %s" % (pages, self.title)
+
+
+def stamp_pages(
+    segment: PackSegment,
+    cache: Optional[PdfDocumentCache] = None,
+    data: Optional[bytes] = None,
+) -> List[PageObject]:
+    """
+    the pages of a segment with the cover number (if any) and the page
+    numbers stamped on, ready to be added to a writer
+
+    The input is parsed once for both stamps, from data if it has already
+    been read, and both stamps share one font.
+    """
+    if data is not None:
+        reader = PdfFileReader(io.BytesIO(data))
+    elif cache is not None:
+        reader = cache.get(segment.path)
+    else:
+        reader = open_pdf(segment.path)
+    objects = PendingObjects()
+    numberer = AgendaPageNumPdfPart(reader, segment.start)
+    pages: Iterable[PageObject] = numberer.pages()
+    if segment.itemnum is not None:
+        coverer = AgendaCoverPdfPart(reader, segment.itemnum)
+        pages = coverer.stamp_pages(pages, objects)
+    return list(numberer.stamp_pages(pages, objects))
+
+
+def stamp_segment(
+    segment: PackSegment,
+    cache: Optional[PdfDocumentCache] = None,
+    data: Optional[bytes] = None,
+) -> bytes:
+    """
+    stamp the cover number (if any) and the page numbers onto a segment,
+    giving a separate PDF document
+
+    This is a module-level function so that it can be run in worker
+    processes; without a cache or data, the input is parsed afresh.
+    """
+    buffer = io.BytesIO()
+    writer = PackWriter(buffer)
+    writer.add_pages(stamp_pages(segment, cache, data))
+    writer.close()
+    return buffer.getvalue()
+
+
+def stamp_segment_timed(segment: PackSegment) -> Tuple[bytes, float, float, int]:
+    """stamp_segment for worker processes, with the wall and CPU time taken"""
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    stamped = stamp_segment(segment)
+    return (
+        stamped,
+        time.perf_counter() - wall,
+        time.process_time() - cpu,
+        os.path.getsize(segment.path),
+    )
+
+
+def stamp_settings(segment: PackSegment) -> Dict[str, Any]:
+    """the stamp settings used by stamp_segment, for cache keys"""
+    settings = {
+        "number": AgendaPageNumPdfPart(segment.path, segment.start).settings(),
+    }
+    if segment.itemnum is not None:
+        cover = AgendaCoverPdfPart(segment.path, segment.itemnum)
+        settings["cover"] = cover.settings()
+    return settings
+
+
+def document_pages(data: bytes) -> List[PageObject]:
+    """the pages of a stamped segment, ready to be added to the pack"""
+    reader = PdfFileReader(io.BytesIO(data))
+    return [reader.getPage(num) for num in range(reader.getNumPages())]
 
 
 class MeetingPack:
@@ -174,46 +341,284 @@ class MeetingPack:
         meeting: Agenda,
         agendapdf: Union[str, Path],
         locator: Optional[FileLocator] = None,
+        cache: Optional[PdfDocumentCache] = None,
+        jobs: int = 1,
+        stamp_cache: Optional[StampCache] = None,
+        stats: Optional[BuildStats] = None,
+        progress: Optional[ProgressCallback] = None,
     ) -> None:
         self.meeting = meeting
         self.agendapdf = agendapdf
         self.locator = locator or Path
+        self.cache = cache if cache is not None else PdfDocumentCache()
+        # a cache that was given may be shared, e.g. by a session, so its
+        # documents are kept for whoever else uses it
+        self._owns_cache = cache is None
+        # number of worker processes for stamping; 0 = one per CPU
+        self.jobs = jobs
+        # stamped parts from previous builds that can be reused
+        self.stamp_cache = stamp_cache
+        self.stats = stats if stats is not None else BuildStats()
+        # called as each input file is added to the pack
+        self.progress = progress
         self.agenda_bookmark = "Agenda"
         self.buffer = io.BytesIO()
 
-    def build(self) -> None:
-        merger = PdfFileMerger()
-        pagenum = 1
-
-        def append(
-            stream: IO[bytes],
-            bookmark: Optional[str],
-            filename: Optional[Union[str, Path]],
-        ) -> int:
-            pdf_reader = PdfFileReader(stream)
-            numpages = pdf_reader.getNumPages()  # type: int
-            merger.append(pdf_reader, bookmark=bookmark, import_bookmarks=False)
-            print("  Merged file: %s [%s] " % (filename, bookmark))
-            return numpages
-
-        numberer = AgendaPageNumPdfPart(str(self.locator(self.agendapdf)), pagenum)
-        pagenum += append(numberer(), self.agenda_bookmark, self.agendapdf)
+    def segments(self) -> Iterator[PackSegment]:
+        """the input files of the pack, in order, without page numbers"""
+        yield PackSegment(
+            self.agendapdf,
+            str(self.locator(self.agendapdf)),
+            bookmark=self.agenda_bookmark,
+        )
 
         for itemnum, bookmark, filename, extras in self.meeting.enclosures():
-            print("Item: [%s]" % (bookmark))
-            # pass pdf stream through stampers
-            coverer = AgendaCoverPdfPart(str(self.locator(filename)), itemnum)
-            numberer = AgendaPageNumPdfPart(coverer(), pagenum)
-            pagenum += append(numberer(), bookmark, filename)
+            yield PackSegment(
+                filename,
+                str(self.locator(filename)),
+                bookmark=bookmark,
+                itemnum=itemnum,
+            )
             for extra_filename in extras:
-                with open(self.locator(extra_filename), "rb") as fh:
-                    numberer = AgendaPageNumPdfPart(fh, pagenum)
-                    pagenum += append(numberer(), None, extra_filename)
+                yield PackSegment(extra_filename, str(self.locator(extra_filename)))
+
+    def _count_pages(self, path: str, retain: bool = True) -> int:
+        if retain or path in self.cache:
+            return self.cache.get(path).getNumPages()  # type: ignore
+        return count_pages(path)
+
+    def _counted_layout(self, retain: bool) -> List[Tuple[PackSegment, int]]:
+        layout = []
+        pagenum = 1
+        for segment in self.segments():
+            pages = self._count_pages(segment.path, retain)
+            layout.append((segment._replace(start=pagenum), pages))
+            pagenum += pages
+        return layout
+
+    def layout(self, retain: bool = True) -> List[PackSegment]:
+        """
+        count pages in each input to find where each segment starts
+
+        Parsed inputs are kept in the cache for stamping unless retain is
+        False, in which case only the page tree of each input is read.
+        """
+        return [segment for segment, _ in self._counted_layout(retain)]
+
+    def contents(self) -> List[TocEntry]:
+        """
+        the pages taken by the agenda and by each item in the pack
+
+        Only the page tree of each input is read, so this is cheap enough
+        to use without building the pack.
+        """
+        entries: List[TocEntry] = []
+        for segment, pages in self._counted_layout(retain=False):
+            last = segment.start + pages - 1
+            if segment.bookmark is not None or not entries:
+                title = segment.bookmark or str(segment.filename)
+                entries.append(TocEntry(segment.itemnum, title, segment.start, last))
+            else:
+                # extra pages belong to the item before them
+                entries[-1] = entries[-1]._replace(last=last)
+        return entries
+
+    def cache_key(
+        self, segment: PackSegment, data: Optional[bytes] = None
+    ) -> Optional[str]:
+        """
+        the key of a segment in the stamp cache, if there is one, from data
+        if the input has already been read
+        """
+        if self.stamp_cache is None:
+            return None
+        return self.stamp_cache.key(
+            segment.path,
+            segment.itemnum,
+            segment.start,
+            stamp_settings(segment),
+            data,
+        )
+
+    def _stamp_cached(self, segment: PackSegment) -> bytes:
+        key = self.cache_key(segment)
+        if key is not None and self.stamp_cache is not None:
+            stamped = self.stamp_cache.get(key)
+            if stamped is not None:
+                return stamped
+
+        stamped = stamp_segment(segment, self.cache)
+        if key is not None and self.stamp_cache is not None:
+            self.stamp_cache.put(key, stamped)
+        return stamped
+
+    def _stamp_serial(self, segment: PackSegment) -> List[PageObject]:
+        if self.stamp_cache is None:
+            # stamped straight onto the pages that go into the pack, so the
+            # content and images of the input pass through untouched
+            return stamp_pages(segment, self.cache)
+        return document_pages(self._stamp_cached(segment))
+
+    def _bytes_read(self) -> int:
+        read = self.cache.bytes_read
+        if self.stamp_cache is not None:
+            read += self.stamp_cache.bytes_read
+        return read
+
+    def _stamp_all(self) -> Iterator[Tuple[PackSegment, List[PageObject]]]:
+        jobs = self.jobs or os.cpu_count() or 1
+
+        if jobs == 1:
+            # page numbers are found as each part is stamped
+            pagenum = 1
+            for segment in self.segments():
+                segment = segment._replace(start=pagenum)
+                with self.stats.phase("stamp: %s" % segment.filename) as phase:
+                    read = self._bytes_read()
+                    pages = self._stamp_serial(segment)
+                    phase.bytes_read += self._bytes_read() - read
+                pagenum += len(pages)
+                yield segment, pages
+            return
+
+        # the workers parse the inputs themselves, so the counting pass does
+        # not need to keep them
+        with self.stats.phase("layout"):
+            layout = self.layout(retain=False)
+
+        # only a few segments are stamped ahead of the merge so that the
+        # finished parts do not pile up in memory
+        with ProcessPoolExecutor(max_workers=min(jobs, len(layout))) as pool:
+            # each part is either already stamped or still being stamped
+            pending: Deque[
+                Tuple[
+                    PackSegment,
+                    Optional[str],
+                    Union[bytes, "Future[Tuple[bytes, float, float, int]]"],
+                ]
+            ] = deque()
+
+            def next_part() -> Tuple[PackSegment, List[PageObject]]:
+                segment, key, part = pending.popleft()
+                if isinstance(part, Future):
+                    stamped, wall, cpu, read = part.result()
+                    self.stats.record(
+                        "stamp: %s" % segment.filename, wall, cpu, bytes_read=read
+                    )
+                    if key is not None and self.stamp_cache is not None:
+                        self.stamp_cache.put(key, stamped)
+                else:
+                    stamped = part
+                return segment, document_pages(stamped)
+
+            for segment in layout:
+                key = self.cache_key(segment)
+                cached = None
+                if key is not None and self.stamp_cache is not None:
+                    with self.stats.phase("stamp: %s" % segment.filename) as phase:
+                        read = self._bytes_read()
+                        cached = self.stamp_cache.get(key)
+                        phase.bytes_read += self._bytes_read() - read
+                if cached is not None:
+                    pending.append((segment, key, cached))
+                else:
+                    stamping = pool.submit(stamp_segment_timed, segment)
+                    pending.append((segment, key, stamping))
+                if len(pending) >= 2 * jobs:
+                    yield next_part()
+            while pending:
+                yield next_part()
+
+    def build(self, output: Optional[IO[bytes]] = None) -> None:
+        """
+        build the meeting pack, by default into the in-memory buffer
+
+        If an output file handle is given, the pack is streamed into it as
+        each part is stamped and the parsed inputs are released as soon as
+        they have been written.
+        """
+        streaming = output is not None
+        writer = PackWriter(output if output is not None else self.buffer)
+        total = sum(1 for _ in self.segments()) if self.progress else 0
+
+        for done, (segment, pages) in enumerate(self._stamp_all(), 1):
+            self.merge(writer, segment, pages, streaming)
+            if self.progress is not None:
+                self.progress(ProgressEvent("pack", done, total, str(segment.filename)))
+
+        self.finish(writer, streaming)
+
+    def merge(
+        self,
+        writer: PackWriter,
+        segment: PackSegment,
+        pages: List[PageObject],
+        streaming: bool,
+    ) -> None:
+        """add the stamped pages of one segment to the pack"""
+        with self.stats.phase("merge") as phase:
+            written = writer.bytes_written
+            writer.add_pages(pages, bookmark=segment.bookmark)
+            if streaming:
+                phase.bytes_written += writer.bytes_written - written
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Merged %s [%s] from page %d",
+                segment.filename,
+                segment.bookmark,
+                segment.start,
+            )
 
-        merger.write(self.buffer)
+        if streaming and self._owns_cache:
+            self.cache.discard(segment.path)
+
+    def finish(self, writer: PackWriter, streaming: bool) -> None:
+        """complete the pack once every segment has been merged"""
+        with self.stats.phase("merge") as phase:
+            written = writer.bytes_written
+            writer.close()
+            if streaming:
+                phase.bytes_written += writer.bytes_written - written
+
+        if self.stamp_cache is not None:
+            self.stamp_cache.prune()
+
+        if not streaming:
+            self.buffer.seek(0)
+
+        logger.info("Meeting pack: %d pages", writer.num_pages)
+        if writer.streams_shared or writer.objects_shared:
+            logger.info(
+                "Shared %d repeated streams and %d resources such as fonts and "
+                "images, saving %s",
+                writer.streams_shared,
+                writer.objects_shared,
+                format_bytes(writer.bytes_shared),
+            )
 
-        self.buffer.seek(0)
+    @contextlib.contextmanager
+    def output_file(self, filename: Union[str, Path]) -> Iterator[IO[bytes]]:
+        """
+        a file to stream the pack into, which replaces filename only once
+        the pack is complete
+        """
+        destination = Path(self.locator(filename))
+        partial = destination.with_name(destination.name + ".partial")
+        try:
+            with open(partial, "wb") as fh:
+                yield fh
+            os.replace(partial, destination)
+        finally:
+            if partial.exists():
+                partial.unlink()
+
+    def write(self, filename: Union[str, Path]) -> None:
+        """build the meeting pack streaming it straight into a file"""
+        with self.output_file(filename) as fh:
+            self.build(fh)
 
     def save(self, filename: Union[str, Path]) -> None:
-        with open(self.locator(filename), "wb") as fh:
-            fh.write(self.buffer.getvalue())
+        with self.stats.phase("save") as phase:
+            with open(self.locator(filename), "wb") as fh:
+                phase.bytes_written += fh.write(self.buffer.getvalue())
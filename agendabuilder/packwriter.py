@@ -0,0 +1,352 @@
+"""
+Incremental PDF writer for the meeting pack
+
+Each document that is added has its pages and all objects they refer to
+written to the output straight away; nothing is kept from the document
+once it has been added, so memory use is bounded by the largest single
+input rather than by the whole pack. Only the digests of the streams and
+resource dictionaries that have been written are kept, so that identical
+fonts, images and graphics states used by several documents are written
+once.
+"""
+
+from collections import deque
+import copy
+import hashlib
+import io
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    IO,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from PyPDF2 import PdfFileReader  # type: ignore
+from PyPDF2.pdf import PageObject  # type: ignore
+from PyPDF2.generic import (  # type: ignore
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    StreamObject,
+    createStringObject,
+)
+
+
+# the version of the pack; 1.4 for the translucent stamps' graphics states
+PDF_VERSION = b"1.4"
+
+# dictionaries of these types are shared between documents like streams,
+# as long as they only refer to streams and to other such dictionaries
+SHAREABLE_TYPES = {"/Font", "/FontDescriptor", "/Encoding", "/ExtGState"}
+
+
+class _CountingWriter:
+    """track the output position without relying on tell()"""
+
+    def __init__(self, fh: IO[bytes]) -> None:
+        self.fh = fh
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.fh.write(data)
+        self.position += len(data)
+        return len(data)
+
+
+class _NotShareable(Exception):
+    pass
+
+
+class PendingObjects:
+    """
+    Objects for pages that have yet to be added to a writer, e.g. stamps
+
+    The pages refer to these objects like to those of their own document.
+    They are written, or shared with identical objects already written,
+    as the pages are added, in the same order as if the pages had been
+    written to a separate document and read back from it.
+    """
+
+    def __init__(self) -> None:
+        self._objects: List[Any] = []
+        self._shared: Dict[Hashable, IndirectObject] = {}
+
+    def get_object(self, ref: IndirectObject) -> Any:
+        # called by IndirectObject.getObject, as on a PdfFileReader
+        return self._objects[ref.idnum - 1]
+
+    def add_object(self, obj: Any) -> IndirectObject:
+        """an object for the pages to refer to"""
+        self._objects.append(obj)
+        return IndirectObject(len(self._objects), 0, self)
+
+    def shared_object(
+        self,
+        key: Hashable,
+        factory: Callable[[], Any],
+    ) -> IndirectObject:
+        """an object made once and then referred to by every page that uses it"""
+        if key not in self._shared:
+            self._shared[key] = self.add_object(factory())
+        return self._shared[key]
+
+
+class PackWriter:
+    def __init__(self, fh: IO[bytes], share_streams: bool = True) -> None:
+        self.out = _CountingWriter(fh)
+        self._offsets: Dict[int, int] = {}
+        self._next_number = 1
+        self._root = self._allocate()
+        self._pages = self._allocate()
+        self._kids: List[IndirectObject] = []
+        self._bookmarks: List[Tuple[str, IndirectObject]] = []
+        # digest of each shareable object written -> the object it was
+        # written as
+        self.share_streams = share_streams
+        self._shareable: Dict[bytes, IndirectObject] = {}
+        self.streams_shared = 0
+        self.bytes_shared = 0
+        self.objects_shared = 0
+        self.closed = False
+
+        self.out.write(b"%%PDF-%s\n%%\xe2\xe3\xcf\xd3\n" % PDF_VERSION)
+
+    @property
+    def num_pages(self) -> int:
+        return len(self._kids)
+
+    @property
+    def bytes_written(self) -> int:
+        return self.out.position
+
+    def _allocate(self) -> IndirectObject:
+        ref = IndirectObject(self._next_number, 0, self)
+        self._next_number += 1
+        return ref
+
+    def _write_object(self, ref: IndirectObject, obj: Any) -> None:
+        self._offsets[ref.idnum] = self.out.position
+        self.out.write(b"%d 0 obj\n" % ref.idnum)
+        obj.writeToStream(self.out, None)
+        self.out.write(b"\nendobj\n")
+
+    def add_object(self, obj: Any) -> IndirectObject:
+        """
+        write a new object straight away, returning a reference to it
+
+        The object must not refer to objects in any other document.
+        """
+        ref = self._allocate()
+        self._write_object(ref, obj)
+        return ref
+
+    def add_document(
+        self,
+        reader: PdfFileReader,
+        bookmark: Optional[str] = None,
+    ) -> int:
+        """
+        append all pages of a document to the pack, returning the page count
+        """
+        pages = [reader.getPage(num) for num in range(reader.getNumPages())]
+        return self.add_pages(pages, bookmark)
+
+    def add_pages(
+        self,
+        pages: Iterable[PageObject],
+        bookmark: Optional[str] = None,
+    ) -> int:
+        """
+        append pages, all from the same document, returning the page count
+
+        Pages may refer to objects already written by this writer (e.g.
+        by add_object) and to PendingObjects, as well as to objects of their
+        own document.
+        """
+        # map of (document, idnum, generation) in the sources to objects in
+        # the pack
+        mapping: Dict[Tuple[int, int, int], IndirectObject] = {}
+        pending: Deque[Tuple[IndirectObject, IndirectObject]] = deque()
+
+        def translate(obj: Any) -> Any:
+            if isinstance(obj, IndirectObject):
+                if obj.pdf is self:
+                    return obj
+                key = (id(obj.pdf), obj.idnum, obj.generation)
+                if key not in mapping:
+                    value = obj.getObject()
+                    digest = self._digest(value) if self.share_streams else None
+                    if digest is not None and digest in self._shareable:
+                        mapping[key] = self._shareable[digest]
+                        if isinstance(value, StreamObject):
+                            self.streams_shared += 1
+                            # pylint: disable=protected-access
+                            self.bytes_shared += len(value._data)
+                        else:
+                            self.objects_shared += 1
+                        return mapping[key]
+                    mapping[key] = self._allocate()
+                    pending.append((obj, mapping[key]))
+                    if digest is not None:
+                        self._shareable[digest] = mapping[key]
+                return mapping[key]
+            if isinstance(obj, DictionaryObject):
+                # streams keep their data, only their dictionary changes
+                if isinstance(obj, StreamObject):
+                    new = copy.copy(obj)
+                else:
+                    new = DictionaryObject()
+                for key, value in obj.items():
+                    new[key] = translate(value)
+                return new
+            if isinstance(obj, ArrayObject):
+                return ArrayObject([translate(v) for v in obj])
+            return obj
+
+        # pages are allocated first so that references between them (e.g.
+        # link annotations) point at the pages of the pack
+        allocated = []
+        for page in pages:
+            ref = self._allocate()
+            source = page.indirectRef
+            if source is not None:
+                mapping[(id(source.pdf), source.idnum, source.generation)] = ref
+            allocated.append((page, ref))
+
+        for page, ref in allocated:
+            new_page = DictionaryObject()
+            for key, value in page.items():
+                if key != "/Parent":
+                    new_page[key] = translate(value)
+            new_page[NameObject("/Parent")] = self._pages
+            self._write_object(ref, new_page)
+            self._kids.append(ref)
+
+        while pending:
+            source, ref = pending.popleft()
+            self._write_object(ref, translate(source.getObject()))
+
+        if bookmark is not None and allocated:
+            self._bookmarks.append((bookmark, allocated[0][1]))
+
+        return len(allocated)
+
+    def _digest(self, obj: Any, depth: int = 0) -> Optional[bytes]:
+        """
+        a digest of a stream or of a dictionary of a shareable type, such as
+        a font, and None for other objects
+
+        Objects are identical if their data and dictionaries match, with any
+        objects that they refer to, e.g. the soft mask of an image, compared
+        in the same way. Objects that refer to other kinds of object are not
+        shared.
+        """
+        is_stream = isinstance(obj, StreamObject)
+        if depth > 8 or not (
+            is_stream
+            or isinstance(obj, DictionaryObject)
+            and obj.get("/Type") in SHAREABLE_TYPES
+        ):
+            return None
+
+        def canonical(value: Any) -> bytes:
+            if isinstance(value, IndirectObject):
+                if value.pdf is self:
+                    return b"@%d" % value.idnum
+                digest = self._digest(value.getObject(), depth + 1)
+                if digest is None:
+                    raise _NotShareable()
+                return b"@" + digest
+            if isinstance(value, DictionaryObject):
+                return b"<<%s>>" % b" ".join(
+                    canonical(NameObject(k)) + b" " + canonical(v)
+                    for k, v in sorted(value.items())
+                )
+            if isinstance(value, ArrayObject):
+                return b"[%s]" % b" ".join(canonical(v) for v in value)
+            buffer = io.BytesIO()
+            value.writeToStream(buffer, None)
+            return buffer.getvalue()
+
+        digest = hashlib.sha256()
+        try:
+            for key, value in sorted(obj.items()):
+                if key != "/Length":
+                    name = canonical(NameObject(key))
+                    digest.update(b"%s %s\n" % (name, canonical(value)))
+        except _NotShareable:
+            return None
+        if is_stream:
+            digest.update(b"stream")
+            digest.update(obj._data)  # pylint: disable=protected-access
+        return digest.digest()
+
+    def _write_outlines(self) -> Optional[IndirectObject]:
+        if not self._bookmarks:
+            return None
+
+        outlines = self._allocate()
+        refs = [self._allocate() for _ in self._bookmarks]
+
+        for i, (title, page) in enumerate(self._bookmarks):
+            entry = DictionaryObject()
+            entry[NameObject("/Title")] = createStringObject(title)
+            entry[NameObject("/Parent")] = outlines
+            entry[NameObject("/Dest")] = ArrayObject([page, NameObject("/Fit")])
+            if i > 0:
+                entry[NameObject("/Prev")] = refs[i - 1]
+            if i < len(refs) - 1:
+                entry[NameObject("/Next")] = refs[i + 1]
+            self._write_object(refs[i], entry)
+
+        tree = DictionaryObject()
+        tree[NameObject("/Type")] = NameObject("/Outlines")
+        tree[NameObject("/First")] = refs[0]
+        tree[NameObject("/Last")] = refs[-1]
+        tree[NameObject("/Count")] = NumberObject(len(refs))
+        self._write_object(outlines, tree)
+        return outlines
+
+    def close(self) -> None:
+        """write the page tree, bookmarks, cross-reference table and trailer"""
+        if self.closed:
+            return
+
+        pages = DictionaryObject()
+        pages[NameObject("/Type")] = NameObject("/Pages")
+        pages[NameObject("/Count")] = NumberObject(len(self._kids))
+        pages[NameObject("/Kids")] = ArrayObject(self._kids)
+        self._write_object(self._pages, pages)
+
+        outlines = self._write_outlines()
+
+        catalog = DictionaryObject()
+        catalog[NameObject("/Type")] = NameObject("/Catalog")
+        catalog[NameObject("/Pages")] = self._pages
+        if outlines is not None:
+            catalog[NameObject("/Outlines")] = outlines
+        self._write_object(self._root, catalog)
+
+        xref = self.out.position
+        size = self._next_number
+        self.out.write(b"xref\n0 %d\n" % size)
+        self.out.write(b"0000000000 65535 f \n")
+        for num in range(1, size):
+            self.out.write(b"%010d 00000 n \n" % self._offsets[num])
+
+        trailer = DictionaryObject()
+        trailer[NameObject("/Size")] = NumberObject(size)
+        trailer[NameObject("/Root")] = self._root
+        self.out.write(b"trailer\n")
+        trailer.writeToStream(self.out, None)
+        self.out.write(b"\nstartxref\n%d\n%%%%EOF\n" % xref)
+
+        self.closed = True
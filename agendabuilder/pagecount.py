@@ -0,0 +1,486 @@
+"""
+Counting the pages of PDF files without parsing them
+
+Only the trailer, the cross-reference data and the nodes of the page tree
+are read, through a memory map of the file, and never the content of the
+pages, so counting a large scanned appendix costs little more than
+counting a one page letter. Files that this cannot follow, such as
+damaged files or those using unusual stream filters, are counted by
+PyPDF2 instead.
+"""
+
+import abc
+import io
+import mmap
+from pathlib import Path
+import re
+import zlib
+from typing import (
+    Any,
+    Dict,
+    IO,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+
+# whitespace and comments between tokens
+_SPACE = re.compile(rb"(?:[\x00\t\n\x0c\r ]|%[^\r\n]*)*")
+_NAME = re.compile(rb"/[^\x00\t\n\x0c\r ()<>\[\]{}/%]*")
+_REF = re.compile(rb"(\d+)\s+(\d+)\s+R")
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+_KEYWORD = re.compile(rb"true|false|null")
+_OBJ = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj")
+_STREAM = re.compile(rb"\s*stream\r?\n")
+_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n?")
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+
+# how far from the end of the file startxref is looked for
+_TAIL = 2048
+
+
+class UnsupportedPdf(Exception):
+    """the file cannot be counted without parsing it fully"""
+
+
+class Ref(NamedTuple):
+    num: int
+    gen: int
+
+
+class _Section(abc.ABC):
+    """
+    one cross-reference section; finding an object only reads its entry
+
+    Entries are (1, offset, 0) for objects in the file, (2, stream number,
+    index) for objects in object streams and None for free objects.
+    """
+
+    def __init__(self, trailer: Dict[str, Any]) -> None:
+        self.trailer = trailer
+
+    @abc.abstractmethod
+    def entry(self, num: int) -> Optional[Tuple[int, int, int]]:
+        """the entry of an object, if the section has one"""
+
+    @abc.abstractmethod
+    def __contains__(self, num: int) -> bool:
+        """whether the section has an entry for an object"""
+
+
+class _TableSection(_Section):
+    """a classic xref table of 20 byte entries"""
+
+    def __init__(
+        self,
+        data: Any,
+        subsections: List[Tuple[int, int, int]],
+        trailer: Dict[str, Any],
+    ) -> None:
+        super().__init__(trailer)
+        self.data = data
+        self.subsections = subsections
+
+    def _position(self, num: int) -> Optional[int]:
+        for first, count, position in self.subsections:
+            if first <= num < first + count:
+                return position + (num - first) * 20
+        return None
+
+    def __contains__(self, num: int) -> bool:
+        return self._position(num) is not None
+
+    def entry(self, num: int) -> Optional[Tuple[int, int, int]]:
+        position = self._position(num)
+        if position is None:
+            return None
+        fields = bytes(self.data[position : position + 18]).split()
+        if len(fields) != 3 or fields[2] not in (b"n", b"f"):
+            raise UnsupportedPdf("damaged xref entry for object %d" % num)
+        if fields[2] == b"f":
+            return None
+        return (1, int(fields[0]), 0)
+
+
+class _StreamSection(_Section):
+    """a cross-reference stream (PDF 1.5)"""
+
+    def __init__(self, rows: bytes, trailer: Dict[str, Any]) -> None:
+        super().__init__(trailer)
+        self.widths = [int(w) for w in trailer["/W"]]
+        index = trailer.get("/Index", [0, trailer["/Size"]])
+        self.subsections = [
+            (int(first), int(count)) for first, count in zip(index[::2], index[1::2])
+        ]
+        self.rows = rows
+
+    def _row(self, num: int) -> Optional[int]:
+        row = 0
+        for first, count in self.subsections:
+            if first <= num < first + count:
+                return row + num - first
+            row += count
+        return None
+
+    def __contains__(self, num: int) -> bool:
+        return self._row(num) is not None
+
+    def entry(self, num: int) -> Optional[Tuple[int, int, int]]:
+        row = self._row(num)
+        if row is None:
+            return None
+        position = row * sum(self.widths)
+        fields = []
+        for width in self.widths:
+            fields.append(int.from_bytes(self.rows[position : position + width], "big"))
+            position += width
+        # a missing type field means type 1
+        kind = fields[0] if self.widths[0] else 1
+        if kind not in (1, 2):
+            return None
+        return (kind, fields[1], fields[2])
+
+
+def _unpredict(data: bytes, params: Dict[str, Any]) -> bytes:
+    """undo the PNG predictors used to compress cross-reference streams"""
+    predictor = params.get("/Predictor", 1)
+    if predictor == 1:
+        return data
+    if predictor < 10:
+        raise UnsupportedPdf("unsupported predictor %s" % predictor)
+
+    columns = params.get("/Columns", 1)
+    width = max(1, params.get("/Colors", 1) * params.get("/BitsPerComponent", 8) // 8)
+    stride = columns * width
+    output = bytearray()
+    previous = bytearray(stride)
+    for start in range(0, len(data), stride + 1):
+        kind = data[start]
+        row = bytearray(data[start + 1 : start + 1 + stride])
+        for i, value in enumerate(row):
+            left = row[i - width] if i >= width else 0
+            up = previous[i]
+            if kind == 1:
+                row[i] = (value + left) & 0xFF
+            elif kind == 2:
+                row[i] = (value + up) & 0xFF
+            elif kind == 3:
+                row[i] = (value + (left + up) // 2) & 0xFF
+            elif kind == 4:
+                corner = previous[i - width] if i >= width else 0
+                guess = left + up - corner
+                nearest = min(
+                    (abs(guess - left), left),
+                    (abs(guess - up), up),
+                    (abs(guess - corner), corner),
+                    key=lambda pair: pair[0],
+                )[1]
+                row[i] = (value + nearest) & 0xFF
+            elif kind != 0:
+                raise UnsupportedPdf("unknown PNG predictor %d" % kind)
+        output.extend(row)
+        previous = row
+    return bytes(output)
+
+
+class PageCounter:
+    """
+    Reader for just enough of a PDF file to find its page count
+
+    The pages are found by walking the page tree. If their number does not
+    match the /Count of its root, the file is damaged and the count is left
+    to PyPDF2, which also counts the pages that it finds.
+    """
+
+    def __init__(self, data: Any) -> None:
+        self.data = data
+        self._sections: List[_Section] = []
+        self._object_streams: Dict[int, Tuple[Dict[int, int], bytes]] = {}
+        self._read_xref()
+
+    # -- tokens and objects --
+
+    def _skip(self, position: int, data: Any = None) -> int:
+        match = _SPACE.match(self.data if data is None else data, position)
+        return match.end()  # type: ignore
+
+    def parse(self, position: int, data: Any = None) -> Tuple[Any, int]:
+        """the PDF object starting at position, and where it ends"""
+        data = self.data if data is None else data
+        position = self._skip(position, data)
+        head = data[position : position + 2]
+
+        if head == b"<<":
+            result: Dict[str, Any] = {}
+            position += 2
+            while True:
+                position = self._skip(position, data)
+                if data[position : position + 2] == b">>":
+                    return result, position + 2
+                key, position = self.parse(position, data)
+                if not isinstance(key, str):
+                    raise UnsupportedPdf("dictionary key is not a name")
+                result[key], position = self.parse(position, data)
+
+        if head[:1] == b"[":
+            items: List[Any] = []
+            position += 1
+            while True:
+                position = self._skip(position, data)
+                if data[position : position + 1] == b"]":
+                    return items, position + 1
+                item, position = self.parse(position, data)
+                items.append(item)
+
+        if head[:1] == b"(":
+            return self._literal_string(position, data)
+
+        if head[:1] == b"<":
+            end = data.find(b">", position)
+            if end < 0:
+                raise UnsupportedPdf("unterminated string")
+            return bytes(data[position + 1 : end]), end + 1
+
+        if head[:1] == b"/":
+            match = _NAME.match(data, position)
+            return match.group().decode("latin-1"), match.end()  # type: ignore
+
+        match = _REF.match(data, position)
+        if match:
+            return Ref(int(match.group(1)), int(match.group(2))), match.end()
+
+        match = _NUMBER.match(data, position)
+        if match:
+            text = match.group()
+            number = float(text) if b"." in text else int(text)
+            return number, match.end()
+
+        match = _KEYWORD.match(data, position)
+        if match:
+            value = {b"true": True, b"false": False, b"null": None}
+            return value[match.group()], match.end()
+
+        raise UnsupportedPdf("unexpected data at offset %d" % position)
+
+    @staticmethod
+    def _literal_string(position: int, data: Any) -> Tuple[bytes, int]:
+        depth = 0
+        start = position
+        while position < len(data):
+            char = data[position : position + 1]
+            if char == b"\\":
+                position += 1
+            elif char == b"(":
+                depth += 1
+            elif char == b")":
+                depth -= 1
+                if depth == 0:
+                    return bytes(data[start + 1 : position]), position + 1
+            position += 1
+        raise UnsupportedPdf("unterminated string")
+
+    def _indirect(self, offset: int) -> Tuple[Any, Optional[bytes]]:
+        """the object written at offset and the raw data of its stream"""
+        match = _OBJ.match(self.data, offset)
+        if match is None:
+            raise UnsupportedPdf("no object at offset %d" % offset)
+        value, position = self.parse(match.end())
+        if not isinstance(value, dict):
+            return value, None
+
+        match = _STREAM.match(self.data, position)
+        if match is None:
+            return value, None
+        length = self.resolve(value.get("/Length"))
+        if not isinstance(length, int):
+            raise UnsupportedPdf("stream without a length")
+        return value, bytes(self.data[match.end() : match.end() + length])
+
+    def _decode(self, stream: Dict[str, Any], raw: bytes) -> bytes:
+        filters = stream.get("/Filter", [])
+        params = stream.get("/DecodeParms") or {}
+        if not isinstance(filters, list):
+            filters = [filters]
+        if isinstance(params, list):
+            params = params[0] if params else {}
+        if filters == ["/FlateDecode"]:
+            return _unpredict(zlib.decompress(raw), params)
+        if not filters:
+            return raw
+        raise UnsupportedPdf("unsupported filters %s" % filters)
+
+    def resolve(self, value: Any) -> Any:
+        """follow a reference to the object that it refers to"""
+        if not isinstance(value, Ref):
+            return value
+
+        for section in self._sections:
+            if value.num not in section:
+                continue
+            entry = section.entry(value.num)
+            if entry is None:
+                return None
+            kind, where, _ = entry
+            if kind == 1:
+                return self._indirect(where)[0]
+            return self._compressed(where, value.num)
+        return None
+
+    def _compressed(self, stream_num: int, num: int) -> Any:
+        """an object stored in an object stream"""
+        if "/Encrypt" in self.trailer:
+            raise UnsupportedPdf("object streams of encrypted files")
+        if stream_num not in self._object_streams:
+            stream = self._stream(Ref(stream_num, 0))
+            header, data = stream
+            count = header["/N"]
+            first = header["/First"]
+            numbers = data[:first].split()
+            offsets = {
+                int(numbers[2 * i]): first + int(numbers[2 * i + 1])
+                for i in range(count)
+            }
+            self._object_streams[stream_num] = (offsets, data)
+        offsets, data = self._object_streams[stream_num]
+        if num not in offsets:
+            return None
+        return self.parse(offsets[num], data)[0]
+
+    def _stream(self, ref: Ref) -> Tuple[Dict[str, Any], bytes]:
+        for section in self._sections:
+            if ref.num in section:
+                entry = section.entry(ref.num)
+                if entry is None or entry[0] != 1:
+                    break
+                header, raw = self._indirect(entry[1])
+                if raw is None:
+                    break
+                return header, self._decode(header, raw)
+        raise UnsupportedPdf("object stream %d not found" % ref.num)
+
+    # -- cross-reference data --
+
+    @property
+    def trailer(self) -> Dict[str, Any]:
+        return self._sections[0].trailer
+
+    def _read_xref(self) -> None:
+        tail = max(0, len(self.data) - _TAIL)
+        position = self.data.rfind(b"startxref", tail)
+        match = _STARTXREF.match(self.data, position) if position >= 0 else None
+        if match is None:
+            raise UnsupportedPdf("startxref not found")
+
+        offset: Optional[int] = int(match.group(1))
+        seen = set()
+        while offset is not None and offset not in seen:
+            seen.add(offset)
+            section = self._read_section(offset)
+            self._sections.append(section)
+            hybrid = section.trailer.get("/XRefStm")
+            if isinstance(hybrid, int) and hybrid not in seen:
+                seen.add(hybrid)
+                self._sections.append(self._read_section(hybrid))
+            prev = section.trailer.get("/Prev")
+            offset = prev if isinstance(prev, int) else None
+
+    def _read_section(self, offset: int) -> _Section:
+        position = self._skip(offset)
+        if self.data[position : position + 4] == b"xref":
+            return self._read_table(position + 4)
+
+        header, raw = self._indirect(offset)
+        if raw is None or header.get("/Type") != "/XRef":
+            raise UnsupportedPdf("no cross-reference data at offset %d" % offset)
+        return _StreamSection(self._decode(header, raw), header)
+
+    def _read_table(self, position: int) -> _TableSection:
+        subsections = []
+        while True:
+            position = self._skip(position)
+            if self.data[position : position + 7] == b"trailer":
+                break
+            match = _SUBSECTION.match(self.data, position)
+            if match is None:
+                raise UnsupportedPdf("damaged xref table")
+            first, count = int(match.group(1)), int(match.group(2))
+            subsections.append((first, count, match.end()))
+            position = match.end() + count * 20
+
+        trailer, _ = self.parse(position + 7)
+        if not isinstance(trailer, dict):
+            raise UnsupportedPdf("damaged trailer")
+        return _TableSection(self.data, subsections, trailer)
+
+    # -- pages --
+
+    def page_count(self) -> int:
+        root = self.resolve(self.trailer.get("/Root"))
+        pages = self.resolve(root.get("/Pages")) if isinstance(root, dict) else None
+        count = self.resolve(pages.get("/Count")) if isinstance(pages, dict) else None
+        if (
+            not isinstance(pages, dict)
+            or not isinstance(count, int)
+            or isinstance(count, bool)
+            or count < 0
+        ):
+            raise UnsupportedPdf("page tree has no count")
+        found = self._leaves(pages)
+        if found != count:
+            raise UnsupportedPdf("page tree counts %d pages, not %d" % (count, found))
+        return count
+
+    def _leaves(self, root: Dict[str, Any]) -> int:
+        """the number of pages below a node of the page tree"""
+        found = 0
+        nodes = [root]
+        seen = set()
+        while nodes:
+            node = nodes.pop()
+            # as in PyPDF2, a node without a type is a page unless it has kids
+            kind = node.get("/Type", "/Pages" if "/Kids" in node else "/Page")
+            if kind == "/Page":
+                found += 1
+                continue
+            kids = self.resolve(node.get("/Kids"))
+            if kind != "/Pages" or not isinstance(kids, list):
+                raise UnsupportedPdf("damaged page tree")
+            for kid in kids:
+                if not isinstance(kid, Ref) or kid in seen:
+                    raise UnsupportedPdf("damaged page tree")
+                seen.add(kid)
+                value = self.resolve(kid)
+                if not isinstance(value, dict):
+                    raise UnsupportedPdf("damaged page tree")
+                nodes.append(value)
+        return found
+
+
+def count_pages(filename: Union[str, Path]) -> int:
+    """the number of pages in a PDF file, reading as little of it as possible"""
+    with open(filename, "rb") as fh:
+        try:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return PageCounter(data).page_count()
+        except (UnsupportedPdf, ValueError, KeyError, IndexError, zlib.error):
+            pass
+    return _parsed_page_count(str(filename))
+
+
+def count_document_pages(data: bytes) -> int:
+    """the number of pages in a PDF document that has been read into memory"""
+    try:
+        return PageCounter(data).page_count()
+    except (UnsupportedPdf, ValueError, KeyError, IndexError, zlib.error):
+        pass
+    return _parsed_page_count(io.BytesIO(data))
+
+
+def _parsed_page_count(source: Union[str, IO[bytes]]) -> int:
+    # pylint: disable=import-outside-toplevel
+    from PyPDF2 import PdfFileReader  # type: ignore
+
+    return PdfFileReader(source, strict=False).getNumPages()  # type: ignore
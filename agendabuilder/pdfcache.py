@@ -0,0 +1,156 @@
+"""
+Cache of parsed PDF documents shared across a meeting pack build
+"""
+
+import io
+import mmap
+from pathlib import Path
+from typing import (
+    Dict,
+    IO,
+    Tuple,
+    Union,
+)
+
+from PyPDF2 import PdfFileReader  # type: ignore
+
+
+CacheKey = Tuple[str, int, int]
+
+# reads of at least this many bytes are given as views of the mapping
+VIEW_SIZE = 64 * 1024
+
+
+class MappedFile:
+    """
+    A read-only binary file that is memory-mapped rather than read
+
+    Large reads, which PyPDF2 makes for the data of streams such as scanned
+    images, are given as memoryviews of the mapping rather than copied into
+    bytes, so streams that pass through to the pack unchanged are written
+    straight from the page cache. The mapping stays open for as long as the
+    file or any view of it is in use.
+    """
+
+    def __init__(self, filename: Union[str, Path]) -> None:
+        with open(filename, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self.name = str(filename)
+        self.mode = "rb"
+
+    def read(self, size: int = -1) -> Union[bytes, memoryview]:
+        if 0 <= size < VIEW_SIZE:
+            return self._map.read(size)
+        start = self._map.tell()
+        end = len(self._map) if size < 0 else min(start + size, len(self._map))
+        self._map.seek(end)
+        return self._view[start:end]
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._map.seek(offset, whence)  # type: ignore[arg-type]
+        return self._map.tell()
+
+    def tell(self) -> int:
+        return self._map.tell()
+
+    def readline(self) -> bytes:
+        return self._map.readline()
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+
+def open_pdf(filename: Union[str, Path], mapped: bool = True) -> PdfFileReader:
+    """
+    parse a PDF file through a memory map of it, or from a copy read into
+    memory if not mapped, which leaves the file free to be replaced
+    """
+    if not mapped:
+        with open(filename, "rb") as fh:
+            return PdfFileReader(io.BytesIO(fh.read()))
+    try:
+        mapping = MappedFile(filename)
+    except ValueError:
+        # empty files cannot be mapped; let PyPDF2 report the problem
+        return PdfFileReader(str(filename))
+    return PdfFileReader(mapping)
+
+
+class PdfDocumentCache:
+    """
+    Parsed PDF documents keyed by resolved path, mtime and size
+
+    Each input file is parsed once; later requests for the same unchanged
+    file are given the same reader, and a file that has changed replaces
+    its earlier parse. Callers must not modify the pages of
+    a cached reader in place -- copy a page before stamping or adding it
+    to a writer. Files are parsed through a MappedFile unless mapped is
+    false, when they are read into memory instead.
+    """
+
+    def __init__(self, mapped: bool = True) -> None:
+        self.mapped = mapped
+        self._documents: Dict[CacheKey, PdfFileReader] = {}
+        self.hits = 0
+        self.misses = 0
+        # size of the files that have been parsed
+        self.bytes_read = 0
+
+    @staticmethod
+    def key(filename: Union[str, Path]) -> CacheKey:
+        path = Path(filename).resolve()
+        stat = path.stat()
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, source: Union[IO[bytes], str, Path]) -> PdfFileReader:
+        """
+        obtain a reader for a filename or an open file handle
+
+        File handles cannot be identified reliably and so are always parsed.
+        """
+        if not isinstance(source, (str, Path)):
+            return PdfFileReader(source)
+
+        key = self.key(source)
+        reader = self._documents.get(key)
+        if reader is not None:
+            self.hits += 1
+            return reader
+
+        self.misses += 1
+        self.bytes_read += key[2]
+        reader = open_pdf(key[0], self.mapped)
+        # parses of earlier versions of the file will not be asked for again
+        self.discard(key[0])
+        self._documents[key] = reader
+        return reader
+
+    def discard(self, filename: Union[str, Path]) -> None:
+        """
+        forget a document so that its memory can be released
+
+        Any parses of earlier versions of the file are forgotten too.
+        """
+        path = str(Path(filename).resolve())
+        for key in [key for key in self._documents if key[0] == path]:
+            del self._documents[key]
+
+    def clear(self) -> None:
+        self._documents.clear()
+
+    def __contains__(self, filename: Union[str, Path]) -> bool:
+        try:
+            return self.key(filename) in self._documents
+        except OSError:
+            return False
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __str__(self) -> str:
+        return "PDF cache: %d documents, %d hits, %d misses" % (
+            len(self),
+            self.hits,
+            self.misses,
+        )
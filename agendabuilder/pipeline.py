@@ -0,0 +1,176 @@
+"""
+Building the meeting pack as an asyncio pipeline
+
+When the papers are on a network share, much of a build can be spent
+waiting for the inputs to be read. The pipeline reads the inputs ahead of
+the one being stamped, stamps them in an executor and merges them into the
+pack in order, so that reading, stamping and merging overlap:
+
+    pack = MeetingPack(meeting, "agenda-final.pdf", locator)
+    asyncio.run(PackPipeline(pack, read_ahead=4).build())
+    pack.save("meeting-pack.pdf")
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import contextlib
+import os
+from pathlib import Path
+import time
+from typing import (
+    Deque,
+    IO,
+    Iterator,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .pack import MeetingPack, PackSegment, document_pages, stamp_segment
+from .packwriter import PackWriter
+from .pagecount import count_document_pages
+from .progress import ProgressEvent
+
+
+def read_timed(path: str) -> Tuple[bytes, float]:
+    """read an input in full, with the wall time taken"""
+    wall = time.perf_counter()
+    with open(path, "rb") as fh:
+        data = fh.read()
+    return data, time.perf_counter() - wall
+
+
+def stamp_data_timed(segment: PackSegment, data: bytes) -> Tuple[bytes, float, float]:
+    """stamp_segment for executors, from data already read, with the times taken"""
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    stamped = stamp_segment(segment, data=data)
+    return stamped, time.perf_counter() - wall, time.thread_time() - cpu
+
+
+class PackPipeline:
+    """
+    Builds a meeting pack with reading, stamping and merging overlapped
+
+    Up to read_ahead inputs are read, or are being read or stamped, ahead
+    of the merge, which bounds the memory held by inputs that are waiting.
+    Each input's page numbers are known as soon as it has been read, so
+    several can be stamped at once. Stamping runs in executor if one is
+    given; otherwise in a thread, or in pack.jobs worker processes if the
+    pack was given more than one job.
+    """
+
+    def __init__(
+        self,
+        pack: MeetingPack,
+        read_ahead: int = 4,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        if read_ahead < 1:
+            raise ValueError("read_ahead must be at least 1")
+        self.pack = pack
+        self.read_ahead = read_ahead
+        self.executor = executor
+
+    def _stamper(self) -> "contextlib.AbstractContextManager[Executor]":
+        if self.executor is not None:
+            return contextlib.nullcontext(self.executor)
+        jobs = self.pack.jobs or os.cpu_count() or 1
+        if jobs == 1:
+            return ThreadPoolExecutor(max_workers=1)
+        return ProcessPoolExecutor(max_workers=jobs)
+
+    async def _stamp(
+        self, segment: PackSegment, data: bytes, stamper: Executor
+    ) -> bytes:
+        pack = self.pack
+        loop = asyncio.get_running_loop()
+        key = None
+        if pack.stamp_cache is not None:
+            # the input is hashed from the data already read, off the loop
+            key = await loop.run_in_executor(None, pack.cache_key, segment, data)
+        if key is not None and pack.stamp_cache is not None:
+            cached = pack.stamp_cache.get(key)
+            if cached is not None:
+                return cached
+
+        stamped, wall, cpu = await loop.run_in_executor(
+            stamper, stamp_data_timed, segment, data
+        )
+        pack.stats.record("stamp: %s" % segment.filename, wall, cpu)
+        if key is not None and pack.stamp_cache is not None:
+            pack.stamp_cache.put(key, stamped)
+        return stamped
+
+    async def build(self, output: Optional[IO[bytes]] = None) -> None:
+        """
+        build the meeting pack, by default into the pack's in-memory buffer,
+        or streaming it into output
+        """
+        pack = self.pack
+        loop = asyncio.get_running_loop()
+        streaming = output is not None
+        writer = PackWriter(output if output is not None else pack.buffer)
+
+        segments = list(pack.segments())
+        upcoming: Iterator[PackSegment] = iter(segments)
+        reads: Deque[Tuple[PackSegment, "asyncio.Future[Tuple[bytes, float]]"]]
+        reads = deque()
+        stamps: Deque[Tuple[PackSegment, "asyncio.Task[bytes]"]] = deque()
+
+        readers = ThreadPoolExecutor(max_workers=self.read_ahead)
+        with readers, self._stamper() as stamper:
+
+            def read_more() -> None:
+                while len(reads) + len(stamps) < self.read_ahead:
+                    segment = next(upcoming, None)
+                    if segment is None:
+                        return
+                    reading = loop.run_in_executor(readers, read_timed, segment.path)
+                    reads.append((segment, reading))
+
+            pagenum = 1
+            done = 0
+            try:
+                read_more()
+                while reads or stamps:
+                    if reads:
+                        segment, reading = reads.popleft()
+                        data, wall = await reading
+                        pack.stats.record(
+                            "read: %s" % segment.filename, wall, 0, len(data)
+                        )
+                        segment = segment._replace(start=pagenum)
+                        pagenum += count_document_pages(data)
+                        task = loop.create_task(self._stamp(segment, data, stamper))
+                        stamps.append((segment, task))
+
+                    # merge, in order, the parts that are ready; once
+                    # nothing is left to read, wait for the oldest part
+                    while stamps and (stamps[0][1].done() or not reads):
+                        segment, task = stamps.popleft()
+                        stamped = await task
+                        pages = document_pages(stamped)
+                        pack.merge(writer, segment, pages, streaming)
+                        done += 1
+                        if pack.progress is not None:
+                            pack.progress(
+                                ProgressEvent(
+                                    "pack",
+                                    done,
+                                    len(segments),
+                                    str(segment.filename),
+                                )
+                            )
+                        read_more()
+            finally:
+                for _, task in stamps:
+                    task.cancel()
+
+        pack.finish(writer, streaming)
+
+    async def write(self, filename: Union[str, Path]) -> None:
+        """build the meeting pack streaming it straight into a file"""
+        with self.pack.output_file(filename) as fh:
+            await self.build(fh)
@@ -0,0 +1,104 @@
+"""
+Progress reporting for agenda and pack builds
+
+Messages go through the 'agendabuilder' logger so that the command line
+and library callers can choose how much they see. Library callers can
+also pass a callback that is given a ProgressEvent as each part of a
+build completes; ProgressBar is such a callback that draws a throttled
+bar on a terminal.
+"""
+
+import logging
+import sys
+import time
+from typing import (
+    Callable,
+    IO,
+    NamedTuple,
+    Optional,
+)
+
+logger = logging.getLogger("agendabuilder")
+
+
+class ProgressEvent(NamedTuple):
+    """one part of a build has finished"""
+
+    stage: str
+    done: int
+    total: int
+    detail: str = ""
+
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+
+class ProgressBar:
+    """
+    Draws a single-line progress bar, redrawing at most every interval seconds
+
+    The final event of a stage is always drawn so that the bar ends full.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[IO[str]] = None,
+        width: int = 30,
+        interval: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.stream = stream if stream is not None else sys.stderr
+        self.width = width
+        self.interval = interval
+        self.clock = clock
+        self._last = -interval
+        self._drawn = False
+
+    def __call__(self, event: ProgressEvent) -> None:
+        now = self.clock()
+        finished = event.done >= event.total
+        if not finished and now - self._last < self.interval:
+            return
+        self._last = now
+
+        filled = self.width * event.done // max(event.total, 1)
+        line = "\r%-6s [%s%s] %d/%d %s" % (
+            event.stage,
+            "#" * filled,
+            "." * (self.width - filled),
+            event.done,
+            event.total,
+            event.detail,
+        )
+        # padded so that a shorter line hides the end of the previous one
+        self.stream.write(line[:80].ljust(80))
+        self._drawn = True
+        if finished:
+            self.close()
+        else:
+            self.stream.flush()
+
+    def close(self) -> None:
+        """end the line of the bar, if one has been drawn"""
+        if self._drawn:
+            self.stream.write("\n")
+            self.stream.flush()
+            self._drawn = False
+
+
+_handler: Optional[logging.Handler] = None
+
+
+def configure_logging(
+    level: int = logging.INFO, stream: Optional[IO[str]] = None
+) -> None:
+    """send agendabuilder's messages at or above level to stream (stderr)"""
+    global _handler  # pylint: disable=global-statement
+
+    if _handler is not None:
+        logger.removeHandler(_handler)
+    _handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(level)
+    logger.propagate = False
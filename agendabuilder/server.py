@@ -0,0 +1,319 @@
+"""
+A local build service for agendas and meeting packs
+
+Building through the service rather than running the command line for
+each request avoids paying for the interpreter start up, the imports and
+the parsing of templates and standing documents every time: the workers
+are started once, and each keeps the templates and PDF files that it has
+parsed in its session for the jobs that follow. The workers read PDF files
+into memory rather than mapping them, as the inputs of a long-running
+service may well be replaced while it still holds them.
+
+    POST /agenda  {"config": "committees/finance/meeting.yaml"}
+    POST /pack    {"config": "committees/finance/meeting.yaml"}
+    GET  /status
+
+The built agenda or pack is sent back as the body of the response. The
+configuration files must be within the root directory of the service.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+import http.server
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import socket
+import socketserver
+import threading
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    Tuple,
+    Union,
+)
+import weakref
+
+from . import config
+from .batch import BuildSession
+from .build import build_listing, build_pack, configure
+from .locator import FileLocator
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "agenda": "application/vnd.openxmlformats-officedocument"
+    ".wordprocessingml.document",
+    "pack": "application/pdf",
+}
+
+# size of the pieces in which outputs are sent
+CHUNK_SIZE = 64 * 1024
+
+
+class ServiceBusy(Exception):
+    """the queue of jobs is full"""
+
+
+class JobError(Exception):
+    """a job could not be run as requested"""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+_session: Optional[BuildSession] = None
+
+
+def _worker_session() -> BuildSession:
+    """the session of a worker process, which lives as long as the process"""
+    global _session  # pylint: disable=global-statement
+
+    if _session is None:
+        _session = BuildSession(mapped_pdfs=False)
+    return _session
+
+
+def _warm_worker() -> None:
+    """import the libraries used for building before the first job arrives"""
+    # pylint: disable=import-outside-toplevel,unused-import
+    from . import agendalisting, pack  # noqa: F401
+
+    _worker_session()
+
+
+def run_job(step: str, config_filename: str, use_cache: bool = False) -> str:
+    """build one step of a meeting in a worker, returning the output file"""
+    session = _worker_session()
+    meeting = configure(config_filename, use_cache=use_cache)
+    locator = FileLocator(config_filename)
+
+    if step == "agenda":
+        build_listing(meeting, locator, session=session)
+        output = meeting.metadata["agenda_draft"]
+    else:
+        build_pack(meeting, locator, stream=True, use_cache=use_cache, session=session)
+        output = meeting.metadata["meeting_pack"]
+    return str(locator(output))
+
+
+class BuildService:
+    """
+    A pool of warm worker processes and a bounded queue of build jobs
+
+    Up to jobs builds run at once and up to queue_size more wait for a
+    worker; further requests are refused with ServiceBusy rather than
+    left to pile up. Requests for the same step of the same meeting are
+    run one at a time so that they do not overwrite each other's output.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        jobs: int = 2,
+        queue_size: int = 8,
+        use_cache: bool = False,
+    ) -> None:
+        self.root = Path(root).resolve()
+        self.jobs = jobs or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.use_cache = use_cache
+        self._slots = threading.BoundedSemaphore(self.jobs + queue_size)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.jobs, initializer=_warm_worker
+        )
+        # each lock is forgotten once no request holds or waits for it
+        self._locks: "weakref.WeakValueDictionary[Tuple[str, Path], threading.Lock]"
+        self._locks = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def resolve(self, config_filename: str) -> Path:
+        """the configuration file, which must be within the root directory"""
+        try:
+            path = (self.root / config_filename).resolve()
+            is_file = path.is_file()
+        except (OSError, ValueError) as exc:
+            # e.g. a name that is too long or contains a null character
+            raise JobError(400, "%s: %s" % (config_filename, exc)) from exc
+        if self.root not in path.parents:
+            raise JobError(403, "%s is outside of the service root" % config_filename)
+        if not is_file:
+            raise JobError(404, "%s not found" % config_filename)
+        return path
+
+    def _output_lock(self, step: str, path: Path) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault((step, path), threading.Lock())
+
+    def build(self, step: str, config_filename: str) -> Tuple[Path, threading.Lock]:
+        """
+        build a step of a meeting, returning its output and the lock of the
+        output, which the caller must release once it has read the output
+        """
+        if step not in CONTENT_TYPES:
+            raise JobError(404, "unknown step '%s'" % step)
+        path = self.resolve(config_filename)
+
+        if not self._slots.acquire(blocking=False):
+            raise ServiceBusy()
+        lock = self._output_lock(step, path)
+        try:
+            with self._lock:
+                self.pending += 1
+            lock.acquire()
+            future: "Future[str]" = self._pool.submit(
+                run_job, step, str(path), self.use_cache
+            )
+            try:
+                output = Path(future.result())
+            except config.ConfigError as exc:
+                lock.release()
+                raise JobError(400, str(exc)) from exc
+            except Exception as exc:
+                lock.release()
+                raise JobError(500, "%s: %s" % (type(exc).__name__, exc)) from exc
+        except JobError:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+
+        with self._lock:
+            self.completed += 1
+        return output, lock
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.jobs,
+                "queue_size": self.queue_size,
+                "pending": self.pending,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+
+class BuildRequestHandler(http.server.BaseHTTPRequestHandler):
+    server_version = "agendabuilder"
+
+    @property
+    def service(self) -> BuildService:
+        return self.server.service  # type: ignore
+
+    def address_string(self) -> str:
+        # clients of a Unix socket have no address
+        return str(self.client_address[0]) if self.client_address else "local"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # pylint: disable=redefined-builtin
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("UTF-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        if self.path == "/status":
+            self._send_json(200, self.service.status())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        step = self.path.strip("/")
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            config_filename = request["config"]
+            if not isinstance(config_filename, str):
+                raise TypeError(config_filename)
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": 'expected {"config": "meeting.yaml"}'})
+            return
+
+        try:
+            output, lock = self.service.build(step, config_filename)
+        except ServiceBusy:
+            self.send_response(503)
+            self.send_header("Retry-After", "5")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        except JobError as exc:
+            self._send_json(exc.status, {"error": str(exc)})
+            return
+
+        try:
+            with open(output, "rb") as fh:
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPES[step])
+                self.send_header("Content-Length", str(os.fstat(fh.fileno()).st_size))
+                self.send_header(
+                    "Content-Disposition", 'attachment; filename="%s"' % output.name
+                )
+                self.end_headers()
+                shutil.copyfileobj(fh, self.wfile, CHUNK_SIZE)
+        finally:
+            lock.release()
+
+
+class BuildServer(http.server.ThreadingHTTPServer):
+    """HTTP server for a build service on a TCP port"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: BuildService) -> None:
+        super().__init__(address, BuildRequestHandler)
+        self.service = service
+
+
+class UnixBuildServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server for a build service on a Unix socket"""
+
+    daemon_threads = True
+
+    def __init__(self, path: Union[str, Path], service: BuildService) -> None:
+        if Path(path).is_socket():
+            Path(path).unlink()
+        super().__init__(str(path), BuildRequestHandler)
+        self.service = service
+
+
+def make_server(
+    service: BuildService,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    socket_path: Optional[Union[str, Path]] = None,
+) -> socketserver.BaseServer:
+    if socket_path is not None:
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix sockets are not available on this system")
+        return UnixBuildServer(socket_path, service)
+    return BuildServer((host, port), service)
+
+
+def serve(server: socketserver.BaseServer) -> None:
+    """handle requests until interrupted"""
+    logger.info("Serving on %s", server.server_address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()  # type: ignore
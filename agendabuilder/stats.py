@@ -0,0 +1,174 @@
+"""
+Timing and I/O statistics for each phase of a build
+"""
+
+import contextlib
+import json
+import sys
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore
+
+
+def peak_rss(children: bool = False) -> Optional[int]:
+    """
+    peak resident set size in bytes, if known
+
+    With children, this is the peak of the largest finished child process,
+    such as a stamping worker.
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    usage = resource.getrusage(who)
+    # Linux reports kB, macOS reports bytes
+    scale = 1 if sys.platform == "darwin" else 1024
+    return int(usage.ru_maxrss * scale)
+
+
+def format_bytes(size: Optional[float]) -> str:
+    if size is None:
+        return "n/a"
+    for unit in ("B", "kB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            break
+        size /= 1024
+    return ("%d %s" if unit == "B" else "%.1f %s") % (size, unit)
+
+
+class PhaseStats:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.count = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "count": self.count,
+        }
+
+
+class BuildStats:
+    """
+    Wall time, CPU time and bytes read and written for each phase
+
+    Phases with the same name are accumulated, so that e.g. the merging of
+    each enclosure can be reported as a single 'merge' phase.
+    """
+
+    def __init__(self) -> None:
+        self._phases: Dict[str, PhaseStats] = {}
+        self._start = time.perf_counter()
+        self._start_cpu = time.process_time()
+        # whether any phases were run in worker processes
+        self._workers = False
+
+    @property
+    def phases(self) -> List[PhaseStats]:
+        return list(self._phases.values())
+
+    def get(self, name: str) -> PhaseStats:
+        if name not in self._phases:
+            self._phases[name] = PhaseStats(name)
+        return self._phases[name]
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[PhaseStats]:
+        """time a phase; the caller adds the bytes read and written"""
+        stats = self.get(name)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield stats
+        finally:
+            stats.wall += time.perf_counter() - wall
+            stats.cpu += time.process_time() - cpu
+            stats.count += 1
+
+    def record(
+        self,
+        name: str,
+        wall: float,
+        cpu: float,
+        bytes_read: int = 0,
+        bytes_written: int = 0,
+    ) -> None:
+        """add a phase that was timed elsewhere, e.g. in a worker process"""
+        self._workers = True
+        stats = self.get(name)
+        stats.wall += wall
+        stats.cpu += cpu
+        stats.bytes_read += bytes_read
+        stats.bytes_written += bytes_written
+        stats.count += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "phases": [p.as_dict() for p in self.phases],
+            "total": {
+                "wall": time.perf_counter() - self._start,
+                "cpu": time.process_time() - self._start_cpu,
+                "bytes_read": sum(p.bytes_read for p in self.phases),
+                "bytes_written": sum(p.bytes_written for p in self.phases),
+            },
+            "peak_rss": peak_rss(),
+            "peak_rss_workers": peak_rss(children=True),
+        }
+
+    def report_json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def report_text(self) -> str:
+        data = self.as_dict()
+        total = data["total"]
+
+        rows = [
+            (p.name, p.wall, p.cpu, p.bytes_read, p.bytes_written) for p in self.phases
+        ]
+        rows.append(
+            (
+                "total",
+                total["wall"],
+                total["cpu"],
+                total["bytes_read"],
+                total["bytes_written"],
+            )
+        )
+
+        width = max(len(row[0]) for row in rows)
+        line = "%%-%ds %%9s %%9s %%10s %%10s" % width
+
+        s = [line % ("Phase", "wall (s)", "cpu (s)", "read", "written")]
+        for name, wall, cpu, read, written in rows:
+            s.append(
+                line
+                % (
+                    name,
+                    "%.3f" % wall,
+                    "%.3f" % cpu,
+                    format_bytes(read),
+                    format_bytes(written),
+                )
+            )
+        s.append("Peak RSS: %s" % format_bytes(data["peak_rss"]))
+        if self._workers:
+            s.append("Peak RSS of workers: %s" % format_bytes(data["peak_rss_workers"]))
+        return "\n".join(s)
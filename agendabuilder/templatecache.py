@@ -0,0 +1,121 @@
+"""
+Cache of compiled Word templates shared by the agendas built in one process
+"""
+
+import copy
+import hashlib
+import io
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import docx  # type: ignore
+from docx.enum.style import WD_STYLE_TYPE  # type: ignore
+import docx.table  # type: ignore
+
+
+CacheKey = Tuple[str, int, int]
+
+
+class CompiledTemplate:
+    """
+    A parsed agenda template along with the work done to fill it in
+
+    Besides the parsed document, this records which body element is the
+    agenda table, the IDs of the paragraph styles that have been looked up
+    by name and the prototype rows that AgendaListing copies for each row.
+    None of these change while the agenda is filled in, so they are shared
+    by every agenda built from the same template.
+    """
+
+    def __init__(self, document: docx.Document) -> None:
+        self.document = document
+        body = document.element.body
+        table = document.tables[0]
+        self.table_index = body.index(table._tbl)  # pylint: disable=protected-access
+        self.style_ids: Dict[str, Optional[str]] = {}
+        self.prototypes: Dict[Tuple[Any, ...], Any] = {}
+
+    def instantiate(self) -> docx.Document:
+        """a separate copy of the document to be filled in"""
+        return copy.deepcopy(self.document)
+
+    def table(self, document: docx.Document) -> docx.table.Table:
+        """the agenda table within a copy of the document"""
+        body = document.element.body
+        parent = document._body  # pylint: disable=protected-access
+        return docx.table.Table(body[self.table_index], parent)
+
+    def style_id(self, document: docx.Document, name: str) -> Optional[str]:
+        """the ID of the named paragraph style; None for the default style"""
+        if name not in self.style_ids:
+            part = document.part
+            self.style_ids[name] = part.get_style_id(name, WD_STYLE_TYPE.PARAGRAPH)
+        return self.style_ids[name]
+
+
+class TemplateCache:
+    """
+    Compiled templates keyed by the content of the template file
+
+    Each template file is read and parsed once; identical copies of a
+    template, e.g. one per committee, share a single compiled template.
+    Every request is given a separate copy of the document, as filling in
+    the agenda modifies it.
+    """
+
+    def __init__(self) -> None:
+        # resolved path, mtime and size of each file read -> its digest
+        self._digests: Dict[CacheKey, str] = {}
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self.hits = 0
+        self.misses = 0
+        # size of the files that have been read
+        self.bytes_read = 0
+
+    @staticmethod
+    def key(filename: Union[str, Path]) -> CacheKey:
+        path = Path(filename).resolve()
+        stat = path.stat()
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, filename: Union[str, Path]) -> CompiledTemplate:
+        key = self.key(filename)
+        digest = self._digests.get(key)
+        if digest is not None:
+            self.hits += 1
+            return self._templates[digest]
+
+        data = Path(key[0]).read_bytes()
+        self.bytes_read += len(data)
+        digest = hashlib.sha256(data).hexdigest()
+        self._digests[key] = digest
+
+        compiled = self._templates.get(digest)
+        if compiled is not None:
+            self.hits += 1
+            return compiled
+
+        self.misses += 1
+        compiled = CompiledTemplate(docx.Document(io.BytesIO(data)))
+        self._templates[digest] = compiled
+        return compiled
+
+    def clear(self) -> None:
+        self._digests.clear()
+        self._templates.clear()
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def __str__(self) -> str:
+        return "Template cache: %d templates, %d hits, %d misses" % (
+            len(self),
+            self.hits,
+            self.misses,
+        )
@@ -0,0 +1,95 @@
+# test filling in the agenda listing
+
+from pathlib import Path
+from typing import (
+    Any,
+    Optional,
+    Union,
+)
+import unittest
+
+from agendabuilder import config
+from agendabuilder.agendalisting import AgendaListing
+from agendabuilder.locator import FileLocator
+from agendabuilder.meeting import Agenda, AgendaHeading, AgendaItem, AgendaSubItem
+from agendabuilder.templatecache import TemplateCache
+
+
+def find_test_file(filename: Union[str, Path]) -> Path:
+    """ find a test file that is located within the test suite """
+    return Path(__file__).parent / Path(filename)
+
+
+def fill_rows(listing: AgendaListing, table: Any) -> None:
+    """ fill in the rows one at a time using python-docx, as a reference """
+    # pylint: disable=protected-access
+    for item in listing.meeting.items:
+        if isinstance(item, AgendaHeading):
+            row = table.add_row()
+            row.cells[0].text = str(item.num)
+            listing._fill_header(item, row)
+        elif isinstance(item, AgendaItem):
+            row = table.add_row()
+            row.cells[0].text = str(item.num)
+            listing._fill_item(item, row)
+
+
+class AgendaListingTests(unittest.TestCase):
+    # pylint: disable=protected-access
+
+    def setUp(self) -> None:
+        self.cfg = find_test_file("meeting.yaml")
+        self.locator = FileLocator(self.cfg)
+
+    def _meeting(self) -> Agenda:
+        meeting = config.load(self.cfg)
+        meeting.extend(
+            [
+                AgendaHeading("Awkward items"),
+                AgendaItem("Starred", who="Chair", action="Approve", starred=True),
+                AgendaItem("Starred without who", action="Note", starred=True),
+                AgendaItem("No action", who="Secretary", action=""),
+                AgendaSubItem("Sub-item", who="Secretary", action="Note"),
+                AgendaSubItem("Starred sub-item", action="Approve", starred=True),
+                AgendaItem("Tab\tand\nnew line", who="  spaced  ", action="Note"),
+            ]
+        )
+        return meeting
+
+    def _listing_xml(self, bulk: bool, cache: Optional[TemplateCache] = None) -> str:
+        meeting = self._meeting()
+        listing = AgendaListing(
+            meeting, meeting.metadata["agenda_template"], self.locator, cache=cache
+        )
+        listing.load_template()
+        table = listing.find_table()
+        if bulk:
+            listing._fill_rows_bulk(table)
+        else:
+            fill_rows(listing, table)
+        return listing.document.element.xml  # type: ignore
+
+    def test_bulk_rows(self) -> None:
+        """ Test that copying prototype rows gives the same document """
+        bulk = self._listing_xml(bulk=True)
+        self.assertEqual(bulk, self._listing_xml(bulk=False))
+        self.assertIn("Starred without who", bulk)
+        self.assertIn("<w:tab/>", bulk)
+        self.assertNotIn("", bulk)
+
+    def test_template_cache(self) -> None:
+        """ Test that agendas from a compiled template match a fresh parse """
+        cache = TemplateCache()
+        expected = self._listing_xml(bulk=True)
+
+        self.assertEqual(self._listing_xml(bulk=True, cache=cache), expected)
+        compiled = cache.get(self.locator("agenda-template.docx"))
+        prototypes = len(compiled.prototypes)
+        self.assertGreater(prototypes, 0)
+
+        # the second agenda reuses the parse, style IDs and prototype rows
+        # and the first agenda did not alter the compiled template
+        self.assertEqual(self._listing_xml(bulk=True, cache=cache), expected)
+        self.assertEqual(len(compiled.prototypes), prototypes)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(len(compiled.document.tables[0].rows), 1)  # type: ignore
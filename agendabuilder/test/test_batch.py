@@ -0,0 +1,101 @@
+# test building many meetings at once
+
+from pathlib import Path
+import shutil
+import tempfile
+from typing import (
+    Union,
+)
+import unittest
+
+from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.pdfgen.canvas import Canvas  # type: ignore
+
+from agendabuilder import commands
+from agendabuilder.batch import current_session, expand_configs
+
+
+def find_test_file(filename: Union[str, Path]) -> Path:
+    """ find a test file that is located within the test suite """
+    return Path(__file__).parent / Path(filename)
+
+
+class BatchTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.base = Path(self.tempdir.name)
+
+        self.test_pdfs = [
+            "agenda-final.pdf",
+            "consultation-cover.pdf",
+            "consultation report.pdf",
+            "consultation report appendices.pdf",
+            "consultation-future-cover.pdf",
+        ]
+
+        # two committees with the same shape of meeting
+        self.configs = []
+        for committee in ("alpha", "beta"):
+            directory = self.base / committee
+            directory.mkdir()
+            for filename in ("meeting.yaml", "agenda-template.docx"):
+                shutil.copy(find_test_file(filename), directory / filename)
+            for pdf in self.test_pdfs:
+                self._build_test_pdf(directory / pdf, "This is %s" % pdf)
+            self.configs.append(directory / "meeting.yaml")
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    @staticmethod
+    def _build_test_pdf(filename: Path, text: str) -> None:
+        canvas = Canvas(str(filename), pagesize=A4)
+        canvas.setFont("Times-Roman", 12)
+        canvas.drawString(140, 140, text)
+        canvas.save()
+
+    def test_expand_configs(self) -> None:
+        """ Test that glob patterns are expanded and duplicates dropped """
+        pattern = str(self.base / "*" / "meeting.yaml")
+        self.assertEqual(expand_configs([pattern]), self.configs)
+        self.assertEqual(expand_configs([self.configs[1], pattern]), self.configs[::-1])
+        self.assertRaises(ValueError, expand_configs, [str(self.base / "*.yml")])
+
+    def test_build_batch(self) -> None:
+        """ Test building several meetings sharing one session """
+        session = current_session()
+
+        results = commands.build_batch([str(self.base / "*" / "meeting.yaml")])
+
+        self.assertEqual([r.config for r in results], self.configs)
+        self.assertTrue(all(r.ok for r in results))
+        for cfg in self.configs:
+            self.assertTrue((cfg.parent / "agenda-draft.docx").exists())
+            self.assertTrue((cfg.parent / "meeting-pack.pdf").exists())
+
+        # a second run in the same process reads nothing from disk again
+        hits = session.templates.hits
+        read = session.pdfs.bytes_read + session.templates.bytes_read
+        commands.build_batch(self.configs)
+        self.assertEqual(session.templates.hits, hits + 2)
+        self.assertEqual(session.pdfs.bytes_read + session.templates.bytes_read, read)
+
+    def test_build_batch_parallel(self) -> None:
+        """ Test that a failed meeting does not stop the others """
+        (self.configs[0].parent / "consultation report.pdf").unlink()
+
+        results = commands.build_batch(self.configs, jobs=2)
+
+        self.assertFalse(results[0].ok)
+        self.assertIn("consultation report.pdf", str(results[0].error))
+        self.assertTrue(results[1].ok)
+        self.assertTrue((self.configs[1].parent / "meeting-pack.pdf").exists())
+
+    def test_main_batch(self) -> None:
+        """ Test main with batch argument """
+        status = commands.main(
+            ["batch", "--quiet", "--steps", "agenda"]
+            + [str(cfg) for cfg in self.configs]
+        )
+        self.assertEqual(status, 0)
+        self.assertFalse((self.configs[0].parent / "meeting-pack.pdf").exists())
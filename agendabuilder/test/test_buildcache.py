@@ -0,0 +1,158 @@
+# test reuse of stamped enclosures between builds
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import tempfile
+from typing import (
+    Optional,
+    Union,
+)
+import unittest
+
+from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.pdfgen.canvas import Canvas  # type: ignore
+
+from agendabuilder import config
+from agendabuilder.buildcache import StampCache, stamp_cache_dir
+from agendabuilder.locator import FileLocator
+from agendabuilder.pack import MeetingPack
+from agendabuilder.pipeline import PackPipeline
+
+
+def find_test_file(filename: Union[str, Path]) -> Path:
+    """ find a test file that is located within the test suite """
+    return Path(__file__).parent / Path(filename)
+
+
+class StampCacheTests(unittest.TestCase):
+    # pylint: disable=protected-access
+
+    def setUp(self) -> None:
+        self.cfg = find_test_file("meeting.yaml")
+        self.locator = FileLocator(self.cfg)
+        self.meeting = config.load(self.cfg)
+        self.tempdir = tempfile.TemporaryDirectory()
+
+        self.test_pdfs = [
+            "agenda-final.pdf",
+            "consultation-cover.pdf",
+            "consultation report.pdf",
+            "consultation report appendices.pdf",
+            "consultation-future-cover.pdf",
+        ]
+        for pdf in self.test_pdfs:
+            self._build_test_pdf(pdf, "This is %s" % pdf)
+
+    def tearDown(self) -> None:
+        for f in self.test_pdfs:
+            p = Path(self.locator(f))
+            if p.exists():
+                p.unlink()
+        self.tempdir.cleanup()
+
+    def _build_test_pdf(self, filename: Union[str, Path], text: str) -> None:
+        canvas = Canvas(str(self.locator(filename)), pagesize=A4, invariant=1)
+        canvas.setFont("Times-Roman", 12)
+        canvas.drawString(140, 140, text)
+        canvas.save()
+
+    def _build(self, stamp_cache: Optional[StampCache]) -> bytes:
+        pack = MeetingPack(
+            self.meeting,
+            self.meeting.metadata["agenda_final"],
+            self.locator,
+            stamp_cache=stamp_cache,
+        )
+        pack.build()
+        return pack.buffer.getvalue()  # type: ignore
+
+    def test_rebuild(self) -> None:
+        """ Test that an unchanged rebuild reuses every stamped part """
+        uncached = self._build(None)
+
+        first = self._build(StampCache(self.tempdir.name))
+        cache = StampCache(self.tempdir.name)
+        second = self._build(cache)
+
+        self.assertEqual(first, uncached)
+        self.assertEqual(second, uncached)
+        self.assertEqual(cache.hits, len(self.test_pdfs))
+        self.assertEqual(cache.misses, 0)
+
+    def test_changed_file(self) -> None:
+        """ Test that only the changed part is restamped """
+        self._build(StampCache(self.tempdir.name))
+
+        self._build_test_pdf("consultation report.pdf", "A late change")
+        cache = StampCache(self.tempdir.name)
+        self._build(cache)
+
+        self.assertEqual(cache.hits, len(self.test_pdfs) - 1)
+        self.assertEqual(cache.misses, 1)
+
+        # the superseded part is pruned
+        entries = list(Path(self.tempdir.name).glob("*.pdf"))
+        self.assertEqual(len(entries), len(self.test_pdfs))
+
+    def test_changed_numbering(self) -> None:
+        """ Test that parts after a change in page count are restamped """
+        self._build(StampCache(self.tempdir.name))
+
+        canvas = Canvas(str(self.locator("consultation-cover.pdf")), pagesize=A4)
+        canvas.drawString(140, 140, "Page 1")
+        canvas.showPage()
+        canvas.drawString(140, 140, "Page 2")
+        canvas.save()
+
+        cache = StampCache(self.tempdir.name)
+        self._build(cache)
+
+        # agenda unchanged; cover changed; everything after it is renumbered
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, len(self.test_pdfs) - 1)
+
+    def test_concurrent_put(self) -> None:
+        """ Test that builds storing the same part at once do not clash """
+        entries = [bytes([num]) * 100000 for num in range(8)]
+
+        def put(data: bytes) -> None:
+            StampCache(self.tempdir.name).put("part", data)
+
+        with ThreadPoolExecutor(max_workers=len(entries)) as pool:
+            list(pool.map(put, entries))
+
+        self.assertIn(StampCache(self.tempdir.name).get("part"), entries)
+        self.assertEqual(
+            [path.name for path in Path(self.tempdir.name).iterdir()], ["part.pdf"]
+        )
+
+    def test_stamp_cache_dir(self) -> None:
+        """ Test that each meeting in a folder has stamp cache entries of its own """
+        finance = FileLocator(Path(self.tempdir.name) / "finance.yaml")
+        estates = FileLocator(Path(self.tempdir.name) / "estates.yaml")
+
+        StampCache(stamp_cache_dir(finance)).put("part", b"finance")
+        StampCache(stamp_cache_dir(estates)).put("part", b"estates")
+        StampCache(stamp_cache_dir(estates)).prune()
+
+        self.assertEqual(StampCache(stamp_cache_dir(finance)).get("part"), b"finance")
+        self.assertEqual(
+            stamp_cache_dir(finance).parent, stamp_cache_dir(estates).parent
+        )
+
+    def test_pipeline(self) -> None:
+        """ Test that the pipeline reuses the parts stamped by a build """
+        uncached = self._build(StampCache(self.tempdir.name))
+
+        cache = StampCache(self.tempdir.name)
+        pack = MeetingPack(
+            self.meeting,
+            self.meeting.metadata["agenda_final"],
+            self.locator,
+            stamp_cache=cache,
+        )
+        asyncio.run(PackPipeline(pack).build())
+
+        self.assertEqual(pack.buffer.getvalue(), uncached)
+        self.assertEqual(cache.hits, len(self.test_pdfs))
@@ -0,0 +1,120 @@
+# test checking the files of a meeting without building
+
+from pathlib import Path
+import shutil
+import tempfile
+from typing import (
+    Union,
+)
+import unittest
+from unittest import mock
+
+from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.pdfgen.canvas import Canvas  # type: ignore
+
+from agendabuilder import commands
+from agendabuilder.check import check_meeting, check_pdf
+from agendabuilder.locator import FileLocator
+from agendabuilder.pagecount import UnsupportedPdf
+
+
+def find_test_file(filename: Union[str, Path]) -> Path:
+    """ find a test file that is located within the test suite """
+    return Path(__file__).parent / Path(filename)
+
+
+class CheckTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.base = Path(self.tempdir.name)
+        self.cfg = self.base / "meeting.yaml"
+        shutil.copy(find_test_file("meeting.yaml"), self.cfg)
+        shutil.copy(find_test_file("agenda-template.docx"), self.base)
+        self.locator = FileLocator(self.cfg)
+
+        self._build_test_pdf("agenda-final.pdf", 2)
+        self._build_test_pdf("consultation-cover.pdf", 1)
+        self._build_test_pdf("consultation report.pdf", 3)
+        self._build_test_pdf("consultation report appendices.pdf", 1)
+        self._build_test_pdf("consultation-future-cover.pdf", 1)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def _build_test_pdf(self, filename: str, pages: int) -> None:
+        canvas = Canvas(str(self.base / filename), pagesize=A4)
+        for page in range(pages):
+            canvas.setFont("Times-Roman", 12)
+            canvas.drawString(140, 140, "Page %d of %s" % (page, filename))
+            canvas.showPage()
+        canvas.save()
+
+    def test_layout(self) -> None:
+        """ Test the layout and size of a pack whose files are all good """
+        meeting = commands.configure(self.cfg)
+        result = check_meeting(meeting, self.locator)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(
+            [(segment.start, check.pages) for segment, check in result.layout],
+            [(1, 2), (3, 1), (4, 3), (7, 1), (8, 1)],
+        )
+        self.assertEqual(result.pages, 8)
+        self.assertEqual(
+            result.projected_size,
+            sum(path.stat().st_size for path in self.base.glob("*.pdf")),
+        )
+        self.assertIn("4-6", str(result))
+
+    def test_problems(self) -> None:
+        """ Test that missing and damaged files are all reported """
+        (self.base / "consultation report.pdf").unlink()
+        (self.base / "consultation-cover.pdf").write_bytes(b"Not a PDF")
+        appendices = self.base / "consultation report appendices.pdf"
+        appendices.write_bytes(appendices.read_bytes()[:200])
+
+        meeting = commands.configure(self.cfg)
+        result = check_meeting(meeting, self.locator)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(
+            [(name, check.error) for name, check in result.problems],
+            [
+                ("consultation-cover.pdf", "not a PDF file"),
+                ("consultation report.pdf", "No such file or directory"),
+                (
+                    "consultation report appendices.pdf",
+                    result.layout[3][1].error,
+                ),
+            ],
+        )
+        self.assertTrue(str(result.layout[3][1].error).startswith("cannot be read"))
+        self.assertEqual(commands.main(["check", "-q", str(self.cfg)]), 1)
+
+    def test_missing_keys(self) -> None:
+        """ Test that files missing from the configuration are reported """
+        meeting = commands.configure(self.cfg)
+        del meeting.metadata["agenda_final"]
+        del meeting.metadata["agenda_template"]
+
+        result = check_meeting(meeting, self.locator)
+
+        self.assertEqual(
+            [(name, check.error) for name, check in result.problems],
+            [
+                ("agenda_final", "missing from the configuration"),
+                ("agenda_template", "missing from the configuration"),
+            ],
+        )
+        self.assertEqual(result.layout[0][0].filename, "consultation-cover.pdf")
+        self.assertEqual(result.layout[0][0].start, 1)
+
+    def test_fallback(self) -> None:
+        """ Test that files that cannot be followed quickly are parsed instead """
+        path = self.base / "agenda-final.pdf"
+        with mock.patch(
+            "agendabuilder.check.PageCounter", side_effect=UnsupportedPdf("filter")
+        ):
+            check = check_pdf(path)
+        self.assertTrue(check.ok)
+        self.assertEqual(check.pages, 2)
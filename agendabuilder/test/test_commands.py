@@ -1,17 +1,35 @@
 # test commands
 
+import asyncio
+import io
+import json
 from pathlib import Path
+import random
 import re
+import subprocess
+import sys
 from typing import (
+    Any,
+    List,
+    Set,
+    Tuple,
     Union,
 )
 import unittest
+from unittest import mock
 
+from PIL import Image  # type: ignore
+from PyPDF2 import PdfFileReader  # type: ignore
 from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.lib.utils import ImageReader  # type: ignore
 from reportlab.pdfgen.canvas import Canvas  # type: ignore
 
 from agendabuilder import commands
 from agendabuilder.locator import FileLocator
+from agendabuilder.pack import MeetingPack
+from agendabuilder.pdfcache import PdfDocumentCache
+from agendabuilder.pipeline import PackPipeline, read_timed
+from agendabuilder.progress import ProgressEvent
 
 
 def find_test_file(filename: Union[str, Path]) -> Path:
@@ -19,6 +37,44 @@ def find_test_file(filename: Union[str, Path]) -> Path:
     return Path(__file__).parent / Path(filename)
 
 
+# run main in a fresh interpreter, listing the heavy libraries it imported
+IMPORTED_LIBRARIES = """
+import sys
+from agendabuilder import commands
+try:
+    commands.main(sys.argv[1:])
+except SystemExit:
+    pass
+libraries = {"PyPDF2", "docx", "lxml", "reportlab"}
+print("Libraries:", *sorted(libraries & {m.split(".")[0] for m in sys.modules}))
+"""
+
+
+def imported_libraries(args: List[str]) -> Set[str]:
+    """ find the heavy libraries imported by running main with args """
+    proc = subprocess.run(
+        [sys.executable, "-c", IMPORTED_LIBRARIES] + args,
+        cwd=str(Path(__file__).parent.parent.parent),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    report = proc.stdout.decode("UTF-8").splitlines()[-1]
+    return set(report.split()[1:])
+
+
+class RecordingBuffer(io.BytesIO):
+    """ an in-memory file that keeps each object written to it """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.written: List[Any] = []
+
+    def write(self, data: Any) -> int:
+        self.written.append(data)
+        return super().write(data)
+
+
 class CommandTests(unittest.TestCase):
     # pylint: disable=protected-access
 
@@ -55,6 +111,16 @@ class CommandTests(unittest.TestCase):
         canvas.drawString(140, 140, text)
         canvas.save()
 
+    def _build_long_test_pdfs(self) -> None:
+        """ inputs with a page of body text, for checking the size of the pack """
+        for pdf in self.test_pdfs:
+            canvas = Canvas(str(self.locator(pdf)), pagesize=A4)
+            canvas.setFont("Times-Roman", 12)
+            for line in range(40):
+                text = "This is %s, line %d" % (pdf, line + 1)
+                canvas.drawString(140, 780 - 15 * line, text)
+            canvas.save()
+
     def test_configure(self) -> None:
         """ Test loading the meeting from the config file """
         meeting = commands.configure(self.cfg)
@@ -78,7 +144,7 @@ class CommandTests(unittest.TestCase):
         # FIXME: this is only a smoke test
         meeting = commands.configure(self.cfg)
 
-        self._build_test_pdfs()
+        self._build_long_test_pdfs()
         commands.build_pack(meeting, self.locator)
 
         packfile = self.locator(meeting.metadata["meeting_pack"])
@@ -87,6 +153,152 @@ class CommandTests(unittest.TestCase):
         stat = packfile.stat()
         self.assertTrue(stat.st_size > 6000)
 
+    def test_build_pack_cache(self) -> None:
+        """ Test that each input PDF is parsed once per build """
+        meeting = commands.configure(self.cfg)
+
+        self._build_test_pdfs()
+        pack = MeetingPack(meeting, meeting.metadata["agenda_final"], self.locator)
+        pack.build()
+        first = pack.buffer.getvalue()
+
+        self.assertEqual(pack.cache.misses, len(self.test_pdfs))
+        hits = pack.cache.hits
+
+        # a rebuild is served entirely from the cache and stamping must
+        # not have altered the cached documents
+        pack.buffer = io.BytesIO()
+        pack.build()
+        self.assertEqual(pack.cache.misses, len(self.test_pdfs))
+        self.assertEqual(pack.cache.hits, hits + len(self.test_pdfs))
+        self.assertEqual(len(pack.buffer.getvalue()), len(first))
+
+    def test_build_pack_parallel(self) -> None:
+        """ Test that parallel stamping gives the same pack as serial """
+        meeting = commands.configure(self.cfg)
+
+        self._build_test_pdfs()
+        agenda_final = meeting.metadata["agenda_final"]
+
+        serial = MeetingPack(meeting, agenda_final, self.locator)
+        serial.build()
+
+        parallel = MeetingPack(meeting, agenda_final, self.locator, jobs=2)
+        parallel.build()
+
+        self.assertEqual(serial.buffer.getvalue(), parallel.buffer.getvalue())
+
+        starts = [segment.start for segment in serial.layout()]
+        self.assertEqual(starts, [1, 2, 3, 4, 5])
+
+    def test_build_pack_pipeline(self) -> None:
+        """ Test that the pipeline reads ahead only as far as it is allowed """
+        meeting = commands.configure(self.cfg)
+
+        self._build_test_pdfs()
+        agenda_final = meeting.metadata["agenda_final"]
+
+        serial = MeetingPack(meeting, agenda_final, self.locator)
+        serial.build()
+
+        merged: List[ProgressEvent] = []
+        ahead: List[int] = []
+
+        def read(path: str) -> Tuple[bytes, float]:
+            ahead.append(len(ahead) + 1 - len(merged))
+            return read_timed(path)
+
+        pack = MeetingPack(meeting, agenda_final, self.locator, progress=merged.append)
+        with mock.patch("agendabuilder.pipeline.read_timed", read):
+            asyncio.run(PackPipeline(pack, read_ahead=2).build())
+
+        self.assertEqual(serial.buffer.getvalue(), pack.buffer.getvalue())
+        self.assertEqual(len(ahead), 5)
+        self.assertLessEqual(max(ahead), 2)
+        self.assertEqual([event.done for event in merged], [1, 2, 3, 4, 5])
+        self.assertEqual(pack.stats.get("read: agenda-final.pdf").count, 1)
+
+    def test_build_pack_mapped(self) -> None:
+        """ Test that large streams pass from the inputs into the pack as is """
+        meeting = commands.configure(self.cfg)
+
+        self._build_test_pdfs()
+        report = self.locator("consultation report.pdf")
+        canvas = Canvas(str(report), pagesize=A4)
+        # noise does not compress, so the image stream is large
+        noise = random.Random(42).randbytes(512 * 512)
+        canvas.drawImage(ImageReader(Image.frombytes("L", (512, 512), noise)), 0, 0)
+        canvas.save()
+
+        pack = MeetingPack(meeting, meeting.metadata["agenda_final"], self.locator)
+        pack.buffer = RecordingBuffer()
+        pack.build()
+
+        reader = pack.cache.get(str(report))
+        xobjects = reader.getPage(0)["/Resources"]["/XObject"]
+        stream = list(xobjects.values())[0].getObject()
+        self.assertIsInstance(stream._data, memoryview)
+        # the data is written to the pack as a view of the mapped input,
+        # not as a copy of it
+        views = [
+            data
+            for data in pack.buffer.written
+            if isinstance(data, memoryview) and data.obj is stream._data.obj
+        ]
+        self.assertEqual(len(views), 1)
+        self.assertEqual(views[0], stream._data)
+        self.assertIn(bytes(stream._data), pack.buffer.getvalue())
+
+    def test_build_pack_stream(self) -> None:
+        """ Test that streaming the pack to disk matches the in-memory pack """
+        meeting = commands.configure(self.cfg)
+
+        self._build_test_pdfs()
+        agenda_final = meeting.metadata["agenda_final"]
+        packfile = self.locator(meeting.metadata["meeting_pack"])
+
+        pack = MeetingPack(meeting, agenda_final, self.locator)
+        pack.build()
+
+        streamed = MeetingPack(meeting, agenda_final, self.locator)
+        streamed.write(packfile)
+
+        self.assertEqual(pack.buffer.getvalue(), packfile.read_bytes())
+        self.assertEqual(len(streamed.cache), 0)
+        self.assertEqual(streamed.buffer.getvalue(), b"")
+
+        # a cache that was given, e.g. a session's, keeps its documents
+        shared = PdfDocumentCache()
+        MeetingPack(meeting, agenda_final, self.locator, cache=shared).write(packfile)
+        self.assertEqual(len(shared), len(self.test_pdfs))
+
+        reader = PdfFileReader(str(packfile))
+        self.assertEqual(reader.getNumPages(), 5)
+        self.assertEqual(
+            [bookmark.title for bookmark in reader.getOutlines()],
+            [
+                "Agenda",
+                "3.1 Consultation report on design",
+                "3.2 Future consultation plans",
+            ],
+        )
+
+    def test_toc(self) -> None:
+        """ Test listing the pages of each item without building the pack """
+        meeting = commands.configure(self.cfg)
+
+        self._build_test_pdfs()
+        entries = commands.build_toc(meeting, self.locator)
+
+        self.assertEqual(
+            [(entry.itemnum, entry.first, entry.last) for entry in entries],
+            [(None, 1, 1), ("3.1", 2, 4), ("3.2", 5, 5)],
+        )
+        self.assertEqual(
+            str(entries[1]), "      2-4  3.1 Consultation report on design"
+        )
+        self.assertFalse(self.locator(meeting.metadata["meeting_pack"]).exists())
+
     def test_main_agenda(self) -> None:
         """ Test main with agenda argument """
         # FIXME: this is only a smoke test
@@ -107,3 +319,52 @@ class CommandTests(unittest.TestCase):
                 str(self.cfg),
             ]
         )
+
+    def test_main_pack_jobs(self) -> None:
+        """ Test main with pack argument and worker processes """
+        # FIXME: this is only a smoke test
+        self._build_test_pdfs()
+        commands.main(
+            [
+                "pack",
+                "--jobs",
+                "2",
+                str(self.cfg),
+            ]
+        )
+
+    def test_main_pack_stats(self) -> None:
+        """ Test main with pack argument reporting statistics """
+        self._build_long_test_pdfs()
+        statsfile = self.locator("stats.json")
+        try:
+            commands.main(
+                [
+                    "pack",
+                    "--stats-format",
+                    "json",
+                    "--stats-file",
+                    str(statsfile),
+                    str(self.cfg),
+                ]
+            )
+            report = json.loads(statsfile.read_text(encoding="UTF-8"))
+        finally:
+            statsfile.unlink()
+
+        phases = {phase["name"]: phase for phase in report["phases"]}
+        self.assertIn("load config", phases)
+        self.assertIn("stamp: consultation-cover.pdf", phases)
+        self.assertEqual(phases["merge"]["count"], len(self.test_pdfs) + 1)
+        self.assertGreater(phases["stamp: agenda-final.pdf"]["bytes_read"], 0)
+        self.assertGreater(phases["save"]["bytes_written"], 6000)
+
+    def test_lazy_imports(self) -> None:
+        """ Test that each step only imports the libraries it needs """
+        self._build_test_pdfs()
+        cfg = str(self.cfg)
+
+        self.assertEqual(imported_libraries(["--help"]), set())
+        self.assertEqual(imported_libraries(["pack", "--help"]), set())
+        self.assertEqual(imported_libraries(["agenda", cfg]), {"docx", "lxml"})
+        self.assertEqual(imported_libraries(["pack", cfg]), {"PyPDF2", "reportlab"})
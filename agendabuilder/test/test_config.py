@@ -1,14 +1,19 @@
 # test loading of config
 
+import os
 from pathlib import Path
 import re
+import shutil
+import tempfile
 from typing import (
     Union,
 )
 import unittest
+from unittest import mock
 
 from agendabuilder import config
-from agendabuilder.meeting import AgendaHeading, AgendaItem
+from agendabuilder.buildcache import ConfigCache
+from agendabuilder.meeting import AgendaHeading, AgendaItem, AgendaSubItem
 
 
 def find_test_file(filename: Union[str, Path]) -> Path:
@@ -35,3 +40,166 @@ class ConfigTests(unittest.TestCase):
         self.assertTrue(meeting.items[7].starred)  # type: ignore
         self.assertEqual(meeting.items[6].who, "ABC")
         self.assertEqual(meeting.metadata["location"], "Null Island")
+        self.assertEqual(meeting.metadata["time"], "12:00")
+
+    def test_config_cache(self) -> None:
+        """ Test reuse of the parsed config while the file is unchanged """
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = Path(tmp) / "meeting.yaml"
+            shutil.copy(self.cfg, cfg)
+            cache = ConfigCache(Path(tmp) / "cache")
+
+            first = config.load(cfg, cache)
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+            second = config.load(cfg, cache)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            self.assertIsNot(second, first)
+            self.assertEqual(str(second), str(first))
+
+            # touching the file does not change its content
+            stat = cfg.stat()
+            os.utime(cfg, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            config.load(cfg, cache)
+            self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+            cfg.write_text(
+                cfg.read_text(encoding="UTF-8").replace("Chair's report", "Report"),
+                encoding="UTF-8",
+            )
+            changed = config.load(cfg, cache)
+            self.assertEqual((cache.hits, cache.misses), (2, 2))
+            self.assertEqual(changed.items[4].title, "Report")
+
+            # a damaged entry is rebuilt
+            for entry in (Path(tmp) / "cache").glob("*.config"):
+                entry.write_bytes(b"damaged")
+            config.load(cfg, cache)
+            self.assertEqual((cache.hits, cache.misses), (2, 3))
+            self.assertEqual(config.load(cfg, cache).items[4].title, "Report")
+
+    def test_stream(self) -> None:
+        """ Test reading items one at a time as the config is parsed """
+        stream = config.stream(self.cfg)
+        items = iter(stream)
+
+        first = next(items)
+        self.assertEqual(first.title, "Procedural matters")
+        self.assertEqual(stream.metadata["location"], "Null Island")  # type: ignore
+
+        titles = [first.title] + [item.title for item in items]
+        self.assertEqual(titles, [item.title for item in config.load(self.cfg).items])
+
+    def test_pure_python_parser(self) -> None:
+        """ Test loading and streaming without the C extension of ruamel.yaml """
+        expected = [item.title for item in config.load(self.cfg).items]
+
+        with mock.patch("ruamel.yaml.main.CParser", None):
+            meeting = config.load(self.cfg)
+            streamed = [item.title for item in config.stream(self.cfg)]
+
+        self.assertEqual([item.title for item in meeting.items], expected)
+        self.assertEqual(meeting.metadata["location"], "Null Island")
+        self.assertEqual(streamed, expected)
+
+    def test_subitems(self) -> None:
+        """ Test loading items that have sub-items of their own """
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = Path(tmp) / "meeting.yaml"
+            cfg.write_text(
+                "\n".join(
+                    [
+                        "- metadata:",
+                        "    committee: Test",
+                        "- heading: Reports",
+                        "- item: Finance",
+                        "  items:",
+                        "    - item: Budget",
+                        "      cover: budget-cover.pdf",
+                        "      pages: [budget.pdf]",
+                        "    - item: Audit",
+                        "      who: Treasurer",
+                        "- item: Other business",
+                        "",
+                    ]
+                ),
+                encoding="UTF-8",
+            )
+            meeting = config.load(cfg)
+
+        numbers = [str(item.num) for item in meeting.items]
+        self.assertEqual(numbers, ["1", "1.1", "1.1.1", "1.1.2", "1.2"])
+        budget = meeting.find("1.1.1")
+        self.assertTrue(isinstance(budget, AgendaSubItem))
+        self.assertEqual(budget.title, "Budget")
+        self.assertEqual(meeting.find("1.1.2").who, "Treasurer")
+        self.assertEqual(
+            list(meeting.enclosures()),
+            [("1.1.1", "1.1.1 Budget", "budget-cover.pdf", ["budget.pdf"])],
+        )
+
+        # adding an item renumbers the sub-items that follow it
+        meeting.insert(1, AgendaItem("Apologies"))
+        self.assertEqual(str(budget.num), "1.2.1")
+        self.assertIs(meeting.find("1.2.1"), budget)
+
+    def test_errors(self) -> None:
+        """ Test that every problem is reported with its line number """
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = Path(tmp) / "meeting.yaml"
+            cfg.write_text(
+                "\n".join(
+                    [
+                        "- metadata:",
+                        "    committee: Test",
+                        "- heading: Fine",
+                        "- item: Fine",
+                        "  pages: [a.pdf, b.pdf]",
+                        "- item:",
+                        "  who: Chair",
+                        "- item: Typo",
+                        "  staredd: true",
+                        "- heading: [not, text]",
+                        "- Just a string",
+                        "- item: Too many things",
+                        "  heading: At once",
+                        "- item: Not filenames",
+                        "  pages: [1, 2]",
+                        "- item: Too deep",
+                        "  items:",
+                        "    - item: Sub-item",
+                        "      items: []",
+                        "    - Just a string",
+                        "",
+                    ]
+                ),
+                encoding="UTF-8",
+            )
+
+            expected = [
+                (6, "item must not be empty"),
+                (9, "unknown key 'staredd' for item"),
+                (10, "heading should be text"),
+                (11, "expected a heading, item or metadata"),
+                (12, "expected only one of heading, item"),
+                (15, "pages should be a list of filenames"),
+                (19, "unknown key 'items' for item"),
+                (20, "expected a sub-item"),
+            ]
+
+            with self.assertRaises(config.ConfigError) as cm:
+                config.load(cfg)
+            self.assertEqual(cm.exception.errors, expected)
+            self.assertIn("meeting.yaml:9: unknown key", str(cm.exception))
+
+            # the streaming loader still gives the good entries first
+            stream = config.stream(cfg)
+            titles = []
+            with self.assertRaises(config.ConfigError) as cm:
+                for item in stream:
+                    titles.append(item.title)
+            self.assertEqual(titles, ["Fine", "Fine", "Too deep"])
+            self.assertEqual(cm.exception.errors, expected)
+
+            cfg.write_text("- heading: No metadata\n", encoding="UTF-8")
+            self.assertRaises(ValueError, config.load, cfg)
@@ -1,14 +1,22 @@
 # test loading of config
 
 from pathlib import Path
+import pickle
 import re
 from typing import (
+    List,
     Union,
 )
 import unittest
 
 from agendabuilder import config
-from agendabuilder.meeting import AgendaItem, AgendaHeading, ItemNumber
+from agendabuilder.meeting import (
+    Agenda,
+    AgendaItem,
+    AgendaHeading,
+    AgendaSubItem,
+    ItemNumber,
+)
 
 
 def find_test_file(filename: Union[str, Path]) -> Path:
@@ -50,6 +58,118 @@ class AgendaTests(unittest.TestCase):
 
         self.assertEqual(len(meeting.items), current_len + 3)
 
+    def test_numbering(self) -> None:
+        """ Test that mutations keep the numbers and index up to date """
+        meeting = config.load(self.cfg)
+
+        def numbers() -> List[str]:
+            return [str(item.num) for item in meeting.items]
+
+        heading = AgendaHeading("Late business")
+        item = AgendaItem("Late item")
+        meeting.append(heading)
+        meeting.append(item)
+        self.assertEqual(str(item.num), "%d.1" % heading.num.a)
+        self.assertIs(meeting.find(str(item.num)), item)
+
+        meeting.insert(1, AgendaHeading("Early business"))
+        meeting.insert(3, AgendaItem("Early item"))
+        meeting.move(len(meeting.items) - 1, 4)
+        meeting.remove(heading)
+        meeting.pop(0)
+
+        expected = numbers()
+        index = dict(meeting._index)
+        meeting.number_items()
+        self.assertEqual(numbers(), expected)
+        self.assertEqual(meeting._index, index)
+        self.assertIs(meeting.find("1"), meeting.items[0])
+        with self.assertRaises(KeyError):
+            meeting.find(str(heading.num))
+
+    def test_move_across_headings(self) -> None:
+        """ Test moving items forward and back across several headings """
+        a, b, c, d = (AgendaItem(title) for title in "abcd")
+        meeting = Agenda(
+            [AgendaHeading("H1"), a, b, AgendaHeading("H2"), c, AgendaHeading("H3"), d]
+        )
+
+        meeting.move(1, 6)
+        self.assertEqual(str(a.num), "3.2")
+        self.assertEqual(str(b.num), "1.1")
+        self.assertIs(meeting.find("1.1"), b)
+        self.assertIs(meeting.find("3.2"), a)
+
+        meeting.move(6, 1)
+        self.assertEqual(str(a.num), "1.1")
+        self.assertEqual(str(b.num), "1.2")
+        self.assertIs(meeting.find("1.1"), a)
+
+        index = dict(meeting._index)
+        meeting.number_items()
+        self.assertEqual(meeting._index, index)
+
+    def test_sub_item_after_heading(self) -> None:
+        """ Test a sub-item with no item before it is numbered as an item """
+        heading = AgendaHeading("H1")
+        sub, item = AgendaSubItem("s"), AgendaItem("i")
+        meeting = Agenda([heading, sub, AgendaSubItem("t")])
+        self.assertEqual([str(x.num) for x in meeting.items], ["1", "1.1", "1.1.1"])
+        self.assertIs(meeting.find("1"), heading)
+        self.assertIs(meeting.find("1.1"), sub)
+
+        meeting.insert(1, item)
+        self.assertEqual(str(sub.num), "1.1.1")
+        self.assertIs(meeting.find("1"), heading)
+        self.assertIs(meeting.find("1.1"), item)
+        self.assertIs(meeting.find("1.1.1"), sub)
+
+        meeting.move(1, 3)
+        self.assertEqual(str(sub.num), "1.1")
+        self.assertIs(meeting.find("1"), heading)
+        index = dict(meeting._index)
+        meeting.number_items()
+        self.assertEqual(meeting._index, index)
+
+    def test_out_of_range(self) -> None:
+        """ Test that indexes are checked like those of a list """
+        a, b = AgendaItem("a"), AgendaItem("b")
+        meeting = Agenda([AgendaHeading("H1"), a])
+
+        meeting.insert(-1, b)
+        self.assertEqual(meeting.items[1:], [b, a])
+        meeting.insert(3, AgendaItem("c"))
+        self.assertEqual(str(meeting.items[3].num), "1.3")
+
+        for call in (
+            lambda: meeting.insert(5, AgendaItem("d")),
+            lambda: meeting.insert(-5, AgendaItem("d")),
+            lambda: meeting.pop(4),
+            lambda: meeting.pop(-5),
+            lambda: meeting.move(4, 0),
+            lambda: meeting.move(0, -5),
+        ):
+            with self.assertRaises(IndexError):
+                call()
+        self.assertEqual(len(meeting.items), 4)
+        self.assertEqual(str(a.num), "1.2")
+
+        self.assertEqual(meeting.pop(-1).title, "c")
+        with self.assertRaises(IndexError):
+            Agenda().pop()
+
+    def test_compact(self) -> None:
+        """ Test that items have no per-instance __dict__ and still pickle """
+        meeting = config.load(self.cfg)
+
+        for item in meeting.items:
+            self.assertFalse(hasattr(item, "__dict__"))
+            self.assertFalse(hasattr(item.num, "__dict__"))
+
+        copied = pickle.loads(pickle.dumps(meeting))
+        self.assertEqual(str(copied), str(meeting))
+        self.assertTrue(copied.items[7].starred)  # type: ignore
+
     def test_enclosures(self) -> None:
         """ Test building the agenda by hand """
         meeting = config.load(self.cfg)
@@ -0,0 +1,155 @@
+# test text overlays used for stamping
+
+import io
+from typing import (
+    Set,
+)
+import unittest
+
+from PyPDF2 import PdfFileReader  # type: ignore
+from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.pdfgen.canvas import Canvas  # type: ignore
+
+from agendabuilder.overlay import TextOverlay, hex_color, pdf_number, pdf_string
+from agendabuilder.pack import (
+    AgendaCoverPdfPart,
+    AgendaPageNumPdfPart,
+    PackSegment,
+    document_pages,
+    stamp_segment,
+)
+from agendabuilder.packwriter import PackWriter, PendingObjects
+
+
+def make_pdf(pages: int) -> io.BytesIO:
+    buffer = io.BytesIO()
+    canvas = Canvas(buffer, pagesize=A4)
+    for page in range(pages):
+        canvas.setFont("Times-Roman", 12)
+        canvas.drawString(140, 140, "Page %d" % page)
+        canvas.showPage()
+    canvas.save()
+    buffer.seek(0)
+    return buffer
+
+
+def resource_objects(reader: PdfFileReader) -> Set[int]:
+    """ the fonts and graphics states that the pages of a PDF file use """
+    found: Set[int] = set()
+    for num in range(reader.getNumPages()):
+        resources = reader.getPage(num)["/Resources"]
+        for category in ("/Font", "/ExtGState"):
+            entries = resources.get(category, {})
+            found.update(entries.raw_get(name).idnum for name in entries)
+    return found
+
+
+class OverlayTests(unittest.TestCase):
+    def test_helpers(self) -> None:
+        """ Test conversion of values into PDF syntax """
+        self.assertEqual(hex_color("#ff0000"), (1.0, 0.0, 0.0))
+        self.assertRaises(ValueError, hex_color, "red")
+        self.assertEqual(pdf_number(9), b"9")
+        self.assertEqual(pdf_number(289.498), b"289.498")
+        self.assertEqual(pdf_number(-0.00001), b"0")
+        self.assertEqual(pdf_string("a (b) \\"), b"(a \\(b\\) \\\\)")
+
+    def test_alignment(self) -> None:
+        """ Test placement of text relative to the location """
+        objects = PendingObjects()
+        left = TextOverlay(objects, align="left")
+        right = TextOverlay(objects, align="right")
+        centre = TextOverlay(objects, align="centre")
+
+        self.assertIn(b" 100 50 Td (12) Tj", left.content("12", 100, 50, "/F"))
+        # each digit of Helvetica is 0.556 em wide
+        self.assertIn(b" 89.992 50 Td", right.content("12", 100, 50, "/F"))
+        self.assertIn(b" 94.996 50 Td", centre.content("12", 100, 50, "/F"))
+
+        self.assertRaises(ValueError, TextOverlay, objects, align="middle")
+        self.assertRaises(ValueError, TextOverlay, objects, font_name="Symbola")
+
+    def test_shared_font(self) -> None:
+        """ Test that all pages of a stamped part share one font object """
+        numberer = AgendaPageNumPdfPart(make_pdf(5), 7)
+        stamped = PdfFileReader(numberer())
+
+        self.assertEqual(stamped.getNumPages(), 5)
+        fonts = set()
+        for num in range(5):
+            page = stamped.getPage(num)
+            self.assertIn(str(num + 7), page.extractText())
+            ref = page["/Resources"]["/Font"].raw_get("/ABHelvetica")
+            fonts.add(ref.idnum)
+        self.assertEqual(len(fonts), 1)
+
+    def test_cover(self) -> None:
+        """ Test that only the first page of a cover is stamped """
+        coverer = AgendaCoverPdfPart(make_pdf(2), "4.2")
+        stamped = PdfFileReader(coverer())
+
+        self.assertIn("4.2", stamped.getPage(0).extractText())
+        self.assertNotIn("4.2", stamped.getPage(1).extractText())
+        self.assertNotIn("/ABHelvetica", stamped.getPage(1)["/Resources"]["/Font"])
+
+    def test_opacity(self) -> None:
+        """ Test that translucent stamps share one graphics state """
+        buffer = io.BytesIO()
+        writer = PackWriter(buffer)
+        coverer = AgendaCoverPdfPart(make_pdf(1), "4.2")
+        coverer.opacity = 0.5
+        numberer = AgendaPageNumPdfPart(make_pdf(3), 1)
+        numberer.opacity = 0.5
+        writer.add_pages(coverer.stamped_pages())
+        writer.add_pages(numberer.stamped_pages())
+        writer.add_pages(AgendaPageNumPdfPart(make_pdf(1), 5).stamped_pages())
+        writer.close()
+
+        # /ca and /CA in graphics states need PDF 1.4
+        self.assertTrue(buffer.getvalue().startswith(b"%PDF-1.4\n"))
+        pack = PdfFileReader(io.BytesIO(buffer.getvalue()))
+        states = set()
+        for num in range(4):
+            page = pack.getPage(num)
+            state = page["/Resources"]["/ExtGState"].raw_get("/ABGS")
+            states.add(state.idnum)
+            self.assertEqual(page["/Resources"]["/ExtGState"]["/ABGS"]["/ca"], 0.5)
+            self.assertIn(b"q /ABGS gs BT", page["/Contents"][-1].getObject().getData())
+        self.assertEqual(len(states), 1)
+
+        # opaque stamps need no graphics state
+        self.assertNotIn("/ExtGState", pack.getPage(4)["/Resources"])
+        self.assertRaises(ValueError, TextOverlay, PendingObjects(), opacity=1.5)
+
+    def test_constant_resources(self) -> None:
+        """ Test that the resource objects of a pack do not grow with it """
+
+        def build(documents: int) -> bytes:
+            buffer = io.BytesIO()
+            writer = PackWriter(buffer)
+            for num in range(documents):
+                # each input brings fonts of its own, as separate documents do
+                data = make_pdf(3).getvalue()
+                if num % 2:
+                    segment = PackSegment("part.pdf", "part.pdf", itemnum="1.1")
+                    stamped = stamp_segment(segment, data=data)
+                    writer.add_pages(document_pages(stamped))
+                    continue
+
+                reader = PdfFileReader(io.BytesIO(data))
+                coverer = AgendaCoverPdfPart(reader, str(num))
+                coverer.opacity = 0.5
+                numberer = AgendaPageNumPdfPart(reader, 3 * num + 1)
+                objects = PendingObjects()
+                pages = coverer.stamp_pages(numberer.pages(), objects)
+                writer.add_pages(numberer.stamp_pages(pages, objects))
+            writer.close()
+            return buffer.getvalue()
+
+        small = PdfFileReader(io.BytesIO(build(2)))
+        large = PdfFileReader(io.BytesIO(build(20)))
+        self.assertEqual(large.getNumPages(), 60)
+        self.assertEqual(len(resource_objects(small)), len(resource_objects(large)))
+        # the inputs' Helvetica and Times-Roman, and the stamps' Helvetica
+        # and graphics state
+        self.assertEqual(len(resource_objects(large)), 4)
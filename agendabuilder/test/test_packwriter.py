@@ -0,0 +1,68 @@
+# test the incremental writer of the meeting pack
+
+import io
+import random
+from typing import (
+    Optional,
+)
+import unittest
+
+from PIL import Image  # type: ignore
+from PyPDF2 import PdfFileReader  # type: ignore
+from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.lib.utils import ImageReader  # type: ignore
+from reportlab.pdfgen.canvas import Canvas  # type: ignore
+
+from agendabuilder.packwriter import PackWriter
+
+
+def make_letter(text: str, seed: int = 42) -> PdfFileReader:
+    """ a one page letter with a letterhead image and some text """
+    buffer = io.BytesIO()
+    canvas = Canvas(buffer, pagesize=A4)
+    noise = random.Random(seed).randbytes(128 * 128)
+    canvas.drawImage(ImageReader(Image.frombytes("L", (128, 128), noise)), 0, 0)
+    canvas.setFont("Times-Roman", 12)
+    canvas.drawString(140, 140, text)
+    canvas.save()
+    buffer.seek(0)
+    return PdfFileReader(buffer)
+
+
+def image_ref(reader: PdfFileReader, num: int) -> int:
+    xobjects = reader.getPage(num)["/Resources"]["/XObject"]
+    name = list(xobjects)[0]
+    return xobjects.raw_get(name).idnum  # type: ignore
+
+
+class PackWriterTests(unittest.TestCase):
+    def _write(self, share_streams: bool, seed: Optional[int] = None) -> PackWriter:
+        self.buffer = io.BytesIO()
+        writer = PackWriter(self.buffer, share_streams=share_streams)
+        writer.add_document(make_letter("First letter"))
+        writer.add_document(make_letter("Second letter", seed or 42))
+        writer.close()
+        return writer
+
+    def test_shared_streams(self) -> None:
+        """ Test that identical images in different documents are shared """
+        writer = self._write(share_streams=True)
+        self.assertEqual(writer.streams_shared, 1)
+        self.assertGreater(writer.bytes_shared, 128 * 128)
+
+        pack = PdfFileReader(io.BytesIO(self.buffer.getvalue()))
+        self.assertEqual(pack.getNumPages(), 2)
+        self.assertEqual(image_ref(pack, 0), image_ref(pack, 1))
+        self.assertIn("Second letter", pack.getPage(1).extractText())
+
+        shared = len(self.buffer.getvalue())
+        self._write(share_streams=False)
+        self.assertGreater(len(self.buffer.getvalue()), shared + 128 * 128)
+
+    def test_different_streams(self) -> None:
+        """ Test that different images are not shared """
+        writer = self._write(share_streams=True, seed=7)
+        self.assertEqual(writer.streams_shared, 0)
+
+        pack = PdfFileReader(io.BytesIO(self.buffer.getvalue()))
+        self.assertNotEqual(image_ref(pack, 0), image_ref(pack, 1))
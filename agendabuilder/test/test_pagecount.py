@@ -0,0 +1,160 @@
+# test counting pages from the page tree alone
+
+import io
+from pathlib import Path
+import tempfile
+from typing import (
+    List,
+)
+import unittest
+import zlib
+
+from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.pdfgen.canvas import Canvas  # type: ignore
+
+from agendabuilder.pagecount import PageCounter, UnsupportedPdf, count_pages
+
+
+def make_pdf(pages: int) -> bytes:
+    buffer = io.BytesIO()
+    canvas = Canvas(buffer, pagesize=A4)
+    for page in range(pages):
+        canvas.setFont("Times-Roman", 12)
+        canvas.drawString(140, 140, "Page %d" % page)
+        canvas.showPage()
+    canvas.save()
+    return buffer.getvalue()
+
+
+def make_compressed_pdf(pages: int) -> bytes:
+    """ a PDF 1.5 file with its catalog and page tree in an object stream """
+    kids = " ".join("%d 0 R" % (4 + i) for i in range(pages))
+    stored = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids.encode(), pages)),
+    ]
+    header = b" ".join(b"%d %d" % (num, 100 * i) for i, (num, _) in enumerate(stored))
+    body = b"".join(obj.ljust(100) for _, obj in stored)
+    objstm = zlib.compress(header.ljust(50) + body)
+
+    out = bytearray(b"%PDF-1.5\n")
+    offsets = {}
+    offsets[3] = len(out)
+    out += b"3 0 obj\n<< /Type /ObjStm /N 2 /First 50 /Filter /FlateDecode"
+    out += b" /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (len(objstm), objstm)
+    for i in range(pages):
+        offsets[4 + i] = len(out)
+        out += b"%d 0 obj\n<< /Type /Page /Parent 2 0 R >>\nendobj\n" % (4 + i)
+
+    xref = len(out)
+    size = 5 + pages
+    rows: List[bytes] = [b"\x00\x00\x00\xff"]
+    rows += [b"\x02\x00\x03" + bytes([i]) for i in range(2)]
+    rows += [b"\x01" + offsets[num].to_bytes(2, "big") + b"\x00" for num in offsets]
+    rows += [b"\x01" + xref.to_bytes(2, "big") + b"\x00"]
+    # PNG "up" predictor, as written by most PDF libraries
+    previous = bytes(4)
+    predicted = b""
+    for row in rows:
+        predicted += b"\x02" + bytes((a - b) & 0xFF for a, b in zip(row, previous))
+        previous = row
+    data = zlib.compress(predicted)
+    out += b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 2 1] /Root 1 0 R" % (
+        size - 1,
+        size,
+    )
+    out += b" /Filter /FlateDecode /DecodeParms << /Predictor 12 /Columns 4 >>"
+    out += b" /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (len(data), data)
+    out += b"startxref\n%d\n%%%%EOF\n" % xref
+    return bytes(out)
+
+
+class PageCountTests(unittest.TestCase):
+    # pylint: disable=protected-access
+
+    def _count(self, data: bytes) -> int:
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = Path(tmp) / "test.pdf"
+            filename.write_bytes(data)
+            return count_pages(filename)
+
+    def test_xref_table(self) -> None:
+        """ Test counting a file with a classic xref table """
+        data = make_pdf(7)
+        self.assertEqual(PageCounter(data).page_count(), 7)
+        self.assertEqual(self._count(data), 7)
+
+    def test_updated(self) -> None:
+        """ Test that the newest of several xref sections is used """
+        data = make_pdf(3)
+        counter = PageCounter(data)
+        size = counter.trailer["/Size"]
+        pages = counter.resolve(counter.resolve(counter.trailer["/Root"])["/Pages"])
+        previous = int(data.rsplit(b"startxref", 1)[1].split()[0])
+
+        # an incremental update that replaces the catalog and page tree, and
+        # adds a page
+        kids = b" ".join(b"%d 0 R" % kid.num for kid in pages["/Kids"])
+        update = bytearray(data)
+        offsets = [len(update)]
+        update += b"%d 0 obj\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n" % (
+            size,
+            size + 1,
+        )
+        offsets.append(len(update))
+        update += b"%d 0 obj\n<< /Type /Pages /Kids [%s %d 0 R] /Count 4 >>" % (
+            size + 1,
+            kids,
+            size + 2,
+        )
+        update += b"\nendobj\n"
+        offsets.append(len(update))
+        update += b"%d 0 obj\n<< /Type /Page /Parent %d 0 R >>\nendobj\n" % (
+            size + 2,
+            size + 1,
+        )
+        xref = len(update)
+        update += b"xref\n%d 3\n" % size
+        update += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        update += b"trailer\n<< /Size %d /Root %d 0 R /Prev %d >>\n" % (
+            size + 3,
+            size,
+            previous,
+        )
+        update += b"startxref\n%d\n%%%%EOF\n" % xref
+
+        counter = PageCounter(bytes(update))
+        self.assertEqual(counter.page_count(), 4)
+        self.assertEqual(len(counter._sections), 2)
+
+    def test_xref_stream(self) -> None:
+        """ Test counting a file with an xref stream and object streams """
+        data = make_compressed_pdf(12)
+        self.assertEqual(PageCounter(data).page_count(), 12)
+        self.assertEqual(self._count(data), 12)
+
+    def test_fallback(self) -> None:
+        """ Test that files that cannot be followed are parsed instead """
+        data = make_pdf(2)
+        # startxref points past the end of the file
+        damaged = data.replace(b"startxref\n", b"startxref\n1")
+
+        self.assertRaises(UnsupportedPdf, PageCounter, damaged)
+        self.assertEqual(self._count(damaged), 2)
+
+    def test_wrong_count(self) -> None:
+        """ Test that a count that does not match the pages is not trusted """
+        data = make_pdf(3)
+        damaged = data.replace(b"/Count 3", b"/Count 5")
+        self.assertNotEqual(damaged, data)
+
+        self.assertRaises(UnsupportedPdf, PageCounter(damaged).page_count)
+        self.assertEqual(self._count(damaged), 3)
+
+        # nor is a page tree that refers to the same page twice
+        counter = PageCounter(data)
+        pages = counter.resolve(counter.resolve(counter.trailer["/Root"])["/Pages"])
+        first, second = [b"%d 0 R" % kid.num for kid in pages["/Kids"][:2]]
+        looped = data.replace(b"%s %s" % (first, second), b"%s %s" % (first, first))
+        self.assertNotEqual(looped, data)
+        self.assertRaises(UnsupportedPdf, PageCounter(looped).page_count)
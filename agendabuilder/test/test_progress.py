@@ -0,0 +1,79 @@
+# test progress reporting
+
+import io
+import logging
+from pathlib import Path
+from typing import (
+    List,
+)
+import unittest
+
+from agendabuilder import commands
+from agendabuilder.agendalisting import AgendaListing
+from agendabuilder.locator import FileLocator
+from agendabuilder.progress import ProgressBar, ProgressEvent, configure_logging
+
+
+def find_test_file(filename: str) -> Path:
+    """ find a test file that is located within the test suite """
+    return Path(__file__).parent / Path(filename)
+
+
+class ProgressBarTests(unittest.TestCase):
+    def test_throttle(self) -> None:
+        """ Test that the bar is redrawn at most once per interval """
+        now = [0.0]
+        stream = io.StringIO()
+        bar = ProgressBar(stream, width=10, interval=1.0, clock=lambda: now[0])
+
+        for done in range(1, 10):
+            now[0] += 0.25
+            bar(ProgressEvent("pack", done, 10))
+        self.assertEqual(stream.getvalue().count("\r"), 3)
+
+        # the last event is always drawn and ends the line
+        bar(ProgressEvent("pack", 10, 10, "last.pdf"))
+        self.assertIn("[##########] 10/10 last.pdf", stream.getvalue())
+        self.assertTrue(stream.getvalue().endswith("\n"))
+
+
+class ProgressTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cfg = find_test_file("meeting.yaml")
+        self.locator = FileLocator(self.cfg)
+
+    def tearDown(self) -> None:
+        configure_logging(logging.INFO)
+        draft = self.locator("agenda-draft.docx")
+        if draft.exists():
+            draft.unlink()
+
+    def test_callback(self) -> None:
+        """ Test that the callback is given each row of the agenda """
+        meeting = commands.configure(self.cfg)
+        events: List[ProgressEvent] = []
+
+        listing = AgendaListing(
+            meeting,
+            meeting.metadata["agenda_template"],
+            self.locator,
+            progress=events.append,
+        )
+        listing.build()
+
+        self.assertEqual(len(events), 10)
+        self.assertEqual(events[0], ProgressEvent("agenda", 1, 10, "1"))
+        self.assertEqual(events[-1], ProgressEvent("agenda", 10, 10, "4.1"))
+
+    def test_levels(self) -> None:
+        """ Test the amount of output at each logging level """
+        for level, lines in (
+            (logging.WARNING, 0),
+            (logging.INFO, 13),
+            (logging.DEBUG, 23),
+        ):
+            stream = io.StringIO()
+            configure_logging(level, stream)
+            meeting = commands.configure(self.cfg)
+            commands.build_listing(meeting, self.locator)
+            self.assertEqual(len(stream.getvalue().splitlines()), lines)
@@ -0,0 +1,144 @@
+# test the build service
+
+import http.client
+import json
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+from typing import (
+    Any,
+    Dict,
+    Tuple,
+    Union,
+)
+import unittest
+
+from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.pdfgen.canvas import Canvas  # type: ignore
+
+from agendabuilder.server import BuildService, make_server
+
+
+def find_test_file(filename: Union[str, Path]) -> Path:
+    """ find a test file that is located within the test suite """
+    return Path(__file__).parent / Path(filename)
+
+
+class ServerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.base = Path(self.tempdir.name)
+        meeting = self.base / "finance"
+        meeting.mkdir()
+        shutil.copy(find_test_file("meeting.yaml"), meeting)
+        shutil.copy(find_test_file("agenda-template.docx"), meeting)
+
+        for pdf in [
+            "agenda-final.pdf",
+            "consultation-cover.pdf",
+            "consultation report.pdf",
+            "consultation report appendices.pdf",
+            "consultation-future-cover.pdf",
+        ]:
+            canvas = Canvas(str(meeting / pdf), pagesize=A4)
+            canvas.setFont("Times-Roman", 12)
+            canvas.drawString(140, 140, "This is %s" % pdf)
+            canvas.save()
+
+        self.service = BuildService(self.base, jobs=1, queue_size=2)
+        self.server = make_server(self.service, port=0)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.service.close()
+        self.tempdir.cleanup()
+
+    def _request(
+        self, method: str, path: str, body: Any = None
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        host, port = self.server.server_address[:2]  # type: ignore
+        connection = http.client.HTTPConnection(host, int(port), timeout=60)
+        try:
+            data = None if body is None else json.dumps(body)
+            connection.request(method, path, body=data)
+            response = connection.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            connection.close()
+
+    def test_build(self) -> None:
+        """ Test building the agenda and pack through the service """
+        status, headers, body = self._request(
+            "POST", "/pack", {"config": "finance/meeting.yaml"}
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Type"], "application/pdf")
+        self.assertEqual(
+            body, (self.base / "finance" / "meeting-pack.pdf").read_bytes()
+        )
+        self.assertTrue(body.startswith(b"%PDF"))
+
+        status, headers, body = self._request(
+            "POST", "/agenda", {"config": "finance/meeting.yaml"}
+        )
+        self.assertEqual(status, 200)
+        self.assertIn("wordprocessingml", headers["Content-Type"])
+        self.assertTrue(body.startswith(b"PK"))
+
+        status, _, body = self._request("GET", "/status")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["completed"], 2)
+
+    def test_errors(self) -> None:
+        """ Test that bad requests are refused without building anything """
+        status, _, _ = self._request("POST", "/pack", {"config": "../meeting.yaml"})
+        self.assertEqual(status, 403)
+        status, _, _ = self._request("POST", "/pack", {"config": "missing.yaml"})
+        self.assertEqual(status, 404)
+        status, _, _ = self._request(
+            "POST", "/minutes", {"config": "finance/meeting.yaml"}
+        )
+        self.assertEqual(status, 404)
+        status, _, _ = self._request("POST", "/pack", ["finance/meeting.yaml"])
+        self.assertEqual(status, 400)
+        status, _, _ = self._request("POST", "/pack", {"config": 42})
+        self.assertEqual(status, 400)
+        status, _, _ = self._request("POST", "/pack", {"config": "meeting\0.yaml"})
+        self.assertEqual(status, 400)
+
+        (self.base / "finance" / "meeting.yaml").write_text("metadata:\n  title: 3\n")
+        status, _, body = self._request(
+            "POST", "/agenda", {"config": "finance/meeting.yaml"}
+        )
+        self.assertEqual(status, 400)
+        self.assertIn("error", json.loads(body))
+
+    def test_output_locks(self) -> None:
+        """ Test that the lock of an output is forgotten once released """
+        # pylint: disable=protected-access
+        output, lock = self.service.build("pack", "finance/meeting.yaml")
+        self.assertTrue(output.exists())
+        self.assertEqual(len(self.service._locks), 1)
+        lock.release()
+        del lock
+        self.assertEqual(len(self.service._locks), 0)
+
+    def test_busy(self) -> None:
+        """ Test that requests beyond the queue are refused """
+        # pylint: disable=protected-access
+        for _ in range(3):
+            self.service._slots.acquire()
+        try:
+            status, headers, _ = self._request(
+                "POST", "/pack", {"config": "finance/meeting.yaml"}
+            )
+        finally:
+            for _ in range(3):
+                self.service._slots.release()
+        self.assertEqual(status, 503)
+        self.assertIn("Retry-After", headers)
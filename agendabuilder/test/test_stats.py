@@ -0,0 +1,36 @@
+# test build statistics
+
+import json
+import unittest
+
+from agendabuilder.stats import BuildStats, format_bytes
+
+
+class StatsTests(unittest.TestCase):
+    def test_format_bytes(self) -> None:
+        """ Test human readable sizes """
+        self.assertEqual(format_bytes(None), "n/a")
+        self.assertEqual(format_bytes(512), "512 B")
+        self.assertEqual(format_bytes(1536), "1.5 kB")
+        self.assertEqual(format_bytes(3 * 1024 * 1024), "3.0 MB")
+
+    def test_phases(self) -> None:
+        """ Test that phases of the same name are accumulated """
+        stats = BuildStats()
+        for _ in range(3):
+            with stats.phase("merge") as phase:
+                phase.bytes_written += 10
+        stats.record("stamp: a.pdf", 1.5, 1.0, bytes_read=100)
+
+        self.assertEqual([p.name for p in stats.phases], ["merge", "stamp: a.pdf"])
+        self.assertEqual(stats.get("merge").count, 3)
+        self.assertEqual(stats.get("merge").bytes_written, 30)
+
+        data = json.loads(stats.report_json())
+        self.assertEqual(data["total"]["bytes_read"], 100)
+        self.assertEqual(data["total"]["bytes_written"], 30)
+        self.assertGreaterEqual(data["total"]["wall"], 0)
+
+        text = stats.report_text()
+        self.assertIn("stamp: a.pdf", text)
+        self.assertIn("Peak RSS", text)
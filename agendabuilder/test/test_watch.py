@@ -0,0 +1,142 @@
+# test rebuilding when the inputs of a meeting change
+
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import (
+    Set,
+    Union,
+)
+import unittest
+
+from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.pdfgen.canvas import Canvas  # type: ignore
+
+from agendabuilder.pdfcache import MappedFile
+from agendabuilder.watch import Watcher
+
+
+def find_test_file(filename: Union[str, Path]) -> Path:
+    """ find a test file that is located within the test suite """
+    return Path(__file__).parent / Path(filename)
+
+
+class WatchTests(unittest.TestCase):
+    # pylint: disable=protected-access
+
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.base = Path(self.tempdir.name)
+        self.cfg = self.base / "meeting.yaml"
+        shutil.copy(find_test_file("meeting.yaml"), self.cfg)
+        shutil.copy(find_test_file("agenda-template.docx"), self.base)
+
+        for pdf in [
+            "agenda-final.pdf",
+            "consultation-cover.pdf",
+            "consultation report.pdf",
+            "consultation report appendices.pdf",
+            "consultation-future-cover.pdf",
+        ]:
+            self._build_test_pdf(pdf, "This is %s" % pdf)
+
+        self.now = 0.0
+        self.watcher = Watcher(self.cfg, debounce=0.3, clock=lambda: self.now)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def _build_test_pdf(self, filename: str, text: str) -> None:
+        canvas = Canvas(str(self.base / filename), pagesize=A4)
+        canvas.setFont("Times-Roman", 12)
+        canvas.drawString(140, 140, text)
+        canvas.save()
+
+    def _touch(self, filename: str) -> None:
+        path = self.base / filename
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def _settle(self) -> Set[str]:
+        """ poll as the change is made and again once it has settled """
+        self.assertEqual(self.watcher.poll(), set())
+        self.now += 0.1
+        self.assertEqual(self.watcher.poll(), set())
+        self.now += 0.3
+        return self.watcher.poll()
+
+    def test_rebuilds(self) -> None:
+        """ Test that only the steps affected by a change are rebuilt """
+        self.assertEqual(self.watcher.build(), {"agenda", "pack"})
+        self.assertTrue((self.base / "agenda-draft.docx").exists())
+        self.assertTrue((self.base / "meeting-pack.pdf").exists())
+        self.assertEqual(len(self.watcher.watched_files()), 7)
+        self.assertEqual(self.watcher.poll(), set())
+
+        # only the changed PDF is parsed and stamped again
+        pdfs = self.watcher.session.pdfs
+        misses = pdfs.misses
+        stamps = self.watcher.stamp_cache
+        self.assertEqual((stamps.hits, stamps.misses), (0, 5))
+        self._build_test_pdf("consultation report.pdf", "A late change")
+        self._touch("consultation report.pdf")
+        self.assertEqual(self._settle(), {"pack"})
+        self.assertEqual(pdfs.misses, misses + 1)
+        self.assertEqual((stamps.hits, stamps.misses), (4, 6))
+        self.assertEqual(len(stamps._memory), 5)
+        # and replaces its earlier parse
+        self.assertEqual(len(pdfs), 5)
+
+        # no file is left mapped between builds
+        for reader in pdfs._documents.values():
+            self.assertNotIsInstance(reader.stream, MappedFile)
+
+        self._touch("agenda-template.docx")
+        self.assertEqual(self._settle(), {"agenda"})
+
+        # a new enclosure is watched even before it exists
+        with open(self.cfg, "at", encoding="UTF-8") as fh:
+            fh.write("\n- item: Late item\n  cover: late-cover.pdf\n")
+        self.assertEqual(self._settle(), {"agenda", "pack"})
+        self.assertIn(self.base / "late-cover.pdf", self.watcher.watched_files())
+
+        self._build_test_pdf("late-cover.pdf", "Late item")
+        self.assertEqual(self._settle(), {"pack"})
+
+    def test_broken_config(self) -> None:
+        """ Test that watching continues from a config that does not load """
+        self.cfg.write_text("- heading: [not, text]\n", encoding="UTF-8")
+        self.assertEqual(self.watcher.build(), {"agenda", "pack"})
+        self.assertIsNone(self.watcher.meeting)
+        self.assertEqual(self.watcher.poll(), set())
+
+        # a meeting without a template can only have its pack built
+        self.cfg.write_text(
+            "\n".join(
+                [
+                    "- metadata:",
+                    "    agenda_final: agenda-final.pdf",
+                    "    meeting_pack: meeting-pack.pdf",
+                    "- item: Only item",
+                    "  cover: consultation-cover.pdf",
+                    "",
+                ]
+            ),
+            encoding="UTF-8",
+        )
+        self._touch("meeting.yaml")
+        self.assertEqual(self._settle(), {"agenda", "pack"})
+        self.assertIsNotNone(self.watcher.meeting)
+        self.assertFalse((self.base / "agenda-draft.docx").exists())
+        # the files are watched although the build failed
+        watched = {
+            self.cfg,
+            self.base / "agenda-final.pdf",
+            self.base / "consultation-cover.pdf",
+        }
+        self.assertEqual(set(self.watcher._states), watched)
+
+        self._touch("consultation-cover.pdf")
+        self.assertEqual(self._settle(), {"pack"})
+        self.assertTrue((self.base / "meeting-pack.pdf").exists())
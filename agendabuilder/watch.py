@@ -0,0 +1,210 @@
+"""
+Rebuilding the agenda and meeting pack whenever their inputs change
+"""
+
+import logging
+from pathlib import Path
+import time
+from typing import (
+    Callable,
+    Dict,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .batch import BuildSession
+from .buildcache import StampCache, stamp_cache_dir
+from .build import build_listing, build_pack, configure
+from .locator import FileLocator
+from .meeting import Agenda
+
+
+logger = logging.getLogger(__name__)
+
+# mtime and size of a file; None if it does not exist
+FileState = Optional[Tuple[int, int]]
+
+
+def file_state(path: Path) -> FileState:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class Watcher:
+    """
+    Rebuilds the steps of one meeting that are affected by changed files
+
+    The configuration, the agenda template, the final agenda and every
+    enclosure are polled for changes. Once a burst of changes has settled
+    for the debounce time:
+
+    - a changed configuration is reloaded and everything is rebuilt;
+    - a changed template rebuilds the agenda listing;
+    - a changed PDF rebuilds the meeting pack.
+
+    Parsed templates and PDF files are kept in the watcher's session
+    between builds, so a rebuild only parses the files that have changed,
+    and the stamped parts of the pack are kept too, in memory unless the
+    cache is used, so that only the parts that have changed are stamped.
+    The PDF files are read into memory rather than memory-mapped, as a
+    mapping held between builds would stop the files from being saved
+    over, or fault when one was truncated in place.
+    """
+
+    def __init__(
+        self,
+        config_filename: Union[str, Path],
+        steps: Sequence[str] = ("agenda", "pack"),
+        debounce: float = 0.3,
+        stream: bool = False,
+        use_cache: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.config = Path(config_filename)
+        self.locator = FileLocator(config_filename)
+        self.steps = tuple(steps)
+        self.debounce = debounce
+        self.stream = stream
+        self.use_cache = use_cache
+        self.clock = clock
+        self.session = BuildSession(mapped_pdfs=False)
+        self.stamp_cache = StampCache(
+            stamp_cache_dir(self.locator) if use_cache else None
+        )
+        self.meeting: Optional[Agenda] = None
+
+        # the configuration is watched even before it has loaded
+        self._states: Dict[Path, FileState] = {self.config: file_state(self.config)}
+        self._changed: Set[Path] = set()
+        self._last_change = 0.0
+
+    def watched_files(self) -> Set[Path]:
+        """the configuration and every file that it refers to"""
+        files = {self.config}
+        if self.meeting is None:
+            return files
+
+        metadata = self.meeting.metadata
+        template = metadata.get("agenda_template")
+        agenda_final = metadata.get("agenda_final")
+        if "agenda" in self.steps and template is not None:
+            files.add(self.locator(template))
+        if "pack" in self.steps:
+            if agenda_final is not None:
+                files.add(self.locator(agenda_final))
+            for _, _, cover, pages in self.meeting.enclosures():
+                files.update(self.locator(filename) for filename in [cover] + pages)
+        return files
+
+    def _snapshot(self) -> None:
+        """
+        start watching the files that are now referred to
+
+        Files that were already watched keep their last known state, so
+        that changes made during a build are picked up by the next poll.
+        """
+        self._states = {
+            path: self._states[path] if path in self._states else file_state(path)
+            for path in self.watched_files()
+        }
+
+    def changes(self) -> Set[Path]:
+        """the watched files that have changed since the last check"""
+        changed = set()
+        for path, state in self._states.items():
+            current = file_state(path)
+            if current != state:
+                self._states[path] = current
+                changed.add(path)
+        return changed
+
+    def affected_steps(self, changed: Set[Path]) -> Set[str]:
+        """the steps that must be rebuilt after changes to the files"""
+        if self.config in changed or self.meeting is None:
+            return set(self.steps)
+
+        steps = set()
+        template = self.meeting.metadata.get("agenda_template")
+        templates = {self.locator(template)} if template is not None else set()
+        if changed & templates:
+            steps.add("agenda")
+        if changed - templates:
+            steps.add("pack")
+        return steps & set(self.steps)
+
+    def build(self, changed: Optional[Set[Path]] = None) -> Set[str]:
+        """
+        rebuild the steps affected by the changed files, by default all
+
+        A failed build is reported and the previous outputs are left as
+        they are, so that watching continues after a mistake in an edit.
+        """
+        steps = set(self.steps) if changed is None else self.affected_steps(changed)
+        if "pack" in self.steps:
+            for path in changed or ():
+                # the old parse of a changed PDF will not be used again
+                self.session.pdfs.discard(path)
+
+        start = time.perf_counter()
+        try:
+            if self.meeting is None or self.config in (changed or ()):
+                self.meeting = configure(self.config, use_cache=self.use_cache)
+            # the configuration may now refer to different files
+            self._snapshot()
+            if "agenda" in steps:
+                build_listing(self.meeting, self.locator, session=self.session)
+            if "pack" in steps:
+                build_pack(
+                    self.meeting,
+                    self.locator,
+                    stream=self.stream,
+                    use_cache=self.use_cache,
+                    session=self.session,
+                    stamp_cache=self.stamp_cache,
+                )
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.debug("Build of %s failed", self.config, exc_info=True)
+            logger.error("Failed to build %s: %s", self.config, exc)
+        else:
+            logger.info(
+                "Rebuilt %s in %.2fs",
+                " and ".join(sorted(steps)) or "nothing",
+                time.perf_counter() - start,
+            )
+        return steps
+
+    def poll(self) -> Set[str]:
+        """
+        check for changes once, rebuilding if changes have settled
+
+        Returns the steps that were rebuilt.
+        """
+        now = self.clock()
+        changed = self.changes()
+        if changed:
+            logger.debug("Changed: %s", ", ".join(str(path) for path in changed))
+            self._changed |= changed
+            self._last_change = now
+            return set()
+
+        if self._changed and now - self._last_change >= self.debounce:
+            changed, self._changed = self._changed, set()
+            return self.build(changed)
+        return set()
+
+    def run(self, interval: float = 0.2) -> None:
+        """build everything and then keep rebuilding until interrupted"""
+        self.build()
+        logger.info("Watching %d files for changes", len(self._states))
+        try:
+            while True:
+                time.sleep(interval)
+                self.poll()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,323 @@
+#!/usr/bin/python3
+
+"""
+Benchmark the agenda and pack builds on synthetic meetings
+
+A meeting of the requested shape is generated in a temporary directory:
+a number of headings, each with a number of items, each item having a
+number of enclosures (a cover plus extra papers) of a given page count.
+The enclosures are either vector (text only) or scanned (a full-page
+image on every page).
+
+Each step is timed end to end by running agendabuilder in a child
+process, recording wall time and peak RSS, and then phase by phase in
+this process, recording wall time and the peak Python heap (tracemalloc).
+The results are written as JSON so that they can be compared between
+releases.
+
+    python3 benchmarks/bench_build.py --headings 5 --items 8 \\
+        --enclosures 2 --pages 10 --content scanned --output results.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+from pathlib import Path
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)
+
+from reportlab.lib.pagesizes import A4  # type: ignore
+from reportlab.lib.utils import ImageReader  # type: ignore
+from reportlab.pdfgen.canvas import Canvas  # type: ignore
+import ruamel.yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# pylint: disable=wrong-import-position
+from agendabuilder import config  # noqa: E402
+from agendabuilder.agendalisting import AgendaListing  # noqa: E402
+from agendabuilder.locator import FileLocator  # noqa: E402
+from agendabuilder.pack import MeetingPack  # noqa: E402
+
+TEMPLATE = ROOT / "agendabuilder" / "test" / "agenda-template.docx"
+
+
+class MeetingShape:
+    def __init__(
+        self,
+        headings: int = 4,
+        items: int = 5,
+        enclosures: int = 1,
+        pages: int = 5,
+        content: str = "vector",
+    ) -> None:
+        self.headings = headings
+        self.items = items
+        self.enclosures = enclosures
+        self.pages = pages
+        self.content = content
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def _scan_image(seed: int) -> ImageReader:
+    """a noisy greyscale 'scan' that compresses about as badly as a real one"""
+    from PIL import Image  # type: ignore  # pylint: disable=import-outside-toplevel
+
+    rng = random.Random(seed)
+    width, height = 850, 1100
+    data = rng.randbytes(width * height)
+    return ImageReader(Image.frombytes("L", (width, height), data))
+
+
+def build_pdf(filename: Path, title: str, shape: MeetingShape, seed: int) -> None:
+    canvas = Canvas(str(filename), pagesize=A4)
+    image = _scan_image(seed) if shape.content == "scanned" else None
+    for page in range(shape.pages):
+        if image is not None:
+            canvas.drawImage(image, 0, 0, width=A4[0], height=A4[1])
+        canvas.setFont("Times-Roman", 12)
+        canvas.drawString(72, A4[1] - 72, title)
+        for line in range(40):
+            canvas.drawString(
+                72,
+                A4[1] - 100 - 15 * line,
+                "Page %d line %d of %s" % (page, line, title),
+            )
+        canvas.showPage()
+    canvas.save()
+
+
+def build_meeting(directory: Path, shape: MeetingShape) -> Path:
+    """write a synthetic meeting.yaml and its documents into directory"""
+    shutil.copy(TEMPLATE, directory / "agenda-template.docx")
+
+    parts: List[Dict[str, Any]] = [
+        {
+            "metadata": {
+                "committee": "Benchmark Committee",
+                "agenda_template": "agenda-template.docx",
+                "agenda_draft": "agenda-draft.docx",
+                "agenda_final": "agenda-final.pdf",
+                "meeting_pack": "meeting-pack.pdf",
+            }
+        }
+    ]
+
+    build_pdf(directory / "agenda-final.pdf", "Agenda", shape, 0)
+
+    # scanned pages are slow to generate, so papers share a few images
+    seed = 1
+    for h in range(shape.headings):
+        parts.append({"heading": "Heading %d" % (h + 1)})
+        for i in range(shape.items):
+            item: Dict[str, Any] = {
+                "item": "Item %d of heading %d" % (i + 1, h + 1),
+                "who": "Chair",
+                "action": "Discuss",
+            }
+            papers = []
+            for e in range(shape.enclosures):
+                name = "paper-%d-%d-%d.pdf" % (h + 1, i + 1, e + 1)
+                build_pdf(directory / name, name, shape, seed % 4)
+                seed += 1
+                papers.append(name)
+            if papers:
+                item["cover"] = papers[0]
+                item["pages"] = papers[1:]
+            parts.append(item)
+
+    cfg = directory / "meeting.yaml"
+    yaml = ruamel.yaml.YAML(typ="safe")
+    yaml.default_flow_style = False
+    with open(cfg, "wt", encoding="UTF-8") as fh:
+        yaml.dump(parts, fh)
+    return cfg
+
+
+@contextlib.contextmanager
+def _quiet() -> Iterator[None]:
+    with open(os.devnull, "wt", encoding="UTF-8") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+class PhaseTimer:
+    """wall time and peak Python heap for each phase of a build"""
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, Dict[str, float]] = {}
+
+    def run(self, name: str, func: Callable[[], Any]) -> Any:
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            with _quiet():
+                return func()
+        finally:
+            wall = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.phases[name] = {"wall": wall, "peak_python_bytes": peak}
+
+
+def run_phases_agenda(cfg: Path) -> Dict[str, Dict[str, float]]:
+    timer = PhaseTimer()
+    locator = FileLocator(cfg)
+    meeting = timer.run("load config", lambda: config.load(cfg))
+    listing = AgendaListing(meeting, meeting.metadata["agenda_template"], locator)
+    timer.run("load template", listing.load_template)
+    timer.run("fill table", lambda: listing.fill_table(listing.find_table()))
+    timer.run("save", lambda: listing.save(meeting.metadata["agenda_draft"]))
+    return timer.phases
+
+
+def run_phases_pack(cfg: Path) -> Dict[str, Dict[str, float]]:
+    timer = PhaseTimer()
+    locator = FileLocator(cfg)
+    meeting = timer.run("load config", lambda: config.load(cfg))
+    pack = MeetingPack(meeting, meeting.metadata["agenda_final"], locator)
+    timer.run("layout", pack.layout)
+    timer.run("build", pack.build)
+    timer.run("save", lambda: pack.save(meeting.metadata["meeting_pack"]))
+    return timer.phases
+
+
+def run_end_to_end(step: str, cfg: Path, extra: List[str]) -> Dict[str, float]:
+    """time a complete run of the command line in a child process"""
+    command = [sys.executable, "-m", "agendabuilder", step] + extra + [str(cfg)]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(ROOT)] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+
+    start = time.perf_counter()
+    with open(os.devnull, "wb") as devnull:
+        proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            command, stdout=devnull, stderr=devnull, env=env
+        )
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            peak_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        else:
+            proc.wait()
+            peak_rss = -1
+    wall = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        raise RuntimeError("%s failed with status %d" % (command, proc.returncode))
+    return {"wall": wall, "peak_rss_bytes": peak_rss}
+
+
+def run_benchmark(
+    shape: MeetingShape,
+    repeat: int = 1,
+    pack_args: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="agendabuilder-bench-") as tmp:
+        directory = Path(tmp)
+
+        start = time.perf_counter()
+        cfg = build_meeting(directory, shape)
+        generate = time.perf_counter() - start
+
+        results: Dict[str, Any] = {
+            "generate": {"wall": generate},
+            "input_bytes": sum(f.stat().st_size for f in directory.glob("*.pdf")),
+        }
+
+        for step, phases, extra in (
+            ("agenda", run_phases_agenda, []),
+            ("pack", run_phases_pack, pack_args or []),
+        ):
+            runs = []
+            for _ in range(repeat):
+                runs.append(
+                    {
+                        "end_to_end": run_end_to_end(step, cfg, extra),
+                        "phases": phases(cfg),
+                    }
+                )
+            results[step] = runs
+
+        results["output_bytes"] = (directory / "meeting-pack.pdf").stat().st_size
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark agendabuilder on a synthetic meeting",
+    )
+    parser.add_argument("--headings", type=int, default=4, help="number of headings")
+    parser.add_argument("--items", type=int, default=5, help="items per heading")
+    parser.add_argument(
+        "--enclosures", type=int, default=1, help="PDF files per item (0 = none)"
+    )
+    parser.add_argument("--pages", type=int, default=5, help="pages per PDF file")
+    parser.add_argument(
+        "--content",
+        choices=("vector", "scanned"),
+        default="vector",
+        help="text-only pages or pages with a full-page scanned image",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="runs of each step")
+    parser.add_argument(
+        "--pack-args",
+        default="",
+        help="extra arguments for the pack step, e.g. '--jobs 4'",
+    )
+    parser.add_argument(
+        "--output", metavar="FILE", help="write the JSON results to FILE"
+    )
+    args = parser.parse_args(argv)
+
+    shape = MeetingShape(
+        headings=args.headings,
+        items=args.items,
+        enclosures=args.enclosures,
+        pages=args.pages,
+        content=args.content,
+    )
+
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pack_args": args.pack_args,
+        },
+        "shape": shape.as_dict(),
+        "results": run_benchmark(shape, args.repeat, args.pack_args.split()),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "wt", encoding="UTF-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
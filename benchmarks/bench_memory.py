@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+
+"""
+Benchmark the memory used by the agenda model
+
+A meeting of the requested number of items is built, with a heading every
+ten items, and the memory allocated for it is measured with tracemalloc.
+For comparison, the same meeting is also built from a copy of the model
+classes that keep their attributes in a __dict__, as releases before the
+model used __slots__ did.
+
+    python3 benchmarks/bench_memory.py --items 50000
+"""
+
+import argparse
+import json
+from pathlib import Path
+import sys
+import tracemalloc
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# pylint: disable=wrong-import-position
+from agendabuilder.meeting import (  # noqa: E402
+    Agenda,
+    AgendaHeading,
+    AgendaItem,
+    ItemNumber,
+)
+
+
+class DictItemNumber:
+    # pylint: disable=too-few-public-methods
+    def __init__(self) -> None:
+        self.a = 0
+        self.b: Optional[int] = None
+        self.c: Optional[int] = None
+        self.sep = "."
+
+
+class DictAgendaItem:
+    # pylint: disable=too-few-public-methods
+    def __init__(self, title: str, who: str, action: str) -> None:
+        self.cover = None
+        self.title = title
+        self.who = who
+        self.num = DictItemNumber()
+        self.duration = 0
+        self.pages: List[str] = []
+        self.action = action
+        self.starred = False
+
+
+class DictAgendaHeading:
+    # pylint: disable=too-few-public-methods
+    def __init__(self, title: str) -> None:
+        self.cover = None
+        self.title = title
+        self.who = None
+        self.num = DictItemNumber()
+        self.duration = 0
+        self.pages: List[str] = []
+
+
+def build_slots(count: int) -> Any:
+    items: List[Any] = []
+    for i in range(count):
+        if i % 10 == 0:
+            items.append(AgendaHeading("Heading %d" % i))
+        else:
+            items.append(AgendaItem("Item %d" % i, who="Chair", action="Note"))
+    return Agenda(items)
+
+
+def build_dicts(count: int) -> Any:
+    items: List[Any] = []
+    for i in range(count):
+        if i % 10 == 0:
+            items.append(DictAgendaHeading("Heading %d" % i))
+        else:
+            items.append(DictAgendaItem("Item %d" % i, who="Chair", action="Note"))
+    return items
+
+
+def measure(build: Callable[[int], Any], count: int) -> Dict[str, float]:
+    tracemalloc.start()
+    try:
+        result = build(count)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {"bytes": current, "bytes_per_item": current / count}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the memory used by the agenda model",
+    )
+    parser.add_argument("--items", type=int, default=50000, help="number of items")
+    parser.add_argument(
+        "--output", metavar="FILE", help="write the JSON results to FILE"
+    )
+    args = parser.parse_args(argv)
+
+    # check that the model really is compact before measuring it
+    assert not hasattr(ItemNumber(), "__dict__")
+    assert not hasattr(AgendaItem(), "__dict__")
+
+    slots = measure(build_slots, args.items)
+    dicts = measure(build_dicts, args.items)
+    report = {
+        "items": args.items,
+        "slots": slots,
+        "dict": dicts,
+        "reduction": 1 - slots["bytes"] / dicts["bytes"],
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "wt", encoding="UTF-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
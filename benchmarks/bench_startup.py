@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+
+"""
+Benchmark how long agendabuilder takes to start
+
+Each command is run repeatedly in a fresh interpreter and the median wall
+time is reported, along with the heavy libraries that it imported. The
+run fails if a step imports a library that it should not need, or if a
+median time exceeds --limit, so that it can guard against regressions.
+
+    python3 benchmarks/bench_startup.py --repeat 10 --limit 0.5
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import time
+
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Set,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# the libraries that are slow to import
+LIBRARIES = {"PyPDF2", "docx", "lxml", "reportlab"}
+
+# the libraries that each command must not import
+FORBIDDEN: Dict[str, Set[str]] = {
+    "--help": LIBRARIES,
+    "agenda --help": LIBRARIES,
+    "pack --help": LIBRARIES,
+    "toc --help": LIBRARIES,
+    "check --help": LIBRARIES,
+    "watch --help": LIBRARIES,
+    "serve --help": LIBRARIES,
+    "batch --help": LIBRARIES,
+}
+
+PROBE = """
+import sys
+from agendabuilder import commands
+try:
+    commands.main(sys.argv[1:])
+except SystemExit:
+    pass
+libraries = %r
+print("Libraries:", *sorted(libraries & {m.split(".")[0] for m in sys.modules}))
+""" % (LIBRARIES,)
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(ROOT)] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+    return env
+
+
+def run_command(args: List[str]) -> float:
+    """wall time of one run of the command line in a fresh interpreter"""
+    command = [sys.executable, "-m", "agendabuilder"] + args
+    start = time.perf_counter()
+    subprocess.run(
+        command,
+        env=_env(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def imported_libraries(args: List[str]) -> Set[str]:
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE] + args,
+        env=_env(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    report = proc.stdout.decode("UTF-8").splitlines()[-1]
+    return set(report.split()[1:])
+
+
+def run_benchmark(repeat: int = 5) -> Dict[str, Any]:
+    # the interpreter alone, for comparison
+    baseline = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        baseline.append(time.perf_counter() - start)
+
+    results: Dict[str, Any] = {
+        "python": {"median": statistics.median(baseline), "min": min(baseline)}
+    }
+    for name in FORBIDDEN:
+        args = name.split()
+        times = [run_command(args) for _ in range(repeat)]
+        imported = imported_libraries(args)
+        results[name] = {
+            "median": statistics.median(times),
+            "min": min(times),
+            "libraries": sorted(imported),
+            "forbidden": sorted(imported & FORBIDDEN[name]),
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the start up time of agendabuilder",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each command")
+    parser.add_argument(
+        "--limit",
+        type=float,
+        metavar="SECONDS",
+        help="fail if the median time of any command exceeds SECONDS",
+    )
+    parser.add_argument(
+        "--output", metavar="FILE", help="write the JSON results to FILE"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.repeat)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "wt", encoding="UTF-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+    status = 0
+    for name, result in results.items():
+        if result.get("forbidden"):
+            print(
+                "%s imported %s" % (name, ", ".join(result["forbidden"])),
+                file=sys.stderr,
+            )
+            status = 1
+        if (
+            args.limit is not None
+            and name in FORBIDDEN
+            and result["median"] > args.limit
+        ):
+            print(
+                "%s took %.3fs, over the limit of %.3fs"
+                % (name, result["median"], args.limit),
+                file=sys.stderr,
+            )
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,8 @@
 #!/usr/bin/python3
 
-from agendabuilder import __main__
+import sys
+
+from agendabuilder.commands import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@
 Run agendabuilder from an installed bundle
 """
 
+import multiprocessing
 import sys
 
 sys.dont_write_bytecode = True
@@ -11,4 +12,7 @@ sys.dont_write_bytecode = True
 
 from agendabuilder.commands import main
 
-sys.exit(main())
+if __name__ == "__main__":
+    # worker processes for 'pack --jobs' re-enter the frozen executable
+    multiprocessing.freeze_support()
+    sys.exit(main())